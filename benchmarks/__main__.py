@@ -0,0 +1,143 @@
+import json
+import os
+
+import click
+
+from .quantization import QuantizationConfig, run_quantization
+from .stubs import StubConfig
+from .suite import SuiteConfig, compare, run_suite
+
+
+@click.group()
+def cli():
+    """Benchmarks the Shoshin ingest and query paths against a stub OpenAI API."""
+
+
+@cli.command()
+@click.option("--lessons", default=50, show_default=True, help="Number of synthetic transcriptions")
+@click.option("--words", default=2000, show_default=True, help="Words per transcription")
+@click.option("--questions", default=20, show_default=True, help="Number of questions")
+@click.option("--chunks", default=8, show_default=True, help="Number of transcribed audio chunks")
+@click.option("--repeat", default=3, show_default=True, help="Runs of preprocessing, transcriptions and embeddings")
+@click.option("--backend", default="embedded", show_default=True, help="Document Store backend")
+@click.option("--retrieval-mode", default="embedding", show_default=True, help="Retrieval mode")
+@click.option("--latency", default=0.05, show_default=True, help="Stub API latency, in seconds")
+@click.option("--rate-limit", type=int, help="Stub API requests per second (default: unlimited)")
+@click.option("--seed", default=0, show_default=True, help="Corpus random seed")
+@click.option("--output", help="Results file (default: benchmarks/results/<commit>.json)")
+def run(
+    lessons: int,
+    words: int,
+    questions: int,
+    chunks: int,
+    repeat: int,
+    backend: str,
+    retrieval_mode: str,
+    latency: float,
+    rate_limit: int,
+    seed: int,
+    output: str,
+):
+    """Runs the benchmark suite and writes its results as JSON."""
+    config = SuiteConfig(
+        lessons=lessons,
+        words=words,
+        questions=questions,
+        chunks=chunks,
+        repeat=repeat,
+        backend=backend,
+        retrieval_mode=retrieval_mode,
+        seed=seed,
+    )
+    results = run_suite(config, StubConfig(latency=latency, rate_limit=rate_limit), log=click.echo)
+
+    output = _save(results, output)
+
+    for name, result in results["benchmarks"].items():
+        throughput = f", {result['throughput']:.1f} items/s" if "throughput" in result else ""
+        click.echo(f"{name}: median {result['median'] * 1000:.1f} ms, p95 {result['p95'] * 1000:.1f} ms{throughput}")
+    click.echo(f"Results saved in: {output}")
+
+
+def _save(results: dict, output: str, suffix: str = "") -> str:
+    if output is None:
+        output = os.path.join(os.path.dirname(__file__), "results", f"{results['commit'] or 'local'}{suffix}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    return output
+
+
+@cli.command()
+@click.option("--documents", default=20000, show_default=True, help="Number of synthetic embeddings")
+@click.option("--queries", default=100, show_default=True, help="Number of searches")
+@click.option("--top-k", default=10, show_default=True, help="Documents per search, used for recall@k")
+@click.option("--rescore-factor", default=4, show_default=True, help="Candidates re-scored per requested document")
+@click.option("--pq-subvectors", default=96, show_default=True, help="Bytes per embedding of product quantization")
+@click.option("--reduced-dim", default=384, show_default=True, help="Dimension of the pca+ variants")
+@click.option("--seed", default=0, show_default=True, help="Embeddings random seed")
+@click.option("--output", help="Results file (default: benchmarks/results/<commit>-quantization.json)")
+def quantization(
+    documents: int,
+    queries: int,
+    top_k: int,
+    rescore_factor: int,
+    pq_subvectors: int,
+    reduced_dim: int,
+    seed: int,
+    output: str,
+):
+    """Reports the recall@k, memory and latency of quantized embedding searches."""
+    config = QuantizationConfig(
+        documents=documents,
+        queries=queries,
+        top_k=top_k,
+        rescore_factor=rescore_factor,
+        pq_subvectors=pq_subvectors,
+        reduced_dim=reduced_dim,
+        seed=seed,
+    )
+    results = run_quantization(config, log=click.echo)
+    output = _save(results, output, suffix="-quantization")
+
+    click.echo(
+        f"{'variant':<10} {'recall@' + str(top_k):>10} {'index MB':>10} {'ratio':>7} {'median ms':>10} {'p95 ms':>8}"
+    )
+    for name, variant in results["variants"].items():
+        search = results["benchmarks"][f"search_{name}"]
+        click.echo(
+            f"{name:<10} {variant['recall']:>10.3f} {variant['index_bytes'] / 1024 / 1024:>10.1f} "
+            f"{variant['compression']:>6.1f}x {search['median'] * 1000:>10.2f} {search['p95'] * 1000:>8.2f}"
+        )
+    click.echo(f"Results saved in: {output}")
+
+
+@cli.command(name="compare")
+@click.argument("base_file")
+@click.argument("new_file")
+@click.option("--threshold", default=0.1, show_default=True, help="Relative slowdown reported as a regression")
+def compare_results(base_file: str, new_file: str, threshold: float):
+    """Compares two results files, failing if a benchmark got slower than the threshold."""
+    with open(base_file) as f:
+        base = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+
+    try:
+        rows = compare(base, new, threshold)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        click.echo(
+            f"{row['name']:<20} {row['base'] * 1000:>10.1f} ms -> {row['new'] * 1000:>10.1f} ms "
+            f"({(row['ratio'] - 1) * 100:+.1f}%){flag}"
+        )
+    regressions = [row["name"] for row in rows if row["regression"]]
+    if regressions:
+        raise click.ClickException(f"Slower than {threshold:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    cli()
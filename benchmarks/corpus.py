@@ -0,0 +1,71 @@
+import random
+from typing import List
+
+from haystack.schema import Document
+
+_SYLLABLES = ["ka", "zen", "mo", "ri", "ta", "shi", "no", "ku", "ra", "de", "lo", "vi", "sa", "to", "mi", "ne"]
+_STOPWORDS = ["the", "a", "of", "and", "to", "in", "is", "that", "with", "for", "as", "on"]
+
+
+def _vocabulary(rng: random.Random, size: int) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _sentence(rng: random.Random, vocabulary: List[str]) -> str:
+    words = [
+        rng.choice(_STOPWORDS) if rng.random() < 0.3 else rng.choice(vocabulary) for _ in range(rng.randint(8, 20))
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def generate_corpus(lessons: int, words: int, seed: int = 0, vocabulary_size: int = 5000) -> List[Document]:
+    """Generates synthetic transcriptions, like the ones read by `read_transcriptions`.
+
+    The corpus only depends on its arguments, so that benchmark runs on different commits process the
+    same documents.
+
+    Args:
+        lessons (int): The number of transcriptions.
+        words (int): The approximate number of words of each transcription.
+        seed (int): The random seed.
+        vocabulary_size (int): The number of distinct words, besides stopwords.
+
+    Returns:
+        List[Document]: One document per transcription, with a `name` metadata.
+    """
+    # Synthetic text, seeded so that runs are comparable: not used for security
+    rng = random.Random(seed)  # nosec B311
+    vocabulary = _vocabulary(rng, vocabulary_size)
+    documents = []
+    for i in range(lessons):
+        sentences: List[str] = []
+        count = 0
+        while count < words:
+            sentence = _sentence(rng, vocabulary)
+            sentences.append(sentence)
+            count += len(sentence.split())
+        documents.append(Document(content=" ".join(sentences), meta={"name": f"lesson{i:03d}.txt"}))
+    return documents
+
+
+def generate_questions(documents: List[Document], count: int, seed: int = 0) -> List[str]:
+    """Generates questions about random passages of the corpus.
+
+    Args:
+        documents (List[Document]): The corpus.
+        count (int): The number of questions.
+        seed (int): The random seed.
+
+    Returns:
+        List[str]: The questions.
+    """
+    rng = random.Random(seed)  # nosec B311
+    questions = []
+    for _ in range(count):
+        words = rng.choice(documents).content.split()
+        start = rng.randrange(max(1, len(words) - 6))
+        questions.append(f"What does the lesson say about {' '.join(words[start:start + 6]).rstrip('.')}?")
+    return questions
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from haystack.schema import Document
+
+from shoshin.conf import constants as c
+from shoshin.datastore.embedded import EmbeddedDocumentStore
+
+from .suite import environment, summarize
+
+
+@dataclass
+class QuantizationConfig:
+    """The workload of a quantization benchmark run.
+
+    Attributes:
+        documents (int): The number of synthetic embeddings.
+        queries (int): The number of searches.
+        dim (int): The embeddings dimension.
+        clusters (int): The number of topics the embeddings are drawn around.
+        top_k (int): The number of documents returned by each search, used for recall@k.
+        rescore_factor (int): How many candidates per requested document are re-scored with full precision.
+        pq_subvectors (int): The number of parts (bytes) of each embedding encoded by `pq`.
+        reduced_dim (int): The dimension of the projection of the `pca+` variants.
+        seed (int): The random seed of the embeddings.
+    """
+
+    documents: int = 20000
+    queries: int = 100
+    dim: int = c.EMBEDDING_DIM
+    clusters: int = 20
+    top_k: int = c.RETRIEVER_TOP_K
+    rescore_factor: int = 4
+    pq_subvectors: int = 96
+    reduced_dim: int = 384
+    seed: int = 0
+
+
+def generate_embeddings(config: QuantizationConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """Generates unit embeddings drawn around `clusters` topics, and queries close to random embeddings.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The document embeddings and the query embeddings.
+    """
+    rng = np.random.default_rng(config.seed)
+    centers = rng.standard_normal((config.clusters, config.dim)).astype(np.float32)
+    embeddings = centers[rng.integers(config.clusters, size=config.documents)]
+    embeddings += rng.standard_normal(embeddings.shape).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = embeddings[rng.integers(config.documents, size=config.queries)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(config.dim)
+    return embeddings, queries
+
+
+def _variants(config: QuantizationConfig) -> Dict[str, Dict[str, object]]:
+    return {
+        "flat": {"quantization": "none"},
+        "int8": {"quantization": "int8"},
+        "pq": {"quantization": "pq", "pq_subvectors": config.pq_subvectors},
+        "pca+int8": {"quantization": "int8", "reduced_dim": config.reduced_dim},
+        "pca+pq": {"quantization": "pq", "reduced_dim": config.reduced_dim, "pq_subvectors": config.pq_subvectors},
+    }
+
+
+def run_quantization(config: QuantizationConfig, log: Callable[[str], None] = print) -> Dict[str, object]:
+    """Compares the recall@k, memory and search latency of the compact representations of `EmbeddedDocumentStore`.
+
+    Each variant searches the same synthetic embeddings. Recall@k is the share of the exact top-k documents
+    (found by the `flat` search) that the variant returns, and index bytes are the memory scanned by searches:
+    the float32 matrix for `flat`, the codes for quantized variants.
+
+    Args:
+        config (QuantizationConfig): The workload.
+        log (Callable[[str], None]): Called with progress messages.
+
+    Returns:
+        Dict[str, object]: The results, serializable as JSON and comparable with `compare`.
+    """
+    embeddings, queries = generate_embeddings(config)
+    benchmarks: Dict[str, object] = {}
+    variants: Dict[str, object] = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "documents")
+        log(f"Writing {config.documents} embeddings...")
+        store = EmbeddedDocumentStore(path, embedding_dim=config.dim)
+        store.write_documents([Document(content=f"doc {i}", embedding=e) for i, e in enumerate(embeddings)])
+
+        exact: Optional[List[List[str]]] = None
+        for name, options in _variants(config).items():
+            log(f"Searching with {name}...")
+            store = EmbeddedDocumentStore(
+                path, embedding_dim=config.dim, rescore_factor=config.rescore_factor, **options
+            )
+
+            # The first search builds the quantized index
+            start = time.perf_counter()
+            store.query_by_embedding(queries[0], top_k=config.top_k)
+            first_search = time.perf_counter() - start
+
+            samples, results = [], []
+            for query in queries:
+                start = time.perf_counter()
+                documents = store.query_by_embedding(query, top_k=config.top_k)
+                samples.append(time.perf_counter() - start)
+                results.append([doc.id for doc in documents])
+
+            exact = exact or results
+            recall = np.mean([len(set(found) & set(ids)) / len(ids) for found, ids in zip(results, exact)])
+            index_bytes = store.search_index_bytes()
+            benchmarks[f"search_{name}"] = summarize(samples)
+            variants[name] = {
+                "recall": float(recall),
+                "index_bytes": int(index_bytes),
+                "compression": embeddings.nbytes / index_bytes,
+                "first_search": first_search,
+            }
+
+    return {**environment(), "config": asdict(config), "variants": variants, "benchmarks": benchmarks}
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+from shoshin.conf import constants as c
+
+
+@dataclass
+class StubConfig:
+    """The behavior of the stub OpenAI API.
+
+    Attributes:
+        latency (float): The time spent on each request before answering, in seconds.
+        rate_limit (int | None): The number of requests accepted per second. Requests above the limit are
+                                 answered with a `429` error and `x-ratelimit-*` headers, like the OpenAI API.
+        embedding_dim (int): The dimension of the returned embeddings.
+        answer_words (int): The number of words of chat completions.
+    """
+
+    latency: float = 0.05
+    rate_limit: Optional[int] = None
+    embedding_dim: int = c.EMBEDDING_DIM
+    answer_words: int = 50
+
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """Returns a deterministic unit vector for a text, so that runs are comparable."""
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8"), usedforsecurity=False).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class _RateLimit:
+    """A fixed window of one second, counting accepted requests."""
+
+    def __init__(self, limit: Optional[int]) -> None:
+        self.limit = limit
+        self._requests: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Dict[str, str]:
+        """Returns the rate limit headers of a request, with `x-ratelimit-remaining-requests` at -1 if it's limited."""
+        if self.limit is None:
+            return {}
+        with self._lock:
+            now = time.monotonic()
+            while self._requests and now - self._requests[0] >= 1.0:
+                self._requests.popleft()
+            reset = f"{int((1.0 - (now - self._requests[0])) * 1000) if self._requests else 0}ms"
+            if len(self._requests) >= self.limit:
+                return {"x-ratelimit-remaining-requests": "-1", "x-ratelimit-reset-requests": reset}
+            self._requests.append(now)
+            remaining = self.limit - len(self._requests)
+            return {"x-ratelimit-remaining-requests": str(remaining), "x-ratelimit-reset-requests": reset}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StubOpenAI"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        endpoint = self.path.rsplit("/v1", 1)[-1]
+        handler = {
+            "/embeddings": self._embeddings,
+            "/audio/transcriptions": self._transcriptions,
+            "/chat/completions": self._chat,
+        }.get(endpoint)
+        if handler is None:
+            self._send(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+            return
+
+        headers = self.server.rate_limit.acquire()
+        self.server.count(endpoint, rate_limited=headers.get("x-ratelimit-remaining-requests") == "-1")
+        if headers.get("x-ratelimit-remaining-requests") == "-1":
+            headers["x-ratelimit-remaining-requests"] = "0"
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, headers)
+            return
+
+        time.sleep(self.server.config.latency)
+        self._send(200, handler(body), headers)
+
+    def _embeddings(self, body: bytes) -> dict:
+        request = json.loads(body)
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        data = [
+            {
+                "object": "embedding",
+                "index": i,
+                "embedding": fake_embedding(text, self.server.config.embedding_dim).tolist(),
+            }
+            for i, text in enumerate(texts)
+        ]
+        tokens = sum(len(text.split()) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": request["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _transcriptions(self, body: bytes) -> dict:
+        return {"text": f"Transcription of {len(body)} bytes of audio."}
+
+    def _chat(self, body: bytes) -> dict:
+        request = json.loads(body)
+        content = " ".join(["answer"] * self.server.config.answer_words)
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": self.server.config.answer_words, "total_tokens": 0},
+        }
+
+    def _send(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubOpenAI(ThreadingHTTPServer):
+    """A local HTTP server answering the OpenAI embeddings, transcriptions and chat completions endpoints.
+
+    Answers are synthetic and returned after `StubConfig.latency`, so benchmarks measure Shoshin and its
+    dependencies instead of the network. The server runs in a background thread while used as a context
+    manager, and counts the requests received by each endpoint.
+
+    Example:
+        with StubOpenAI(StubConfig(latency=0.1)) as stub:
+            settings.OPENAI_API_BASE = stub.base_url
+
+    Attributes:
+        config (StubConfig): The behavior of the stub.
+        requests (Counter): The number of requests received by each endpoint.
+        rate_limited (Counter): The number of requests of each endpoint answered with a rate limit error.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _Handler)
+        self.config = config or StubConfig()
+        self.rate_limit = _RateLimit(self.config.rate_limit)
+        self.requests: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """The base URL of the stub API, to be used as settings OPENAI_API_BASE."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, endpoint: str, rate_limited: bool = False) -> None:
+        with self._lock:
+            self.requests[endpoint] += 1
+            if rate_limited:
+                self.rate_limited[endpoint] += 1
+
+    def __enter__(self) -> "StubOpenAI":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
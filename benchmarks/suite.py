@@ -0,0 +1,274 @@
+import asyncio
+import os
+import platform
+import statistics
+import subprocess  # nosec B404
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Callable, Dict, Iterator, List, Optional
+from unittest import mock
+
+from haystack.nodes.prompt.invocation_layer.chatgpt import ChatGPTInvocationLayer
+from haystack.schema import Document
+
+from shoshin import ai
+from shoshin.aio import client_session
+from shoshin.conf import constants as c
+from shoshin.conf import settings as s
+from shoshin.datastore.documents import DocumentStore
+from shoshin.pipeline import processors
+
+from .corpus import generate_corpus, generate_questions
+from .stubs import StubConfig, StubOpenAI
+
+# Bump when the results format changes, so that `compare` refuses incompatible files
+RESULTS_VERSION = 1
+
+_PACKAGES = ("farm-haystack", "numpy", "openai", "pydantic")
+
+
+@dataclass
+class SuiteConfig:
+    """The workload of a benchmark run.
+
+    Attributes:
+        lessons (int): The number of synthetic transcriptions.
+        words (int): The approximate number of words of each transcription.
+        questions (int): The number of questions used to time retrieval and queries.
+        chunks (int): The number of audio chunks used to time transcriptions.
+        repeat (int): How many times bulk operations (preprocessing, embeddings, transcriptions) run.
+        backend (str): The Document Store backend (see settings DOCUMENT_STORE_BACKEND).
+        retrieval_mode (str): The retrieval mode (see settings RETRIEVAL_MODE).
+        language (str): The language used for preprocessing.
+        seed (int): The random seed of the corpus.
+    """
+
+    lessons: int = 50
+    words: int = 2000
+    questions: int = 20
+    chunks: int = 8
+    repeat: int = 3
+    backend: str = "embedded"
+    retrieval_mode: str = "embedding"
+    language: str = "en"
+    seed: int = 0
+
+
+def summarize(samples: List[float], items: Optional[int] = None) -> Dict[str, object]:
+    """Returns the statistics of timing samples, in seconds.
+
+    Args:
+        samples (List[float]): The duration of each run.
+        items (int, optional): The number of items processed by each run, used to report the throughput.
+
+    Returns:
+        Dict[str, object]: The samples and their statistics.
+    """
+    ordered = sorted(samples)
+    summary: Dict[str, object] = {
+        "unit": "s",
+        "samples": samples,
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+    }
+    if items is not None:
+        summary["items"] = items
+        summary["throughput"] = items / summary["median"] if summary["median"] else 0.0
+    return summary
+
+
+def measure(func: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> List[float]:
+    """Times `func` `repeat` times, running `setup` before each run without timing it."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+@contextmanager
+def override_settings(**values) -> Iterator[None]:
+    """Updates Shoshin settings, restoring the previous values on exit."""
+    previous = {name: getattr(s, name) for name in values}
+    for name, value in values.items():
+        setattr(s, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(s, name, value)
+
+
+@contextmanager
+def _stub_chat_url(base_url: str) -> Iterator[None]:
+    # Haystack 1.x hardcodes the chat completions endpoint, while Shoshin requests use settings OPENAI_API_BASE
+    url = f"{base_url}/chat/completions"
+    with mock.patch.object(ChatGPTInvocationLayer, "url", new_callable=mock.PropertyMock, return_value=url):
+        yield
+
+
+def _copy(documents: List[Document]) -> List[Document]:
+    return [Document.from_dict(doc.to_dict()) for doc in documents]
+
+
+def _git_commit() -> Optional[str]:
+    # A fixed command without user input: git is looked up in PATH like any developer tool
+    try:
+        output = subprocess.run(  # nosec B603 B607
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def _versions() -> Dict[str, Optional[str]]:
+    versions: Dict[str, Optional[str]] = {}
+    for package in _PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def environment() -> Dict[str, object]:
+    """Returns the results version, commit and versions of the environment a benchmark runs in."""
+    return {
+        "version": RESULTS_VERSION,
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": _versions(),
+    }
+
+
+def run_suite(config: SuiteConfig, stub_config: StubConfig, log: Callable[[str], None] = print) -> Dict[str, object]:
+    """Times the ingest and query paths against a stub OpenAI API.
+
+    The suite times `clean_documents` on a synthetic corpus, transcriptions of audio chunks, `create_embeddings`
+    into a new index, retrieval, `ai.query` end-to-end, and all questions answered at once by `ai.aquery` in one
+    event loop. Caches are disabled, so every run sends its requests
+    to the stub. Documents are stored in a temporary folder when using the `embedded` backend.
+
+    Args:
+        config (SuiteConfig): The workload.
+        stub_config (StubConfig): The latency and rate limits of the stub OpenAI API.
+        log (Callable[[str], None]): Called with progress messages.
+
+    Returns:
+        Dict[str, object]: The results, serializable as JSON.
+    """
+    corpus = generate_corpus(config.lessons, config.words, seed=config.seed)
+    questions = generate_questions(corpus, config.questions, seed=config.seed)
+    benchmarks: Dict[str, object] = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir, StubOpenAI(stub_config) as stub, _stub_chat_url(stub.base_url):
+        with override_settings(
+            OPENAI_API_BASE=stub.base_url,
+            DOCUMENT_STORE_BACKEND=config.backend,
+            RETRIEVAL_MODE=config.retrieval_mode,
+            EMBEDDED_STORE_DIR=os.path.join(tmp_dir, "documents"),
+            LEXICAL_INDEX_DIR=os.path.join(tmp_dir, "lexical"),
+            CACHE_DIR=os.path.join(tmp_dir, "cache"),
+            ANSWER_CACHE=False,
+            EMBEDDING_CACHE=False,
+            TRANSCRIPTION_CACHE=False,
+        ):
+            log(f"Preprocessing {len(corpus)} transcriptions...")
+            samples = measure(lambda: processors.clean_documents(_copy(corpus), config.language), config.repeat)
+            benchmarks["clean_documents"] = summarize(samples, items=len(corpus))
+            documents = processors.clean_documents(corpus, config.language)
+
+            log(f"Transcribing {config.chunks} audio chunks...")
+            chunks = []
+            for i in range(config.chunks):
+                path = os.path.join(tmp_dir, f"chunk{i:04d}.mp3")
+                with open(path, "wb") as f:
+                    f.write(os.urandom(256 * 1024))
+                chunks.append(processors.AudioChunk(path, offset=i * 60.0))
+            samples = measure(lambda: processors.transcribe_chunks(chunks), config.repeat)
+            benchmarks["transcribe_chunks"] = summarize(samples, items=len(chunks))
+
+            log(f"Embedding {len(documents)} documents...")
+            stores: List[DocumentStore] = []
+            batch: List[Document] = []
+
+            def new_store() -> None:
+                stores.append(DocumentStore(index=f"benchmark_{len(stores)}"))
+                batch[:] = _copy(documents)
+
+            samples = measure(lambda: stores[-1].create_embeddings(batch), config.repeat, setup=new_store)
+            benchmarks["create_embeddings"] = summarize(samples, items=len(documents))
+            store = stores[-1]
+
+            log(f"Answering {len(questions)} questions...")
+            samples = [
+                measure(lambda: store.retriever.retrieve(query=q, top_k=c.RETRIEVER_TOP_K), 1)[0] for q in questions
+            ]
+            benchmarks["retrieve"] = summarize(samples)
+            pipeline = ai.build_pipeline(store.retriever)
+            samples = [measure(lambda: ai.query(store.retriever, q, pipeline=pipeline), 1)[0] for q in questions]
+            benchmarks["query"] = summarize(samples)
+
+            async def answer_all() -> None:
+                async with client_session() as session:
+                    await asyncio.gather(*(ai.aquery(store.retriever, q, session=session) for q in questions))
+
+            samples = measure(lambda: asyncio.run(answer_all()), config.repeat)
+            benchmarks["aquery_concurrent"] = summarize(samples, items=len(questions))
+
+        stub_requests = {"requests": dict(stub.requests), "rate_limited": dict(stub.rate_limited)}
+
+    return {
+        **environment(),
+        "config": asdict(config),
+        "stub": {**asdict(stub_config), **stub_requests},
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(base: Dict[str, object], new: Dict[str, object], threshold: float) -> List[Dict[str, object]]:
+    """Compares the median timings of two results.
+
+    Args:
+        base (Dict[str, object]): The reference results, e.g. from the main branch.
+        new (Dict[str, object]): The results to check.
+        threshold (float): The relative slowdown above which a benchmark is reported as a regression.
+
+    Raises:
+        ValueError: If the results formats are not compatible.
+
+    Returns:
+        List[Dict[str, object]]: For each benchmark of both results, its medians, their ratio and whether it's
+                                 a regression.
+    """
+    if base.get("version") != new.get("version"):
+        raise ValueError(f"Results versions {base.get('version')} and {new.get('version')} can't be compared")
+
+    rows = []
+    for name, result in new["benchmarks"].items():
+        reference = base["benchmarks"].get(name)
+        if reference is None:
+            continue
+        ratio = result["median"] / reference["median"] if reference["median"] else float("inf")
+        rows.append(
+            {
+                "name": name,
+                "base": reference["median"],
+                "new": result["median"],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return rows
@@ -1,33 +1,395 @@
-from haystack.nodes import EmbeddingRetriever, PromptNode
-from haystack.pipelines import GenerativeQAPipeline
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import aiohttp
+import numpy as np
+from haystack.errors import OpenAIError
+from haystack.nodes import BaseRetriever, EmbeddingRetriever
+from haystack.pipelines import Pipeline
+from haystack.schema import Document
+
+from ..aio import client_session, openai_session, run_blocking
+from ..cache.answers import AnswerCache
 from ..conf import constants as c
 from ..conf import settings as s
+from ..datastore.retrievers import CachedEmbeddingRetriever, HybridRetriever
+from ..exceptions import AIError, ShoshinException
+from ..metrics import metrics
+from .context import ContextPacker
+from .generation import MeteredPromptNode
 from .prompts import lfqa
+from .streaming import AnswerStream
+
+
+def build_prompt_node() -> MeteredPromptNode:
+    """Builds the PromptNode that generates answers with the OpenAI LLM and the default prompt template.
 
+    Its generations are recorded in the `generate` span and the `openai.chat` counters.
+
+    Returns:
+        MeteredPromptNode: The PromptNode that generates answers.
+    """
+    return MeteredPromptNode(
+        model_name_or_path=c.LLM_MODEL,
+        api_key=s.OPENAI_API_KEY,
+        default_prompt_template=lfqa,
+        max_length=s.PROMPT_MAX_TOKENS,
+    )
+
+
+def build_pipeline(retriever: EmbeddingRetriever) -> Pipeline:
+    """Builds the generative QA pipeline used to answer questions.
+
+    The pipeline holds the given EmbeddingRetriever, a `ContextPacker` that fits the retrieved documents
+    into settings PROMPT_CONTEXT_TOKENS, and a PromptNode configured with the OpenAI API key and the default
+    prompt template. Building it once and reusing it across questions avoids paying the setup cost for
+    each question.
+
+    Args:
+        retriever (EmbeddingRetriever): An instance of EmbeddingRetriever to be used in the generative
+                                        QA pipeline for retrieving relevant documents.
+
+    Returns:
+        Pipeline: The pipeline that answers questions.
+    """
+    pipeline = Pipeline()
+    pipeline.add_node(component=retriever, name="Retriever", inputs=["Query"])
+    pipeline.add_node(component=ContextPacker(), name="ContextPacker", inputs=["Retriever"])
+    pipeline.add_node(component=build_prompt_node(), name="Generator", inputs=["ContextPacker"])
+    return pipeline
 
-def query(retriever: EmbeddingRetriever, question: str) -> str:
+
+def query(
+    retriever: EmbeddingRetriever,
+    question: str,
+    pipeline: Optional[Pipeline] = None,
+    cache: Optional[AnswerCache] = None,
+    filters: Optional[dict] = None,
+) -> str:
     """Processes the given question through a generative QA pipeline and returns the answer.
 
-    This function creates a PromptNode with specific parameters including the OpenAI API key and a
-    default prompt template, and uses the given EmbeddingRetriever to construct a GenerativeQAPipeline.
-    It then runs this pipeline with the provided question and a set parameter for the number of
-    top retriever results to consider. The results of the pipeline run are returned.
+    If no pipeline is given, this function builds one through `build_pipeline` using the given
+    EmbeddingRetriever. It then runs this pipeline with the provided question and a set parameter
+    for the number of top retriever results to consider. The results of the pipeline run are returned.
+
+    When an `AnswerCache` is given, documents are retrieved first and the answer of a similar question
+    that retrieved the same documents is returned without calling the LLM. Questions answered from a
+    confident lexical match of a `HybridRetriever` have no embedding, and skip the cache.
+
+    Metadata filters (e.g. `{"lesson": ["lesson01"]}`) are passed to the document store search, so only the
+    matching documents are scored.
 
     Args:
         retriever (EmbeddingRetriever): An instance of EmbeddingRetriever to be used in the generative
                                         QA pipeline for retrieving relevant documents.
         question (str): The question to be processed by the generative QA pipeline.
+        pipeline (Pipeline, optional): A pipeline built with `build_pipeline`, reused
+                                       across questions by long-lived processes.
+        cache (AnswerCache, optional): The cache of previous answers.
+        filters (dict, optional): Metadata filters of the retrieved documents.
 
     Returns:
         str: The result from running the question through the generative QA pipeline.
     """
-    prompt_node = PromptNode(
-        model_name_or_path=c.LLM_MODEL,
-        api_key=s.OPENAI_API_KEY,
-        default_prompt_template=lfqa,
-        max_length=s.PROMPT_MAX_TOKENS,
-    )
+    with metrics.span("query"):
+        pipeline = pipeline or build_pipeline(retriever)
+        if cache is None:
+            params = {"Retriever": {"top_k": c.RETRIEVER_TOP_K, "filters": filters}}
+            return pipeline.run(query=question, params=params)["results"]
+
+        # Run retrieval and generation separately, so the generation can be skipped on cache hits
+        documents, embedding = _retrieve(retriever, question, filters)
+        document_ids = [doc.id for doc in documents]
+        answer = cache.get(embedding, document_ids) if embedding is not None else None
+        if answer is not None:
+            metrics.increment("answer_cache.hits")
+            return answer
+
+        metrics.increment("answer_cache.misses")
+        context = pipeline.get_node("ContextPacker").pack(documents)
+        output, _ = pipeline.get_node("Generator").run(query=question, documents=context)
+        answer = output["results"]
+        if embedding is not None:
+            cache.set(embedding, document_ids, answer)
+        return answer
+
+
+def _retrieve(
+    retriever: BaseRetriever, question: str, filters: Optional[dict] = None
+) -> Tuple[List[Document], Optional[np.ndarray]]:
+    """Retrieves the documents relevant to the question, returning the question embedding if it was computed."""
+    if isinstance(retriever, HybridRetriever):
+        return retriever.retrieve_with_embedding(question, filters=filters, top_k=c.RETRIEVER_TOP_K)
+    with metrics.span("retrieve"):
+        embedding = retriever.embed_queries([question])[0]
+        with metrics.span("vector_search"):
+            documents = retriever.document_store.query_by_embedding(
+                query_emb=embedding, filters=filters, top_k=c.RETRIEVER_TOP_K
+            )
+    return documents, embedding
+
+
+async def aquery(
+    retriever: EmbeddingRetriever,
+    question: str,
+    session: Optional[aiohttp.ClientSession] = None,
+    cache: Optional[AnswerCache] = None,
+    filters: Optional[dict] = None,
+) -> str:
+    """Answers the question like `query`, without blocking the event loop.
+
+    The question embedding and the answer are requested through the `aiohttp` session, so one event loop
+    can answer many questions at once without a thread per question, while document store searches run in
+    the default executor. Pass the session created by `client_session` when the application starts, so that
+    all questions reuse its connections.
+
+    Example:
+        async with client_session() as session:
+            answers = await asyncio.gather(*(ai.aquery(ds.retriever, q, session=session) for q in questions))
+
+    Args:
+        retriever (EmbeddingRetriever): An instance of `CachedEmbeddingRetriever` or `HybridRetriever`
+                                        used to retrieve relevant documents.
+        question (str): The question to answer.
+        session (aiohttp.ClientSession, optional): The session used to send requests. Defaults to a
+                                                   session for this question.
+        cache (AnswerCache, optional): The cache of previous answers.
+        filters (dict, optional): Metadata filters of the retrieved documents.
+
+    Raises:
+        AIError: If an OpenAI API request fails for any reason.
+
+    Returns:
+        str: The answer.
+    """
+    from openai.error import OpenAIError as OpenAIClientError
+
+    if session is None:
+        async with client_session() as session:
+            return await aquery(retriever, question, session, cache, filters)
+
+    with metrics.span("query"):
+        try:
+            documents, embedding = await _aretrieve(retriever, question, filters, session)
+            document_ids = [doc.id for doc in documents]
+            answer = cache.get(embedding, document_ids) if cache is not None and embedding is not None else None
+            if answer is not None:
+                metrics.increment("answer_cache.hits")
+                return _answer_text(answer)
+
+            if cache is not None:
+                metrics.increment("answer_cache.misses")
+            answer = await _agenerate(question, ContextPacker().pack(documents), session)
+        except (OpenAIError, OpenAIClientError) as e:
+            raise AIError(e)
+        if cache is not None and embedding is not None:
+            cache.set(embedding, document_ids, answer)
+        return answer
+
+
+async def _agenerate(question: str, documents: List[Document], session: aiohttp.ClientSession) -> str:
+    """Generates the answer from the packed documents, with the same prompt and model as `build_prompt_node`."""
+    import openai
+
+    prompt = next(lfqa.fill(query=question, documents=documents))
+    metrics.increment("openai.chat.requests")
+    with metrics.span("generate"), openai_session(session):
+        response = await openai.ChatCompletion.acreate(
+            model=c.LLM_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=s.PROMPT_MAX_TOKENS,
+            api_key=s.OPENAI_API_KEY,
+            api_base=s.OPENAI_API_BASE,
+        )
+    usage = response.get("usage", {})
+    metrics.increment("openai.chat.prompt_tokens", usage.get("prompt_tokens", 0))
+    metrics.increment("openai.chat.completion_tokens", usage.get("completion_tokens", 0))
+    return response["choices"][0]["message"]["content"]
+
+
+async def _aretrieve(
+    retriever: BaseRetriever, question: str, filters: Optional[dict], session: aiohttp.ClientSession
+) -> Tuple[List[Document], Optional[np.ndarray]]:
+    """Retrieves the documents relevant to the question like `_retrieve`, without blocking the event loop."""
+    if isinstance(retriever, HybridRetriever):
+        return await retriever.aretrieve_with_embedding(
+            question, filters=filters, top_k=c.RETRIEVER_TOP_K, session=session
+        )
+    with metrics.span("retrieve"):
+        if isinstance(retriever, CachedEmbeddingRetriever):
+            embedding = (await retriever.aembed_queries([question], session))[0]
+        else:
+            embedding = (await run_blocking(retriever.embed_queries, [question]))[0]
+        with metrics.span("vector_search"):
+            documents = await run_blocking(
+                retriever.document_store.query_by_embedding,
+                query_emb=embedding,
+                filters=filters,
+                top_k=c.RETRIEVER_TOP_K,
+            )
+    return documents, embedding
+
+
+def _retrieve_batch(
+    retriever: BaseRetriever, questions: List[str], filters: Optional[dict] = None
+) -> List[Tuple[List[Document], Optional[np.ndarray]]]:
+    """Retrieves the documents of many questions, embedding them and searching the document store in bulk."""
+    if isinstance(retriever, HybridRetriever):
+        return retriever.retrieve_batch_with_embeddings(questions, filters=filters, top_k=c.RETRIEVER_TOP_K)
+    with metrics.span("retrieve"):
+        embeddings = retriever.embed_queries(questions)
+        with metrics.span("vector_search"):
+            documents = retriever.document_store.query_by_embedding_batch(
+                query_embs=embeddings, filters=filters, top_k=c.RETRIEVER_TOP_K
+            )
+    return list(zip(documents, embeddings))
+
+
+@dataclass
+class BatchAnswer:
+    """The answer of a question answered by `query_batch`.
+
+    Attributes:
+        question (str): The question.
+        answer (str | None): The answer, or None if the generation failed.
+        sources (List[str]): The names of the lessons retrieved for the question.
+        timings (Dict[str, float]): The durations of the `retrieve` and `generate` stages, in seconds. Retrieval
+                                    runs once for a batch of questions, so its duration is shared among them.
+        cached (bool): Whether the answer was returned by the answer cache.
+        error (str | None): The error message if the generation failed.
+    """
+
+    question: str
+    answer: Optional[str] = None
+    sources: List[str] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    cached: bool = False
+    error: Optional[str] = None
+
+
+def _answer_text(results: Any) -> str:
+    # PromptNode returns a list with one answer per prompt
+    if isinstance(results, list):
+        return results[0] if results else ""
+    return results
+
+
+def _generate(
+    pipeline: Pipeline,
+    cache: Optional[AnswerCache],
+    question: str,
+    documents: List[Document],
+    embedding: Optional[np.ndarray],
+) -> BatchAnswer:
+    """Answers a question from its retrieved documents, reporting generation errors in the answer."""
+    result = BatchAnswer(question, sources=sorted({doc.meta["name"] for doc in documents if doc.meta.get("name")}))
+    start = time.perf_counter()
+    document_ids = [doc.id for doc in documents]
+    try:
+        answer = cache.get(embedding, document_ids) if cache is not None and embedding is not None else None
+        if answer is not None:
+            metrics.increment("answer_cache.hits")
+            result.answer, result.cached = _answer_text(answer), True
+            return result
 
-    pipeline = GenerativeQAPipeline(generator=prompt_node, retriever=retriever)
-    return pipeline.run(query=question, params={"Retriever": {"top_k": c.RETRIEVER_TOP_K}})["results"]
+        if cache is not None:
+            metrics.increment("answer_cache.misses")
+        context = pipeline.get_node("ContextPacker").pack(documents)
+        output, _ = pipeline.get_node("Generator").run(query=question, documents=context)
+        result.answer = _answer_text(output["results"])
+        if cache is not None and embedding is not None:
+            cache.set(embedding, document_ids, output["results"])
+    except (OpenAIError, ShoshinException) as e:
+        result.error = str(e)
+    finally:
+        result.timings["generate"] = time.perf_counter() - start
+    return result
+
+
+def query_batch(
+    retriever: EmbeddingRetriever,
+    questions: Iterable[str],
+    pipeline: Optional[Pipeline] = None,
+    cache: Optional[AnswerCache] = None,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    filters: Optional[dict] = None,
+) -> Iterator[BatchAnswer]:
+    """Answers many questions, yielding their answers in the same order as `questions`.
+
+    Questions are processed in batches of `batch_size`: all questions of a batch are embedded with
+    batched API calls and searched in bulk, then answers are generated with at most `concurrency` LLM
+    requests in flight. Answers are yielded batch by batch and questions are read lazily, so that large
+    files of questions are answered with bounded memory.
+
+    A failed generation doesn't stop the run: its `BatchAnswer.error` holds the error message. Errors
+    while embedding or searching a batch are raised.
+
+    Example:
+        for answer in ai.query_batch(ds.retriever, ["What is Zen?", "How do I sit?"]):
+            print(answer.question, answer.answer, answer.sources)
+
+    Args:
+        retriever (EmbeddingRetriever): An instance of EmbeddingRetriever used to retrieve relevant documents.
+        questions (Iterable[str]): The questions to answer.
+        pipeline (Pipeline, optional): A pipeline built with `build_pipeline`. Defaults to a new pipeline.
+        cache (AnswerCache, optional): The cache of previous answers.
+        concurrency (int, optional): The maximum number of concurrent generations. Defaults to settings
+                                     QUERY_BATCH_CONCURRENCY.
+        batch_size (int, optional): The number of questions retrieved at once. Defaults to settings
+                                    QUERY_BATCH_SIZE.
+        filters (dict, optional): Metadata filters of the documents retrieved for all questions.
+
+    Yields:
+        BatchAnswer: The answer of each question.
+    """
+    pipeline = pipeline or build_pipeline(retriever)
+    batch_size = batch_size or s.QUERY_BATCH_SIZE
+    questions = iter(questions)
+    with ThreadPoolExecutor(max_workers=concurrency or s.QUERY_BATCH_CONCURRENCY) as executor:
+        while True:
+            batch = [question for _, question in zip(range(batch_size), questions)]
+            if not batch:
+                return
+
+            with metrics.span("query_batch"):
+                start = time.perf_counter()
+                retrieved = _retrieve_batch(retriever, batch, filters)
+                retrieve_time = (time.perf_counter() - start) / len(batch)
+                futures = [
+                    executor.submit(_generate, pipeline, cache, question, documents, embedding)
+                    for question, (documents, embedding) in zip(batch, retrieved)
+                ]
+                answers = [future.result() for future in futures]
+
+            for answer in answers:
+                answer.timings["retrieve"] = retrieve_time
+                yield answer
+
+
+def stream_query(retriever: EmbeddingRetriever, question: str, filters: Optional[dict] = None) -> AnswerStream:
+    """Retrieves the documents relevant to the question and returns a stream of the answer tokens.
+
+    The LLM generation starts when the returned `AnswerStream` is iterated, and tokens are yielded as
+    soon as the LLM produces them. The retrieved documents, packed into the prompt token budget by a
+    `ContextPacker`, are available through `AnswerStream.documents`.
+
+    Example:
+        stream = ai.stream_query(retriever, "What is the course about?")
+        for token in stream:
+            print(token, end="")
+        sources = stream.documents
+
+    Args:
+        retriever (EmbeddingRetriever): An instance of EmbeddingRetriever used to retrieve relevant documents.
+        question (str): The question to answer.
+        filters (dict, optional): Metadata filters of the retrieved documents.
+
+    Returns:
+        AnswerStream: The stream of the answer tokens.
+    """
+    documents = ContextPacker().pack(retriever.retrieve(query=question, filters=filters, top_k=c.RETRIEVER_TOP_K))
+    # Streaming options are stored in the invocation layer, so each stream needs its own PromptNode
+    return AnswerStream(build_prompt_node(), question, documents)
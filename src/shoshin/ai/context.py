@@ -0,0 +1,151 @@
+import re
+from typing import Callable, List, Optional, Set, Tuple
+
+from haystack.nodes.base import BaseComponent
+from haystack.schema import Document
+
+from ..conf import constants as c
+from ..conf import settings as s
+from ..metrics import metrics
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> Set[str]:
+    return set(_WORD.findall(text.lower()))
+
+
+def _split_id(document: Document) -> Optional[int]:
+    try:
+        return int(document.meta["_split_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _position(document: Document) -> Tuple[str, int]:
+    """Returns the position of a chunk in its source file, used to find adjacent chunks."""
+    split_id = _split_id(document)
+    return str(document.meta.get("name") or ""), -1 if split_id is None else split_id
+
+
+def _is_next(previous: Document, document: Document) -> bool:
+    """Checks if `document` is the chunk that follows `previous` in the same source file."""
+    previous_id, split_id = _split_id(previous), _split_id(document)
+    if previous_id is None or split_id is None or not document.meta.get("name"):
+        return False
+    return previous.meta.get("name") == document.meta.get("name") and split_id == previous_id + 1
+
+
+class ContextPacker(BaseComponent):
+    """
+    A pipeline node that fits the retrieved documents into the token budget of the prompt context.
+
+    Documents are considered by decreasing score: near-duplicates of documents already selected are
+    dropped, and the others are packed greedily while they fit in `max_tokens`, counted with the LLM
+    tokenizer. Selected chunks that are adjacent in the same source file (`name` and `_split_id` metadata)
+    are merged into a single document, so the prompt doesn't repeat the same lesson several times.
+
+    Attributes:
+        max_tokens (int): The token budget of the documents in the prompt.
+        duplicate_threshold (float): The word overlap (Jaccard similarity) above which two documents
+                                     are considered duplicates.
+    """
+
+    outgoing_edges = 1
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        duplicate_threshold: float = 0.8,
+        model: str = c.LLM_MODEL,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ) -> None:
+        """
+        Creates a `ContextPacker` instance.
+
+        Args:
+            max_tokens (int, optional): The token budget of the documents in the prompt. Defaults to settings
+                                        PROMPT_CONTEXT_TOKENS.
+            duplicate_threshold (float): The word overlap above which two documents are considered duplicates.
+            model (str): The LLM whose tokenizer counts tokens.
+            count_tokens (Callable[[str], int], optional): The function used to count the tokens of a text.
+                                                           Defaults to the `tiktoken` encoding of `model`.
+        """
+        super().__init__()
+        self.max_tokens = max_tokens or s.PROMPT_CONTEXT_TOKENS
+        self.duplicate_threshold = duplicate_threshold
+        self._model = model
+        self._count_tokens = count_tokens
+
+    def count_tokens(self, text: str) -> int:
+        """Counts the tokens of a text with the LLM tokenizer."""
+        if self._count_tokens is None:
+            import tiktoken
+
+            encoding = tiktoken.encoding_for_model(self._model)
+            self._count_tokens = lambda value: len(encoding.encode(value))
+        return self._count_tokens(text)
+
+    def _is_duplicate(self, words: Set[str], selected: List[Set[str]]) -> bool:
+        for other in selected:
+            union = len(words | other)
+            if union and len(words & other) / union >= self.duplicate_threshold:
+                return True
+        return False
+
+    def pack(self, documents: List[Document]) -> List[Document]:
+        """
+        Selects and merges the documents that fit the token budget.
+
+        Args:
+            documents (List[Document]): The retrieved documents.
+
+        Returns:
+            List[Document]: The packed documents, by decreasing score.
+        """
+        with metrics.span("pack"):
+            ranked = sorted(documents, key=lambda doc: doc.score or 0.0, reverse=True)
+            selected: List[Document] = []
+            selected_words: List[Set[str]] = []
+            budget = self.max_tokens
+            for document in ranked:
+                words = _words(document.content)
+                if self._is_duplicate(words, selected_words):
+                    continue
+                tokens = self.count_tokens(document.content)
+                if tokens > budget:
+                    continue
+                selected.append(document)
+                selected_words.append(words)
+                budget -= tokens
+            metrics.increment("prompt.context_tokens", self.max_tokens - budget)
+            return self._merge_adjacent(selected)
+
+    def _merge_adjacent(self, documents: List[Document]) -> List[Document]:
+        runs: List[List[Document]] = []
+        for document in sorted(documents, key=_position):
+            if runs and _is_next(runs[-1][-1], document):
+                runs[-1].append(document)
+            else:
+                runs.append([document])
+
+        merged = []
+        for run in runs:
+            if len(run) == 1:
+                merged.append(run[0])
+                continue
+            merged.append(
+                Document(
+                    id=run[0].id,
+                    content=" ".join(chunk.content for chunk in run),
+                    meta=dict(run[0].meta),
+                    score=max(chunk.score or 0.0 for chunk in run),
+                )
+            )
+        return sorted(merged, key=lambda doc: doc.score or 0.0, reverse=True)
+
+    def run(self, query: str, documents: List[Document]):  # type: ignore
+        return {"documents": self.pack(documents)}, "output_1"
+
+    def run_batch(self, queries: List[str], documents: List[List[Document]]):  # type: ignore
+        return {"documents": [self.pack(docs) for docs in documents]}, "output_1"
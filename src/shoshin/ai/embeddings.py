@@ -0,0 +1,402 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import aiohttp
+import numpy as np
+import requests
+from haystack.errors import OpenAIError, OpenAIRateLimitError
+
+from ..aio import client_session
+from ..conf import constants as c
+from ..conf import settings as s
+from ..metrics import metrics
+
+OPENAI_EMBEDDINGS_URL = "https://api.openai.com/v1/embeddings"
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Optional[str]) -> float:
+    """Parses a rate limit reset duration (e.g. `1s`, `6m0s`, `20ms`) returned by the OpenAI API.
+
+    Args:
+        value (str | None): The duration.
+
+    Returns:
+        float: The duration in seconds, or 0 if it can't be parsed.
+    """
+    if not value:
+        return 0.0
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION.findall(value))
+
+
+class RateLimiter:
+    """Adapts the number of concurrent requests to the rate limits returned by the OpenAI API.
+
+    The limiter tracks the remaining requests and tokens reported by the `x-ratelimit-*` response headers,
+    and pauses new requests until the limits reset when a budget is exhausted. The allowed concurrency
+    grows by one after each successful request and is halved after a rate limit error (AIMD).
+
+    Attributes:
+        max_concurrency (int): The maximum number of requests in flight.
+        concurrency (int): The current number of requests allowed in flight.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        """
+        Creates a `RateLimiter` instance.
+
+        Args:
+            max_concurrency (int): The maximum number of requests in flight.
+        """
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self._in_flight = 0
+        self._remaining_requests: Optional[int] = None
+        self._remaining_tokens: Optional[int] = None
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def _can_start(self, tokens: int) -> bool:
+        if self._in_flight >= self.concurrency or time.monotonic() < self._paused_until:
+            return False
+        # Without requests in flight, the budget can't be refreshed by a response: try anyway
+        if self._in_flight == 0:
+            return True
+        if self._remaining_requests is not None and self._remaining_requests <= 0:
+            return False
+        return self._remaining_tokens is None or self._remaining_tokens >= tokens
+
+    def _start(self, tokens: int) -> None:
+        self._in_flight += 1
+        if self._remaining_requests is not None:
+            self._remaining_requests -= 1
+        if self._remaining_tokens is not None:
+            self._remaining_tokens -= tokens
+
+    def acquire(self, tokens: int) -> None:
+        """Blocks until a request of `tokens` tokens can be sent.
+
+        Args:
+            tokens (int): The number of tokens of the request.
+        """
+        with self._condition:
+            while not self._can_start(tokens):
+                self._condition.wait(timeout=max(self._paused_until - time.monotonic(), 0.05))
+            self._start(tokens)
+
+    async def aacquire(self, tokens: int) -> None:
+        """Waits, without blocking the event loop, until a request of `tokens` tokens can be sent.
+
+        Args:
+            tokens (int): The number of tokens of the request.
+        """
+        while True:
+            with self._condition:
+                if self._can_start(tokens):
+                    self._start(tokens)
+                    return
+                # Released requests don't notify the event loop: poll for a free slot
+                wait = max(self._paused_until - time.monotonic(), 0.01)
+            await asyncio.sleep(wait)
+
+    def release(self, headers: Optional[Mapping[str, str]] = None, rate_limited: bool = False) -> None:
+        """Marks a request as completed, updating the budgets from its response headers.
+
+        Args:
+            headers (Mapping[str, str], optional): The response headers.
+            rate_limited (bool): True if the request failed because of a rate limit.
+        """
+        headers = headers or {}
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if "x-ratelimit-remaining-requests" in headers:
+                self._remaining_requests = int(headers["x-ratelimit-remaining-requests"])
+                if self._remaining_requests <= 0:
+                    reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                    self._paused_until = max(self._paused_until, now + reset)
+            if "x-ratelimit-remaining-tokens" in headers:
+                self._remaining_tokens = int(headers["x-ratelimit-remaining-tokens"])
+                if self._remaining_tokens <= 0:
+                    reset = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                    self._paused_until = max(self._paused_until, now + reset)
+
+            if rate_limited:
+                self.concurrency = max(1, self.concurrency // 2)
+                retry_after = (
+                    float(headers.get("retry-after") or 0)
+                    or max(
+                        parse_duration(headers.get("x-ratelimit-reset-requests")),
+                        parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                    )
+                    or 1.0
+                )
+                self._paused_until = max(self._paused_until, now + retry_after)
+                # The reported budgets are stale after a rate limit error
+                self._remaining_requests = None
+                self._remaining_tokens = None
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            self._condition.notify_all()
+
+
+class EmbeddingEngine:
+    """Computes embeddings through the OpenAI API with concurrent, token-budgeted batches.
+
+    Texts are packed into batches of at most `batch_tokens` tokens, and several batches are sent at once
+    through a pooled HTTP session. The number of requests in flight adapts to the rate limits returned
+    by the API (see `RateLimiter`), and rate limited requests are retried after the limits reset.
+
+    `aembed` is the async counterpart of `embed`: batches are sent through an `aiohttp` session from the
+    event loop, sharing the same rate limiter, instead of a thread per request. With `coalesce=True`, the
+    texts of all the coroutines calling `aembed` within the same event loop iteration (e.g. the questions of
+    concurrent `ai.aquery` calls) are embedded together, with as few requests as their token budget allows.
+
+    Attributes:
+        model (str): The embedding model.
+        limiter (RateLimiter): The rate limiter shared by all requests.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = c.EMBEDDING_MODEL,
+        max_concurrency: Optional[int] = None,
+        batch_tokens: Optional[int] = None,
+        max_batch_size: int = 2048,
+        max_retries: int = 5,
+        url: Optional[str] = None,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ) -> None:
+        """
+        Creates an `EmbeddingEngine` instance.
+
+        Args:
+            api_key (str, optional): The OpenAI API key. Defaults to settings OPENAI_API_KEY.
+            model (str): The embedding model.
+            max_concurrency (int, optional): The maximum number of requests in flight. Defaults to settings
+                                             EMBEDDING_CONCURRENCY.
+            batch_tokens (int, optional): The maximum number of tokens of a batch. Defaults to settings
+                                          EMBEDDING_BATCH_TOKENS.
+            max_batch_size (int): The maximum number of texts of a batch.
+            max_retries (int): How many times a rate limited batch is retried.
+            url (str, optional): The embeddings endpoint. Defaults to `/embeddings` of settings OPENAI_API_BASE.
+            count_tokens (Callable[[str], int], optional): The function used to count the tokens of a text.
+                                                           Defaults to the `tiktoken` encoding of `model`.
+        """
+        self.model = model
+        self.limiter = RateLimiter(max_concurrency or s.EMBEDDING_CONCURRENCY)
+        self._api_key = api_key or s.OPENAI_API_KEY
+        self._batch_tokens = batch_tokens or s.EMBEDDING_BATCH_TOKENS
+        self._max_batch_size = max_batch_size
+        self._max_retries = max_retries
+        self._url = url or f"{s.OPENAI_API_BASE}/embeddings"
+        self._count_tokens = count_tokens
+        self._session = requests.Session()
+        self._groups: Dict[Tuple[int, int], _TextGroup] = {}
+
+    def count_tokens(self, text: str) -> int:
+        """Counts the tokens of a text with the model tokenizer."""
+        if self._count_tokens is None:
+            import tiktoken
+
+            encoding = tiktoken.encoding_for_model(self.model)
+            self._count_tokens = lambda value: len(encoding.encode(value))
+        return self._count_tokens(text)
+
+    def batches(self, texts: Sequence[str]) -> List[List[int]]:
+        """Packs texts into batches that fit the token budget, preserving their order.
+
+        Args:
+            texts (Sequence[str]): The texts to embed.
+
+        Returns:
+            List[List[int]]: The indexes of the texts in each batch.
+        """
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if batch and (batch_tokens + tokens > self._batch_tokens or len(batch) >= self._max_batch_size):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        tokens = sum(self.count_tokens(text) for text in texts)
+        headers = {"Authorization": f"Bearer {self._api_key}", "Content-Type": "application/json"}
+        for _ in range(self._max_retries + 1):
+            self.limiter.acquire(tokens)
+            metrics.increment("openai.embeddings.requests")
+            try:
+                response = self._session.post(
+                    self._url, json={"model": self.model, "input": texts}, headers=headers, timeout=c.OPENAI_TIMEOUT
+                )
+            except requests.RequestException as e:
+                self.limiter.release()
+                metrics.increment("openai.embeddings.errors")
+                raise OpenAIError(f"OpenAI embeddings request failed: {e}")
+
+            rate_limited = response.status_code == 429
+            self.limiter.release(response.headers, rate_limited=rate_limited)
+            if rate_limited:
+                metrics.increment("openai.embeddings.retries")
+                continue
+            if response.status_code != 200:
+                raise _error(response.status_code, response.text)
+            return _embeddings(response.json(), tokens)
+
+        raise OpenAIRateLimitError(f"Rate limit still exceeded after {self._max_retries} retries")
+
+    async def _arequest(self, session: aiohttp.ClientSession, texts: List[str]) -> np.ndarray:
+        tokens = sum(self.count_tokens(text) for text in texts)
+        headers = {"Authorization": f"Bearer {self._api_key}", "Content-Type": "application/json"}
+        timeout = aiohttp.ClientTimeout(total=c.OPENAI_TIMEOUT)
+        for _ in range(self._max_retries + 1):
+            await self.limiter.aacquire(tokens)
+            metrics.increment("openai.embeddings.requests")
+            try:
+                async with session.post(
+                    self._url, json={"model": self.model, "input": texts}, headers=headers, timeout=timeout
+                ) as response:
+                    body = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.limiter.release()
+                metrics.increment("openai.embeddings.errors")
+                raise OpenAIError(f"OpenAI embeddings request failed: {e!r}")
+
+            rate_limited = response.status == 429
+            self.limiter.release(response.headers, rate_limited=rate_limited)
+            if rate_limited:
+                metrics.increment("openai.embeddings.retries")
+                continue
+            if response.status != 200:
+                raise _error(response.status, body)
+            return _embeddings(json.loads(body), tokens)
+
+        raise OpenAIRateLimitError(f"Rate limit still exceeded after {self._max_retries} retries")
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Computes the embeddings of many texts, sending batches concurrently.
+
+        Args:
+            texts (Sequence[str]): The texts to embed.
+
+        Raises:
+            OpenAIError: If the OpenAI API request fails, or is still rate limited after all retries.
+
+        Returns:
+            np.ndarray: The embeddings, one row per text.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        batches = self.batches(texts)
+        results: Dict[int, np.ndarray] = {}
+        with ThreadPoolExecutor(max_workers=self.limiter.max_concurrency) as executor:
+            futures = {i: executor.submit(self._request, [texts[j] for j in batch]) for i, batch in enumerate(batches)}
+            for i, future in futures.items():
+                results[i] = future.result()
+        return np.concatenate([results[i] for i in range(len(batches))])
+
+    async def aembed(
+        self, texts: Sequence[str], session: Optional[aiohttp.ClientSession] = None, coalesce: bool = False
+    ) -> np.ndarray:
+        """Computes the embeddings of many texts, sending batches concurrently from the event loop.
+
+        Args:
+            texts (Sequence[str]): The texts to embed.
+            session (aiohttp.ClientSession, optional): The session used to send requests, e.g. from
+                                                       `client_session`. Defaults to a session for this call.
+            coalesce (bool): If True, embed the texts together with the texts of other coroutines calling
+                             `aembed` with the same session in the same event loop iteration.
+
+        Raises:
+            OpenAIError: If the OpenAI API request fails, or is still rate limited after all retries.
+
+        Returns:
+            np.ndarray: The embeddings, one row per text.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if session is None:
+            async with client_session() as session:
+                return await self.aembed(texts, session, coalesce)
+        if coalesce:
+            return await self._aembed_coalesced(texts, session)
+
+        batches = self.batches(texts)
+        results = await asyncio.gather(*(self._arequest(session, [texts[j] for j in batch]) for batch in batches))
+        return np.concatenate(results)
+
+    async def _aembed_coalesced(self, texts: Sequence[str], session: aiohttp.ClientSession) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        key = (id(loop), id(session))
+        group = self._groups.get(key)
+        if group is not None:
+            # Another coroutine embeds the group: wait for its result
+            rows = slice(len(group.texts), len(group.texts) + len(texts))
+            group.texts.extend(texts)
+            group.waiters += 1
+            try:
+                return (await asyncio.shield(group.result))[rows]
+            except asyncio.CancelledError:
+                if not group.result.cancelled():
+                    raise
+            # The coroutine embedding the group was cancelled: embed these texts without it
+            return await self.aembed(texts, session)
+
+        # Let the other ready coroutines join the group before sending it
+        group = self._groups[key] = _TextGroup(list(texts), loop.create_future())
+        try:
+            try:
+                await asyncio.sleep(0)
+            finally:
+                del self._groups[key]
+            if group.waiters:
+                metrics.increment("openai.embeddings.coalesced", group.waiters)
+            embeddings = await self.aembed(group.texts, session)
+        except asyncio.CancelledError:
+            group.result.cancel()
+            raise
+        except BaseException as e:
+            if group.waiters:
+                group.result.set_exception(e)
+            raise
+        group.result.set_result(embeddings)
+        return embeddings[: len(texts)]
+
+
+class _TextGroup:
+    """The texts of concurrent `EmbeddingEngine.aembed` calls, embedded together."""
+
+    def __init__(self, texts: List[str], result: "asyncio.Future[np.ndarray]") -> None:
+        self.texts = texts
+        self.result = result
+        self.waiters = 0
+
+
+def _error(status_code: int, body: str) -> OpenAIError:
+    metrics.increment("openai.embeddings.errors")
+    return OpenAIError(
+        f"OpenAI returned an error.\nStatus code: {status_code}\nResponse body: {body}", status_code=status_code
+    )
+
+
+def _embeddings(payload: dict, tokens: int) -> np.ndarray:
+    """Returns the embeddings of an API response, in the order of the request texts."""
+    metrics.increment("openai.embeddings.tokens", payload.get("usage", {}).get("total_tokens", tokens))
+    data = sorted(payload["data"], key=lambda item: item["index"])
+    return np.array([item["embedding"] for item in data], dtype=np.float32)
@@ -0,0 +1,60 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from haystack.nodes import PromptNode
+from haystack.nodes.prompt import PromptTemplate
+from haystack.schema import Document, MultiLabel
+from haystack.utils.openai_utils import count_openai_tokens_messages
+
+from ..metrics import metrics
+
+
+class MeteredPromptNode(PromptNode):
+    """
+    A PromptNode that records the `generate` span and the OpenAI chat counters of each generation.
+
+    Every call is counted in `openai.chat.requests`, and its duration in the `generate` span, whether it
+    runs within a pipeline, on its own, or streams its answer. Haystack invocation layers don't return the
+    API usage, so the prompt and completion tokens (`openai.chat.prompt_tokens` and
+    `openai.chat.completion_tokens`) are counted with the tokenizer of the model, like the API does.
+    """
+
+    def run(
+        self,
+        query: Optional[str] = None,
+        file_paths: Optional[List[str]] = None,
+        labels: Optional[MultiLabel] = None,
+        documents: Optional[List[Document]] = None,
+        meta: Optional[dict] = None,
+        invocation_context: Optional[Dict[str, Any]] = None,
+        prompt_template: Optional[Union[str, PromptTemplate]] = None,
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Dict, str]:
+        # The signature is repeated, because pipelines only pass the parameters named by `run`
+        metrics.increment("openai.chat.requests")
+        with metrics.span("generate"):
+            output, edge = super().run(
+                query=query,
+                file_paths=file_paths,
+                labels=labels,
+                documents=documents,
+                meta=meta,
+                invocation_context=invocation_context,
+                prompt_template=prompt_template,
+                generation_kwargs=generation_kwargs,
+            )
+        self._count_tokens(output)
+        return output, edge
+
+    def _count_tokens(self, output: Dict) -> None:
+        # The invocation layer loads the tokenizer of the model to check the prompt length
+        tokenizer = getattr(self.prompt_model.model_invocation_layer, "_tokenizer", None)
+        if tokenizer is None:
+            return
+        prompts = output.get("invocation_context", {}).get("prompts") or []
+        answers = output.get(self.output_variable or "results") or []
+        prompt_tokens = sum(
+            count_openai_tokens_messages([{"role": "user", "content": str(prompt)}], tokenizer) for prompt in prompts
+        )
+        completion_tokens = sum(len(tokenizer.encode(answer)) for answer in answers if isinstance(answer, str))
+        metrics.increment("openai.chat.prompt_tokens", prompt_tokens)
+        metrics.increment("openai.chat.completion_tokens", completion_tokens)
@@ -0,0 +1,81 @@
+import queue
+import threading
+from typing import Any, Iterator, List, Optional
+
+from haystack.nodes import PromptNode
+from haystack.nodes.prompt.invocation_layer.handlers import TokenStreamingHandler
+from haystack.schema import Document
+
+_DONE = object()
+
+
+class _QueueStreamingHandler(TokenStreamingHandler):
+    """Forwards tokens received from the LLM to a queue consumed by another thread."""
+
+    def __init__(self, tokens: "queue.Queue[Any]") -> None:
+        self._tokens = tokens
+
+    def __call__(self, token_received: str, **kwargs) -> str:
+        self._tokens.put(token_received)
+        return token_received
+
+
+class AnswerStream:
+    """
+    An answer generated by the LLM, iterated token by token as soon as tokens are produced.
+
+    Documents are retrieved before the generation starts, so `documents` can be used to show the
+    answer sources at any time. Once the iteration completes, `answer` holds the full answer text.
+
+    Attributes:
+        question (str): The question being answered.
+        documents (List[Document]): The documents retrieved for the question.
+        answer (str | None): The full answer, available when the iteration completes.
+    """
+
+    def __init__(self, prompt_node: PromptNode, question: str, documents: List[Document]) -> None:
+        """
+        Creates an `AnswerStream` instance. The generation starts when the stream is iterated.
+
+        Args:
+            prompt_node (PromptNode): The PromptNode used to generate the answer. It must not be shared
+                                      with other threads, because streaming options are stored in the
+                                      invocation layer while the generation runs.
+            question (str): The question being answered.
+            documents (List[Document]): The documents retrieved for the question.
+        """
+        self.question = question
+        self.documents = documents
+        self.answer: Optional[str] = None
+        self._prompt_node = prompt_node
+
+    def __iter__(self) -> Iterator[str]:
+        tokens: "queue.Queue[Any]" = queue.Queue()
+        errors: List[BaseException] = []
+
+        def generate() -> None:
+            try:
+                self._prompt_node.run(
+                    query=self.question,
+                    documents=self.documents,
+                    generation_kwargs={"stream_handler": _QueueStreamingHandler(tokens)},
+                )
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                tokens.put(_DONE)
+
+        worker = threading.Thread(target=generate, daemon=True)
+        worker.start()
+        received = []
+        while True:
+            token = tokens.get()
+            if token is _DONE:
+                break
+            received.append(token)
+            yield token
+        worker.join()
+
+        if errors:
+            raise errors[0]
+        self.answer = "".join(received)
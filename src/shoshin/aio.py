@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+import aiohttp
+
+from .conf import settings as s
+
+T = TypeVar("T")
+
+
+def client_session(max_connections: Optional[int] = None) -> aiohttp.ClientSession:
+    """Creates the `aiohttp` session used by the async API to send requests to the OpenAI API.
+
+    The session keeps a pool of connections alive across requests, so an application should create one
+    session when it starts and pass it to every call (`ai.aquery`, `DocumentStore.acreate_embeddings`...).
+    It must be created and closed within the running event loop.
+
+    Example:
+        async with client_session() as session:
+            answer = await ai.aquery(ds.retriever, "What is Zen?", session=session)
+
+    Args:
+        max_connections (int, optional): The maximum number of open connections. Defaults to settings
+                                         OPENAI_MAX_CONNECTIONS.
+
+    Returns:
+        aiohttp.ClientSession: The session.
+    """
+    connector = aiohttp.TCPConnector(limit=max_connections or s.OPENAI_MAX_CONNECTIONS)
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking call (e.g. a document store search or write) in the default executor of the event loop.
+
+    Like `asyncio.to_thread` (Python 3.9+), the call runs in the context of the caller, so its metrics spans
+    are nested in the spans of the calling task.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, partial(context.run, func, *args, **kwargs))
+
+
+@contextmanager
+def openai_session(session: aiohttp.ClientSession) -> Iterator[None]:
+    """Sends the async requests of the `openai` library through `session` instead of a new session per request."""
+    import openai
+
+    token = openai.aiosession.set(session)
+    try:
+        yield
+    finally:
+        openai.aiosession.reset(token)
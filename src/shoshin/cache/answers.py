@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, FrozenSet, Iterable, Optional
+
+import numpy as np
+
+from ..conf import settings as s
+
+
+@dataclass
+class _Entry:
+    embedding: np.ndarray
+    document_ids: FrozenSet[str]
+    answer: Any
+    expires_at: float
+
+
+class AnswerCache:
+    """An in-memory cache of answers, matched by question similarity.
+
+    A cached answer is returned when a new question embedding has a cosine similarity above `threshold`
+    with a previously answered question, and the retriever returned the same set of documents for both.
+    Including the retrieved documents in the key invalidates answers when the index changes. Entries
+    expire after `ttl` seconds, and the least recently used entries are evicted above `max_size`.
+
+    Attributes:
+        threshold (float): The minimum cosine similarity between two questions to reuse an answer.
+        ttl (float): How long an answer stays valid, in seconds.
+        max_size (int): The maximum number of cached answers.
+    """
+
+    def __init__(
+        self, threshold: Optional[float] = None, ttl: Optional[float] = None, max_size: Optional[int] = None
+    ) -> None:
+        """
+        Creates an `AnswerCache` instance.
+
+        Args:
+            threshold (float, optional): The minimum cosine similarity. Defaults to settings ANSWER_CACHE_THRESHOLD.
+            ttl (float, optional): The answers time to live, in seconds. Defaults to settings ANSWER_CACHE_TTL.
+            max_size (int, optional): The maximum number of answers. Defaults to settings ANSWER_CACHE_MAX_SIZE.
+        """
+        self.threshold = threshold if threshold is not None else s.ANSWER_CACHE_THRESHOLD
+        self.ttl = ttl if ttl is not None else s.ANSWER_CACHE_TTL
+        self.max_size = max_size if max_size is not None else s.ANSWER_CACHE_MAX_SIZE
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def get(self, embedding: np.ndarray, document_ids: Iterable[str]) -> Optional[Any]:
+        """Looks up the answer of a similar question that retrieved the same documents.
+
+        Args:
+            embedding (np.ndarray): The embedding of the question.
+            document_ids (Iterable[str]): The IDs of the documents retrieved for the question.
+
+        Returns:
+            Any | None: The cached answer, or None if no similar question was answered.
+        """
+        embedding = self._normalize(embedding)
+        document_ids = frozenset(document_ids)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_similarity = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if entry.expires_at <= now:
+                    del self._entries[entry_id]
+                    continue
+                if entry.document_ids != document_ids:
+                    continue
+                similarity = float(np.dot(entry.embedding, embedding))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                return None
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id].answer
+
+    def set(self, embedding: np.ndarray, document_ids: Iterable[str], answer: Any) -> None:
+        """Stores the answer of a question, evicting the least recently used answers if the cache is full.
+
+        Args:
+            embedding (np.ndarray): The embedding of the question.
+            document_ids (Iterable[str]): The IDs of the documents retrieved for the question.
+            answer (Any): The answer.
+        """
+        entry = _Entry(self._normalize(embedding), frozenset(document_ids), answer, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all cached answers."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,169 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from ..conf import settings as s
+
+_KEY_SIZE = hashlib.sha256().digest_size
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes a text before hashing, so that whitespace-only changes reuse the same embedding."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class EmbeddingCache:
+    """A persistent cache of text embeddings for a single embedding model.
+
+    Embeddings are keyed by the SHA-256 of the normalized text and stored in two append-only files:
+    `vectors.f32`, a float32 matrix read through a memory map, and `keys.bin`, the digest of the text
+    stored at the same row. The cache lives outside the document store, so embeddings are reused
+    across indexes and rebuilds.
+
+    Processes sharing the cache (e.g. `serve` and `embeddings-load`) append rows under an exclusive lock
+    of `cache.lock`, after reading the rows appended by the others, so a row always holds the vector of
+    its key. Rows appended by other processes are also read when a lookup misses.
+
+    Attributes:
+        path (str): The folder where the embeddings of `model` are stored.
+        model (str): The embedding model.
+        dim (int): The dimensionality of the embeddings.
+    """
+
+    def __init__(self, model: str, dim: int, path: Optional[str] = None) -> None:
+        """
+        Creates an `EmbeddingCache` instance, loading the index of the stored embeddings.
+
+        Args:
+            model (str): The embedding model.
+            dim (int): The dimensionality of the embeddings.
+            path (str, optional): The cache folder. Defaults to the `embeddings/<model>` folder in settings CACHE_DIR.
+        """
+        self.model = model
+        self.dim = dim
+        self.path = path or os.path.join(os.path.expanduser(s.CACHE_DIR), "embeddings", model)
+        os.makedirs(self.path, exist_ok=True)
+
+        self._keys_file = os.path.join(self.path, "keys.bin")
+        self._vectors_file = os.path.join(self.path, "vectors.f32")
+        self._lock_file = os.path.join(self.path, "cache.lock")
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._vectors: Optional[np.ndarray] = None
+        with self._file_lock():
+            self._read_keys(self._stored_rows(truncate=True))
+
+    @property
+    def _row_size(self) -> int:
+        return self.dim * np.dtype(np.float32).itemsize
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Holds the lock that serializes the writes of all processes sharing the cache folder."""
+        with open(self._lock_file, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stored_rows(self, truncate: bool = False) -> int:
+        """Returns the number of rows stored with both a key and a vector.
+
+        Args:
+            truncate (bool): If True, remove the partial row left by an interrupted write. Requires the file lock,
+                             as the partial row of a concurrent write is not complete yet.
+        """
+        keys_size = os.path.getsize(self._keys_file) if os.path.exists(self._keys_file) else 0
+        vectors_size = os.path.getsize(self._vectors_file) if os.path.exists(self._vectors_file) else 0
+        rows = min(keys_size // _KEY_SIZE, vectors_size // self._row_size)
+        if truncate and keys_size != rows * _KEY_SIZE:
+            with open(self._keys_file, "r+b") as f:
+                f.truncate(rows * _KEY_SIZE)
+        if truncate and vectors_size != rows * self._row_size:
+            with open(self._vectors_file, "r+b") as f:
+                f.truncate(rows * self._row_size)
+        return rows
+
+    def _read_keys(self, rows: int) -> None:
+        """Indexes the keys of the rows appended since the last read, by this or another process."""
+        if rows <= self._rows:
+            return
+        with open(self._keys_file, "rb") as f:
+            f.seek(self._rows * _KEY_SIZE)
+            keys = f.read((rows - self._rows) * _KEY_SIZE)
+        for i in range(rows - self._rows):
+            start = i * _KEY_SIZE
+            end = start + _KEY_SIZE
+            # The first row of a key wins if concurrent writers stored it twice
+            self._index.setdefault(keys[start:end], self._rows + i)
+        self._rows = rows
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) < self._rows:
+            if not self._rows:
+                return np.empty((0, self.dim), dtype=np.float32)
+            self._vectors = np.memmap(self._vectors_file, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return self._vectors
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        """Returns the cache key of a text."""
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Looks up the embeddings of many texts.
+
+        Args:
+            texts (Sequence[str]): The texts to look up.
+
+        Returns:
+            List[Optional[np.ndarray]]: The embedding of each text, or None if the text is not cached.
+        """
+        with self._lock:
+            keys = [self.key(text) for text in texts]
+            if any(key not in self._index for key in keys):
+                # Vectors are written before keys: rows with a key are complete, even without the file lock
+                self._read_keys(self._stored_rows())
+            matrix = self._matrix()
+            rows = [self._index.get(key) for key in keys]
+            return [None if row is None else np.array(matrix[row]) for row in rows]
+
+    def set_many(self, texts: Sequence[str], embeddings: np.ndarray) -> None:
+        """Stores the embeddings of many texts. Texts that are already cached are ignored.
+
+        Args:
+            texts (Sequence[str]): The embedded texts.
+            embeddings (np.ndarray): The embeddings, one row per text.
+        """
+        with self._lock, self._file_lock():
+            # Rows are numbered after the rows stored by all processes, not only by this one
+            self._read_keys(self._stored_rows(truncate=True))
+            keys, rows = [], []
+            for text, embedding in zip(texts, embeddings):
+                key = self.key(text)
+                if key not in self._index and key not in keys:
+                    keys.append(key)
+                    rows.append(embedding)
+            if not keys:
+                return
+
+            # Vectors are written before keys: a key is never stored without its vector
+            with open(self._vectors_file, "ab") as f:
+                f.write(np.asarray(rows, dtype=np.float32).tobytes())
+            with open(self._keys_file, "ab") as f:
+                f.write(b"".join(keys))
+            for key in keys:
+                self._index[key] = self._rows
+                self._rows += 1
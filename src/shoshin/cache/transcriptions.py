@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from ..conf import settings as s
+
+_READ_SIZE = 1024 * 1024
+
+
+@dataclass
+class CacheStats:
+    """Usage statistics of an on-disk cache.
+
+    Attributes:
+        path (str): The folder where the cache is stored.
+        entries (int): The number of cached items.
+        size (int): The total size of cached items, in bytes.
+        max_size (int): The size above which the least recently used items are evicted, in bytes.
+    """
+
+    path: str
+    entries: int
+    size: int
+    max_size: int
+
+
+class TranscriptionCache:
+    """A content-addressed on-disk cache of audio transcriptions.
+
+    Transcriptions are keyed by the hash of the audio content and the speech recognition model, so
+    the same audio is never sent twice to the API, regardless of its file name or location. Each item
+    is stored as a JSON file with the transcribed text and its metadata. When the cache grows over
+    `max_size`, the least recently used items are evicted. The cache size is scanned once, then tracked
+    as items are written, so the folder is scanned again only when the cache is over budget.
+
+    Attributes:
+        path (str): The folder where transcriptions are stored.
+        max_size (int): The maximum size of the cache, in bytes.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: Optional[int] = None) -> None:
+        """
+        Creates a `TranscriptionCache` instance.
+
+        Args:
+            path (str, optional): The cache folder. Defaults to the `transcriptions` folder in settings CACHE_DIR.
+            max_size (int, optional): The maximum size of the cache, in bytes. Defaults to settings
+                                      TRANSCRIPTION_CACHE_MAX_SIZE.
+        """
+        self.path = path or os.path.join(os.path.expanduser(s.CACHE_DIR), "transcriptions")
+        self.max_size = max_size if max_size is not None else s.TRANSCRIPTION_CACHE_MAX_SIZE
+        os.makedirs(self.path, exist_ok=True)
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(stream: BinaryIO, model: str) -> str:
+        """Computes the cache key of an audio stream, leaving the stream position unchanged.
+
+        Args:
+            stream (BinaryIO): The audio content.
+            model (str): The speech recognition model.
+
+        Returns:
+            str: The hex digest of the model name and the audio content.
+        """
+        position = stream.tell()
+        digest = hashlib.sha256(model.encode("utf-8") + b"\0")
+        for block in iter(lambda: stream.read(_READ_SIZE), b""):
+            digest.update(block)
+        stream.seek(position)
+        return digest.hexdigest()
+
+    def _item_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        """Retrieves a cached transcription and marks it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict | None: The transcription `text` and its metadata, or None if the key is not cached.
+        """
+        path = self._item_path(key)
+        try:
+            with open(path) as f:
+                item = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Access time is not reliable on all file systems, so modification time tracks usage
+        os.utime(path)
+        return item
+
+    def set(self, key: str, text: str, **metadata) -> None:
+        """Stores a transcription, evicting the least recently used items if the cache is full.
+
+        Args:
+            key (str): The cache key.
+            text (str): The transcribed text.
+            **metadata: Additional information stored with the transcription (e.g. model, source).
+        """
+        item = {"text": text, "created_at": time.time(), **metadata}
+        path = self._item_path(key)
+        # Write to a unique temporary file first, so concurrent readers never see a partial item
+        # and concurrent writers of the same key never replace each other's temporary file
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=f"{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(item, f)
+            written = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(item_size for _, item_size, _ in self._items())
+            else:
+                # Overwritten items are counted twice: it only makes the next prune happen earlier
+                self._size += written
+            over_budget = self._size > self.max_size
+        if over_budget:
+            self.prune()
+
+    def _items(self):
+        items = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                items.append((stat.st_mtime, stat.st_size, entry.path))
+        return items
+
+    def stats(self) -> CacheStats:
+        """Returns the cache usage statistics."""
+        items = self._items()
+        return CacheStats(self.path, len(items), sum(size for _, size, _ in items), self.max_size)
+
+    def prune(self, max_size: Optional[int] = None) -> int:
+        """Evicts the least recently used items until the cache is smaller than `max_size`.
+
+        Args:
+            max_size (int, optional): The target size of the cache, in bytes. Defaults to the cache `max_size`.
+
+        Returns:
+            int: The number of evicted items.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        items = sorted(self._items())
+        size = sum(item_size for _, item_size, _ in items)
+        evicted = 0
+        for _, item_size, path in items:
+            if size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already evicted by a concurrent writer
+                pass
+            size -= item_size
+            evicted += 1
+        with self._lock:
+            self._size = size
+        return evicted
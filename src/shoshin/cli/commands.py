@@ -1,59 +1,143 @@
+import json
 import os
+import time
+from collections import deque
+from dataclasses import asdict
 from pathlib import Path
+from typing import Deque, Iterator, Optional, Tuple
 
 import click
-from haystack.utils import convert_files_to_docs
 
-from shoshin import ai
 from shoshin.conf import settings as s
-from shoshin.datastore.documents import DocumentStore
 from shoshin.exceptions import AIError, AudioExtractionError
-from shoshin.pipeline import processors
+from shoshin.metrics import metrics
+
+# NOTE: commands import their dependencies when they run. Haystack and OpenAI take seconds to load,
+# and `shoshin --help` or `shoshin convert` (often called from shell loops) must start fast.
+# `tests/test_cli_startup.py` fails if a heavy module is imported with this module.
+
+_MB = 1024 * 1024
 
 
 @click.group()
-def cli():
-    pass
+@click.option("--profile", default=False, is_flag=True, help="Print the time spent in each stage when done")
+@click.option(
+    "--profile-format",
+    type=click.Choice(["text", "json", "prometheus"]),
+    default="text",
+    show_default=True,
+    help="Format of the profile",
+)
+@click.pass_context
+def cli(ctx: click.Context, profile: bool, profile_format: str):
+    if not profile:
+        return
+
+    def print_profile():
+        report = {"text": metrics.breakdown, "json": metrics.to_json, "prometheus": metrics.to_prometheus}
+        click.echo(report[profile_format](), err=True)
+
+    ctx.call_on_close(print_profile)
 
 
 @cli.command()
-@click.argument("video_file")
+@click.argument("video_path")
 @click.option("--output", help="Output file name (default: <video_file>.mp3)")
-def convert(video_file: str, output: str):
-    _, ext = os.path.splitext(video_file)
-    ext = ext.lower()
-    if ext != ".mp4":
-        raise ValueError(f"Unsupported file type {ext}. Only .mp4 video files are supported.")
+@click.option("--output-dir", default=".", show_default=True, help="Output folder when converting many videos")
+@click.option("--workers", default=os.cpu_count(), show_default=True, help="Number of parallel ffmpeg processes")
+@click.option("--force", default=False, is_flag=True, help="Convert videos even if their audio file is up to date")
+def convert(video_path: str, output: str, output_dir: str, workers: int, force: bool):
+    """Converts a video file, a folder of videos or a glob pattern (e.g. "videos/*.mp4") to audio."""
+    from shoshin.pipeline import batch, journal, processors
 
-    # If no output file name is provided, use the video file name with an MP3 extension.
-    if output is None:
-        output = Path(video_file).stem + ".mp3"
+    if os.path.isfile(video_path):
+        _, ext = os.path.splitext(video_path)
+        ext = ext.lower()
+        if ext != ".mp4":
+            raise ValueError(f"Unsupported file type {ext}. Only .mp4 video files are supported.")
 
-    try:
-        processors.extract_audio_from_video(video_file, output)
-    except AudioExtractionError as e:
-        raise click.ClickException(e)
+        # If no output file name is provided, use the video file name with an MP3 extension.
+        if output is None:
+            output = Path(video_path).stem + ".mp3"
+
+        try:
+            processors.extract_audio_from_video(video_path, output)
+        except AudioExtractionError as e:
+            raise click.ClickException(e)
+
+        click.echo(f"Audio track converted to: {output}")
+        return
+
+    if output is not None:
+        raise click.BadParameter("--output is only supported for single files, use --output-dir instead")
+
+    video_files = batch.find_video_files(video_path)
+    if not video_files:
+        raise click.ClickException(f"No .mp4 video files found in: {video_path}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(video_file, batch.output_path(video_file, output_dir)) for video_file in video_files]
+
+    # Convert videos in parallel and report per-file throughput as soon as each job completes
+    click.echo(f"Converting {len(jobs)} videos with {workers} workers...")
+    start = time.perf_counter()
+    converted, skipped, failed, total_size = 0, 0, 0, 0
+    ingest_journal = journal.Journal.for_folder(output_dir)
+    for result in batch.extract_audio_from_videos(jobs, workers=workers, force=force, journal=ingest_journal):
+        if result.skipped:
+            skipped += 1
+            click.echo(f"[skipped] {result.output_file} is up to date")
+        elif result.error:
+            failed += 1
+            click.echo(f"[failed]  {result.video_file}: {result.error}", err=True)
+        else:
+            converted += 1
+            total_size += result.size
+            click.echo(
+                f"[done]    {result.output_file} ({result.size / _MB:.1f} MB in {result.elapsed:.1f}s, "
+                f"{result.throughput / _MB:.1f} MB/s)"
+            )
 
-    click.echo(f"Audio track converted to: {output}")
+    elapsed = time.perf_counter() - start
+    throughput = total_size / elapsed / _MB if elapsed > 0 else 0.0
+    click.echo(
+        f"Converted {converted} videos ({skipped} skipped, {failed} failed) in {elapsed:.1f}s: "
+        f"{total_size / _MB:.1f} MB at {throughput:.1f} MB/s"
+    )
+    if failed:
+        raise click.ClickException(f"{failed} videos failed to convert")
 
 
 @cli.command()
 @click.argument("audio_file")
 @click.option("--output", help="Output file name (default: <audio_file>.txt)")
-def transcribe(audio_file: str, output: str):
+@click.option(
+    "--workers",
+    type=int,
+    default=lambda: s.TRANSCRIPTION_WORKERS,
+    show_default="settings TRANSCRIPTION_WORKERS",
+    help="Number of concurrent requests",
+)
+def transcribe(audio_file: str, output: str, workers: int):
+    """Transcribes an .mp3 audio file, or streams the audio of an .mp4 video file without writing it to disk."""
+    from shoshin.pipeline import processors
+
     _, ext = os.path.splitext(audio_file)
     ext = ext.lower()
-    if ext != ".mp3":
-        raise ValueError(f"Unsupported file type {ext}. Only .mp3 audio files are supported.")
+    if ext not in (".mp3", ".mp4"):
+        raise ValueError(f"Unsupported file type {ext}. Only .mp3 audio and .mp4 video files are supported.")
 
-    # If no output file name is provided, use the video file name with an MP3 extension.
+    # If no output file name is provided, use the input file name with a TXT extension.
     if output is None:
         output = Path(audio_file).stem + ".txt"
 
     # Save the transcription to a file.
     try:
-        processors.transcribe_speech_to_text(audio_file, output)
-    except AIError as e:
+        if ext == ".mp4":
+            processors.transcribe_video_stream(audio_file, output, workers=workers)
+        else:
+            processors.transcribe_speech_to_text(audio_file, output, workers=workers)
+    except (AIError, AudioExtractionError) as e:
         raise click.ClickException(e)
 
     click.echo(f"Audio transcript saved in: {output}")
@@ -61,33 +145,295 @@ def transcribe(audio_file: str, output: str):
 
 @cli.command()
 @click.argument("transcriptions_folder")
-@click.option("--language", default=s.DEFAULT_LANGUAGE, show_default=True, help="Transcriptions language")
-@click.option("--no-progress", default=False, is_flag=True, show_default=True, help="Disable progress bar")
-def embeddings_load(transcriptions_folder: str, language: str, disable_progress_bar: bool):
+@click.option(
+    "--language",
+    default=lambda: s.DEFAULT_LANGUAGE,
+    show_default="settings DEFAULT_LANGUAGE",
+    help="Transcriptions language",
+)
+@click.option("--no-progress", "disable_progress_bar", default=False, is_flag=True, help="Disable progress bar")
+@click.option("--incremental", default=False, is_flag=True, help="Embed only new or changed documents")
+@click.option("--workers", default=os.cpu_count(), show_default=True, help="Number of preprocessing processes")
+@click.option("--restart", default=False, is_flag=True, help="Ignore the progress of an interrupted run")
+@click.option("--course", help="Course of the transcriptions, stored in its own index")
+def embeddings_load(
+    transcriptions_folder: str,
+    language: str,
+    disable_progress_bar: bool,
+    incremental: bool,
+    workers: int,
+    restart: bool,
+    course: str,
+):
+    from shoshin.datastore.documents import DocumentStore
+    from shoshin.pipeline import journal, processors
+
     # Update settings (progress bar)
     s.PROGRESS_BAR = not disable_progress_bar
 
-    # Convert transcriptions to Haystack documents
-    click.echo("Loading transcriptions into memory...")
-    all_docs = convert_files_to_docs(dir_path=transcriptions_folder)
+    # Resume an interrupted run, skipping transcriptions already written with their embeddings
+    ds = DocumentStore(course=course)
+    ingest_journal = journal.Journal.for_folder(transcriptions_folder)
+    stage = journal.embedded_stage(ds.index)
+    if restart:
+        ingest_journal.reset(stage)
+    files = [str(path) for path in processors.find_transcriptions(transcriptions_folder)]
+    fingerprints = {path: journal.fingerprint(path) for path in files}
+    pending = [path for path in files if not ingest_journal.is_done(path, stage, fingerprints[path])]
+    if len(pending) < len(files):
+        click.echo(f"Resuming: {len(files) - len(pending)} transcriptions already loaded")
+
+    def on_batch(documents):
+        # Chunks carry the path of their transcription, so that lessons with the same name in different
+        # subfolders are recorded separately
+        for path in {doc.meta.get("path") for doc in documents}:
+            if path in fingerprints:
+                ingest_journal.mark_done(path, stage, fingerprints[path])
 
-    # Preprocess documents using Haystack pre-processors
+    # Read transcriptions lazily and preprocess them in parallel using Haystack pre-processors
     click.echo("Cleaning documents...")
-    documents = processors.clean_documents(all_docs, language)
+    transcriptions = processors.read_transcriptions([Path(path) for path in pending], course=course)
+    batches = processors.clean_documents_stream(transcriptions, language, workers=workers)
+
+    # Generate embeddings through OpenAI and write them into Document Store, batch by batch
+    click.echo("Create embeddings...")
+    report = ds.write_embeddings(batches, incremental=incremental, on_batch=on_batch)
+
+    # The run completed: the next one loads all transcriptions again
+    ingest_journal.reset(stage)
+    click.echo(f"Embeddings updated! {report.embedded} embedded, {report.skipped} skipped, {report.deleted} deleted")
+
 
-    # Write documents into Document Store and generate embeddings through OpenAI
-    click.echo(f"Create embeddings for {len(documents)} documents...")
-    ds = DocumentStore()
-    ds.create_embeddings(documents)
-    click.echo("Embeddings updated!")
+@cli.command(name="ingest")
+@click.argument("videos_path")
+@click.option("--output-dir", default=".", show_default=True, help="Folder of audio files and transcriptions")
+@click.option(
+    "--language",
+    default=lambda: s.DEFAULT_LANGUAGE,
+    show_default="settings DEFAULT_LANGUAGE",
+    help="Transcriptions language",
+)
+@click.option("--extract-workers", default=os.cpu_count(), show_default=True, help="Number of ffmpeg processes")
+@click.option("--transcribe-workers", default=2, show_default=True, help="Number of files transcribed at once")
+@click.option(
+    "--embedding-workers",
+    type=int,
+    default=lambda: s.EMBEDDING_CONCURRENCY,
+    show_default="settings EMBEDDING_CONCURRENCY",
+    help="Number of embedding requests",
+)
+@click.option("--preprocess-workers", default=1, show_default=True, help="Number of preprocessing processes")
+@click.option("--queue-size", default=4, show_default=True, help="Number of files waiting between two stages")
+@click.option("--incremental", default=False, is_flag=True, help="Embed only new or changed documents")
+@click.option("--course", help="Course of the videos, stored in its own index")
+def ingest_videos(
+    videos_path: str,
+    output_dir: str,
+    language: str,
+    extract_workers: int,
+    transcribe_workers: int,
+    embedding_workers: int,
+    preprocess_workers: int,
+    queue_size: int,
+    incremental: bool,
+    course: str,
+):
+    """Converts, transcribes and embeds a folder of videos (or a glob pattern), running all stages at once."""
+    from shoshin.datastore.documents import DocumentStore
+    from shoshin.pipeline import batch, ingest, journal
+
+    video_files = batch.find_video_files(videos_path)
+    if not video_files:
+        raise click.ClickException(f"No .mp4 video files found in: {videos_path}")
+
+    # Update settings (embedding requests in flight)
+    s.EMBEDDING_CONCURRENCY = embedding_workers
+
+    def on_progress(progress: ingest.StageProgress, video_file: str, error: Optional[str]) -> None:
+        status = "failed" if error else f"{progress.completed + progress.skipped}/{len(video_files)}"
+        click.echo(f"[{progress.name}] {Path(video_file).name} {status}", err=error is not None)
+        if error:
+            click.echo(f"  {error}", err=True)
+
+    ds = DocumentStore(course=course)
+    os.makedirs(output_dir, exist_ok=True)
+    ingest_journal = journal.Journal.for_folder(output_dir)
+    click.echo(f"Ingesting {len(video_files)} videos...")
+    try:
+        report = ingest.ingest(
+            video_files,
+            output_dir,
+            ds,
+            language,
+            extract_workers=extract_workers,
+            transcribe_workers=transcribe_workers,
+            preprocess_workers=preprocess_workers,
+            queue_size=queue_size,
+            incremental=incremental,
+            journal=ingest_journal,
+            on_progress=on_progress,
+        )
+    except AIError as e:
+        raise click.ClickException(e)
+
+    # The run completed: the next one embeds all transcriptions again
+    ingest_journal.reset(journal.embedded_stage(ds.index))
+    for progress in report.stages.values():
+        busy = f" ({progress.busy:.1f}s busy)" if progress.busy else ""
+        click.echo(
+            f"{progress.name}: {progress.completed} done, {progress.skipped} skipped, {progress.failed} failed{busy}"
+        )
+    click.echo(
+        f"Ingested in {report.elapsed:.1f}s: {report.embeddings.embedded} documents embedded, "
+        f"{report.embeddings.skipped} skipped, {report.embeddings.deleted} deleted"
+    )
+    failed = sum(progress.failed for progress in report.stages.values())
+    if failed:
+        raise click.ClickException(f"{failed} videos failed to ingest")
+
+
+@cli.command()
+@click.argument("question", required=False)
+@click.option("--stream", default=False, is_flag=True, help="Print the answer while it's generated")
+@click.option("--batch", "batch_file", help='Answer the questions of a JSONL file ({"question": ...} per line)')
+@click.option("--output", default="-", show_default=True, help="JSONL file of the batch answers")
+@click.option(
+    "--concurrency",
+    type=int,
+    default=lambda: s.QUERY_BATCH_CONCURRENCY,
+    show_default="settings QUERY_BATCH_CONCURRENCY",
+    help="Number of batch answers generated at once",
+)
+@click.option("--course", help="Search only the index of this course")
+@click.option("--lesson", "lessons", multiple=True, help="Search only this lesson (can be repeated)")
+def query(
+    question: str, stream: bool, batch_file: str, output: str, concurrency: int, course: str, lessons: Tuple[str]
+):
+    from shoshin import ai
+    from shoshin.datastore.documents import DocumentStore
+
+    if (question is None) == (batch_file is None):
+        raise click.UsageError("Pass either a QUESTION or --batch")
+
+    # Lessons are filtered by the vector search itself, so other lessons don't take the top results
+    ds = DocumentStore(course=course)
+    filters = {"lesson": list(lessons)} if lessons else None
+    if batch_file is not None:
+        _query_batch(ds, batch_file, output, concurrency, filters)
+        return
+
+    if not stream:
+        response = ai.query(ds.retriever, question, filters=filters)
+        click.echo(response)
+        return
+
+    answer = ai.stream_query(ds.retriever, question, filters=filters)
+    for token in answer:
+        click.echo(token, nl=False)
+    click.echo()
+
+    sources = sorted({doc.meta.get("name") for doc in answer.documents if doc.meta.get("name")})
+    if sources:
+        click.echo(f"\nSources: {', '.join(sources)}")
+
+
+def _read_questions(batch_file: str, records: Deque[dict]) -> Iterator[str]:
+    """Lazily reads the questions of a JSONL file, keeping each record until its answer is written."""
+    with open(batch_file) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"question": record}
+            if not isinstance(record, dict) or not isinstance(record.get("question"), str):
+                raise click.ClickException(f"{batch_file}:{number}: expected a question string or object")
+            records.append(record)
+            yield record["question"]
+
+
+def _query_batch(ds, batch_file: str, output: str, concurrency: int, filters: Optional[dict]):
+    from shoshin import ai
+
+    # Other fields of the input records (e.g. ids) are copied to the answers
+    records: Deque[dict] = deque()
+    questions = _read_questions(batch_file, records)
+    start = time.perf_counter()
+    answered, failed = 0, 0
+    with click.open_file(output, "w") as f:
+        try:
+            for answer in ai.query_batch(ds.retriever, questions, concurrency=concurrency, filters=filters):
+                result = {**records.popleft(), **asdict(answer)}
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
+                answered += 1
+                failed += answer.error is not None
+        except AIError as e:
+            raise click.ClickException(e)
+
+    elapsed = time.perf_counter() - start
+    click.echo(f"Answered {answered} questions ({failed} failed) in {elapsed:.1f}s", err=True)
+    if failed:
+        raise click.ClickException(f"{failed} questions failed")
 
 
 @cli.command()
-@click.argument("question")
-def query(question: str):
-    ds = DocumentStore()
-    response = ai.query(ds.retriever, question)
-    click.echo(response)
+@click.option(
+    "--host", default=lambda: s.SERVER_HOST, show_default="settings SERVER_HOST", help="Address the server listens on"
+)
+@click.option(
+    "--port",
+    type=int,
+    default=lambda: s.SERVER_PORT,
+    show_default="settings SERVER_PORT",
+    help="Port the server listens on",
+)
+@click.option(
+    "--max-concurrency",
+    type=int,
+    default=lambda: s.SERVER_MAX_CONCURRENCY,
+    show_default="settings SERVER_MAX_CONCURRENCY",
+    help="Questions answered at once",
+)
+def serve(host: str, port: int, max_concurrency: int):
+    """Starts an HTTP server that answers questions (POST /query) with a warm pipeline."""
+    from shoshin.server.app import QueryServer, QueryService
+
+    click.echo("Loading document store and pipeline...")
+    service = QueryService(max_concurrency=max_concurrency)
+    server = QueryServer((host, port), service)
+    click.echo(f"Serving questions on http://{host}:{server.server_port}/query")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@cli.group()
+def cache():
+    """Inspects and prunes local caches."""
+
+
+@cache.command()
+def stats():
+    from shoshin.cache.transcriptions import TranscriptionCache
+
+    usage = TranscriptionCache().stats()
+    click.echo(
+        f"Transcriptions: {usage.entries} items, {usage.size / _MB:.1f} MB / {usage.max_size / _MB:.1f} MB "
+        f"({usage.path})"
+    )
+
+
+@cache.command()
+@click.option("--max-size", type=float, help="Target cache size in MB (default: cache max size)")
+def prune(max_size: float):
+    from shoshin.cache.transcriptions import TranscriptionCache
+
+    evicted = TranscriptionCache().prune(int(max_size * _MB) if max_size is not None else None)
+    click.echo(f"Transcriptions: {evicted} items evicted")
 
 
 if __name__ == "__main__":
@@ -3,19 +3,46 @@
 Constants:
     EMBEDDING_DIM (int): The dimensionality of the text embeddings.
     EMBEDDING_MODEL (str): The name of the text embedding model to use.
+    LOCAL_EMBEDDING_DIMS (Dict[str, int]): The dimensionality of the embeddings of known local embedding models.
     LLM_MODEL (str): The name of the language model to use for text generation.
+    OPENAI_TIMEOUT (int): The timeout, in seconds, of requests sent directly to the OpenAI API.
     PREPROCESSOR_SPLIT_LENGTH (int): The maximum length of text to process at once during preprocessing.
     RETRIEVER_TOP_K (int): The number of documents to retrieve from the index during a search.
+    RRF_K (int): The rank smoothing constant of the reciprocal rank fusion used by hybrid retrieval.
+    SPEECH_TO_TEXT_MODEL (str): The name of the speech recognition model to use.
+    SPEECH_TO_TEXT_MAX_FILE_SIZE (int): The maximum audio file size, in bytes, accepted by the speech recognition API.
+    SILENCE_THRESHOLD_DB (int): The volume, in dB, below which audio is considered silence.
+    SILENCE_MIN_DURATION (float): The minimum duration, in seconds, of a silence used to split audio files.
+    STREAM_CHUNK_DURATION (int): The maximum duration, in seconds, of audio chunks streamed to the speech recognition
+                                 API. 16kHz mono WAV chunks of 10 minutes are ~19MB, below the API limit.
+    STREAM_SILENCE_SEARCH (int): The final portion, in seconds, of a streamed chunk searched for a silence to cut at.
 """
 # LLM
 # NOTE: `text-embedding-ada-002` has an output dimension of 1536
 EMBEDDING_DIM = 1536
 EMBEDDING_MODEL = "text-embedding-ada-002"
 LLM_MODEL = "gpt-3.5-turbo"
+LOCAL_EMBEDDING_DIMS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "sentence-transformers/multi-qa-MiniLM-L6-cos-v1": 384,
+    "sentence-transformers/multi-qa-mpnet-base-dot-v1": 768,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+}
+OPENAI_TIMEOUT = 30
+SPEECH_TO_TEXT_MODEL = "whisper-1"
+SPEECH_TO_TEXT_MAX_FILE_SIZE = 25 * 1024 * 1024
 
 # Haystack
 PREPROCESSOR_SPLIT_LENGTH = 100
 RETRIEVER_TOP_K = 10
+RRF_K = 60
 
 # Processing
 AUDIO_SAMPLE_RATE = 16000
+SILENCE_THRESHOLD_DB = -35
+SILENCE_MIN_DURATION = 0.5
+STREAM_CHUNK_DURATION = 600
+STREAM_SILENCE_SEARCH = 30
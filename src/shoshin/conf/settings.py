@@ -1,4 +1,5 @@
 import os
+from typing import TYPE_CHECKING, Optional
 
 from dotenv import load_dotenv
 from pydantic import BaseSettings
@@ -7,17 +8,86 @@ from pydantic import BaseSettings
 class Settings(BaseSettings):
     """Shoshin settings"""
 
-    DATABASE_URL: str
+    ANSWER_CACHE: bool = True
+    ANSWER_CACHE_MAX_SIZE: int = 1000
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_TTL: int = 3600
+    CACHE_DIR: str = "~/.cache/shoshin"
+    DATABASE_URL: Optional[str] = None
     DEFAULT_LANGUAGE: str = "en"
+    DOCUMENT_STORE_BACKEND: str = "milvus"
+    DOCUMENTS_BATCH_SIZE: int = 500
     DOCUMENTS_INDEX: str = "document"
+    EMBEDDED_STORE_ANN: str = "flat"
+    EMBEDDED_STORE_DIR: str = "~/.local/share/shoshin/documents"
+    EMBEDDED_STORE_NPROBE: int = 8
+    EMBEDDING_BACKEND: str = "openai"
+    EMBEDDING_BATCH_TOKENS: int = 50000
+    EMBEDDING_CACHE: bool = True
+    EMBEDDING_CONCURRENCY: int = 8
+    HYBRID_LEXICAL_MARGIN: float = 3.0
+    HYBRID_LEXICAL_MIN_SCORE: float = 5.0
+    LEXICAL_INDEX_DIR: str = "~/.local/share/shoshin/lexical"
+    LOCAL_EMBEDDING_BATCH_SIZE: int = 32
+    LOCAL_EMBEDDING_DIM: Optional[int] = None
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    LOCAL_EMBEDDING_THREADS: Optional[int] = None
+    MILVUS_NLIST: int = 1024
+    MILVUS_NPROBE: int = 16
+    OPENAI_API_BASE: str = "https://api.openai.com/v1"
     OPENAI_API_KEY: str
+    OPENAI_MAX_CONNECTIONS: int = 100
     PROGRESS_BAR: bool = False
+    PROMPT_CONTEXT_TOKENS: int = 1500
     PROMPT_MAX_TOKENS: int = 2048
+    QUERY_BATCH_CONCURRENCY: int = 8
+    QUERY_BATCH_SIZE: int = 100
+    RETRIEVAL_MODE: str = "embedding"
+    SERVER_HOST: str = "127.0.0.1"
+    SERVER_MAX_CONCURRENCY: int = 16
+    SERVER_PORT: int = 8000
+    TRANSCRIPTION_CACHE: bool = True
+    TRANSCRIPTION_CACHE_MAX_SIZE: int = 50 * 1024 * 1024
+    TRANSCRIPTION_WORKERS: int = 4
+    VECTOR_PQ_SUBVECTORS: int = 96
+    VECTOR_QUANTIZATION: str = "none"
+    VECTOR_REDUCED_DIM: Optional[int] = None
+    VECTOR_RESCORE_FACTOR: int = 4
 
     class Config:
         env_file = os.environ.get("SHOSHIN_ENV_FILE", ".env")
 
 
-# Load environment variables and initialize settings
-load_dotenv(Settings.Config.env_file, override=True)
-settings = Settings()
+class LazySettings:
+    """A proxy of Shoshin settings, loaded the first time one of them is read or changed.
+
+    Loading settings parses the env file and validates the environment, so it's deferred until a
+    command actually needs them: `shoshin --help` never pays for it, nor fails if OPENAI_API_KEY is missing.
+    """
+
+    _wrapped: Optional[Settings]
+
+    def __init__(self) -> None:
+        object.__setattr__(self, "_wrapped", None)
+
+    def _setup(self) -> Settings:
+        wrapped = self._wrapped
+        if wrapped is None:
+            # Load environment variables and initialize settings
+            load_dotenv(Settings.Config.env_file, override=True)
+            wrapped = Settings()  # type: ignore[call-arg]
+            object.__setattr__(self, "_wrapped", wrapped)
+        return wrapped
+
+    def __getattr__(self, name: str):
+        return getattr(self._setup(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self._setup(), name, value)
+
+
+# Type checkers see the settings themselves, so that reading an unknown setting is reported
+if TYPE_CHECKING:
+    settings: Settings
+else:
+    settings = LazySettings()
@@ -1,66 +1,537 @@
-from typing import List, Optional, Union
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
+import aiohttp
 from haystack.errors import OpenAIError
 from haystack.nodes import EmbeddingRetriever
 from haystack.schema import Document
-from milvus_documentstore import MilvusDocumentStore
 
+from ..ai.embeddings import EmbeddingEngine
+from ..aio import run_blocking
+from ..cache.embeddings import EmbeddingCache
 from ..conf import constants as c
 from ..conf import settings as s
-from ..exceptions import AIError
+from ..exceptions import AIError, ShoshinException
+from ..metrics import metrics
+from .embedded import EmbeddedDocumentStore
+from .lexical import LexicalIndex
+from .milvus import FilteredMilvusDocumentStore, QuantizedMilvusDocumentStore
+from .retrievers import CachedEmbeddingRetriever, HybridRetriever
+
+
+@dataclass
+class EmbeddingsReport:
+    """The outcome of writing documents and their embeddings into the store.
+
+    Attributes:
+        skipped (int): Documents already stored with an embedding.
+        embedded (int): Documents written and embedded.
+        deleted (int): Stale documents removed from the store.
+    """
+
+    skipped: int = 0
+    embedded: int = 0
+    deleted: int = 0
+
+
+class _Checkpoint:
+    """Saves the lexical index of a load from time to time, then reports the batches it holds as written.
+
+    Saving rewrites the whole lexical index, so it's saved again only after `ratio` times the duration of
+    the last save: saves stay a small fraction of the load time however large the index grows. Batches are
+    reported only once a save includes them, so that a resumed load never skips documents missing from
+    the lexical index.
+    """
+
+    def __init__(
+        self,
+        save: Callable[[], None],
+        on_batch: Optional[Callable[[List[Document]], None]],
+        ratio: float = 10.0,
+    ) -> None:
+        self._save = save
+        self._on_batch = on_batch
+        self._ratio = ratio
+        self._pending: List[List[Document]] = []
+        self._last_save = time.monotonic()
+        self._save_duration = 0.0
+
+    def add(self, batch: List[Document]) -> None:
+        """Records a written batch, saving the lexical index if the last save is old enough."""
+        self._pending.append(batch)
+        if time.monotonic() - self._last_save >= self._ratio * self._save_duration:
+            self.flush()
+
+    def flush(self) -> None:
+        """Saves the lexical index and reports all the recorded batches."""
+        if not self._pending:
+            return
+        start = time.monotonic()
+        self._save()
+        self._last_save = time.monotonic()
+        self._save_duration = self._last_save - start
+        pending, self._pending = self._pending, []
+        if self._on_batch is not None:
+            for batch in pending:
+                self._on_batch(batch)
 
 
 class DocumentStore:
     """
-    A wrapper class for `MilvusDocumentStore` that facilitates the management of document embeddings.
+    A wrapper class for the Haystack document store that facilitates the management of document embeddings.
 
-    The class is responsible for creating an instance of the `MilvusDocumentStore` and its corresponding
-    `EmbeddingRetriever`. It also exposes methods to write documents to the store and update their embeddings.
+    The class is responsible for creating an instance of the document store selected by settings
+    DOCUMENT_STORE_BACKEND and its corresponding `EmbeddingRetriever`. The `milvus` backend uses a
+    `FilteredMilvusDocumentStore` with a SQL database for metadata, while the `embedded` backend uses an
+    in-process `EmbeddedDocumentStore` persisted in settings EMBEDDED_STORE_DIR.
+    It also exposes methods to write documents to the store and update their embeddings.
+    Unless settings EMBEDDING_CACHE is disabled, embeddings are read from a local `EmbeddingCache` shared
+    across indexes, before calling the embedding model. With settings EMBEDDING_BACKEND `openai`, missing
+    embeddings are computed by an `EmbeddingEngine` that keeps several batched requests in flight within the
+    API rate limits. With `local`, they are computed on CPU by the sentence-transformers model of settings
+    LOCAL_EMBEDDING_MODEL, so that queries skip a network round trip and documents can be loaded offline.
+    The store is created with the embedding dimension of the selected model (see `embedding_model`).
+
+    Each course can be stored in its own index (see `course_index`), so that its questions only search its
+    documents: a Milvus collection, or a folder of the `embedded` backend. `read_transcriptions` tags documents
+    with their `course` and `lesson` metadata, so that searches can also be restricted to some lessons.
+
+    Loaded documents are also indexed in a BM25 `LexicalIndex`. When settings RETRIEVAL_MODE is `hybrid`,
+    questions are answered through a `HybridRetriever` that merges lexical and embedding search results.
 
     Attributes:
-        retriever (EmbeddingRetriever): The Embedding Retriever instance.
+        retriever (BaseRetriever): The retriever used to answer questions.
     """
 
-    def __init__(self, index: Optional[str] = None) -> None:
+    def __init__(self, index: Optional[str] = None, course: Optional[str] = None) -> None:
         """
-        Creates a `DocumentStore` instance, initializing the `MilvusDocumentStore` and its corresponding
+        Creates a `DocumentStore` instance, initializing the document store and its corresponding
         EmbeddingRetriever.
 
         Args:
             index (str, optional): The index for the Document Store. Defaults to settings DOCUMENTS_INDEX.
+            course (str, optional): The course stored in this Document Store. If set, documents are stored in
+                                    the partition of the course within `index` (see `course_index`).
+
+        Raises:
+            ShoshinException: If settings DOCUMENT_STORE_BACKEND, EMBEDDING_BACKEND or RETRIEVAL_MODE are unknown,
+                              DATABASE_URL is missing for the `milvus` backend, or the dimension of the local
+                              embedding model is unknown.
         """
         # Settings
+        self._course = course
         self._index = index or s.DOCUMENTS_INDEX
+        if course is not None:
+            self._index = course_index(course, self._index)
 
         # Document Store
-        self._store = MilvusDocumentStore(
-            embedding_dim=c.EMBEDDING_DIM, sql_url=s.DATABASE_URL, progress_bar=s.PROGRESS_BAR, index=self._index
-        )
-        self._retriever = EmbeddingRetriever(
-            api_key=s.OPENAI_API_KEY,
-            document_store=self._store,
-            embedding_model=c.EMBEDDING_MODEL,
-            progress_bar=s.PROGRESS_BAR,
-        )
+        self._store = _build_store(self._index)
+        self._retriever = _build_retriever(self._store)
+        self._lexical_index: Optional[LexicalIndex] = None
+        self._hybrid_retriever: Optional[HybridRetriever] = None
+        if s.RETRIEVAL_MODE == "hybrid":
+            self._hybrid_retriever = HybridRetriever(
+                self._retriever,
+                self.lexical_index,
+                lexical_margin=s.HYBRID_LEXICAL_MARGIN or None,
+                lexical_min_score=s.HYBRID_LEXICAL_MIN_SCORE,
+            )
+        elif s.RETRIEVAL_MODE != "embedding":
+            raise ShoshinException(
+                f"Unknown retrieval mode {s.RETRIEVAL_MODE}. Only 'embedding' and 'hybrid' are supported."
+            )
 
     @property
-    def retriever(self) -> EmbeddingRetriever:
+    def retriever(self) -> Union[EmbeddingRetriever, HybridRetriever]:
         """
-        Gets the `EmbeddingRetriever` instance associated with this `DocumentStore`.
+        Gets the retriever associated with this `DocumentStore`: the `EmbeddingRetriever`, or the
+        `HybridRetriever` when settings RETRIEVAL_MODE is `hybrid`.
 
         It is expected to use this retriever with a Generative Pipeline.
 
         Returns:
-            `EmbeddingRetriever`: The `EmbeddingRetriever` instance.
+            `EmbeddingRetriever` | `HybridRetriever`: The retriever instance.
+        """
+        return self._hybrid_retriever or self._retriever
+
+    @property
+    def index(self) -> str:
+        """Gets the index of the Document Store."""
+        return self._index
+
+    @property
+    def course(self) -> Optional[str]:
+        """Gets the course stored in this Document Store, or None if it stores all courses."""
+        return self._course
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        """Gets the BM25 index of the stored documents, loading it on first access."""
+        if self._lexical_index is None:
+            self._lexical_index = LexicalIndex.for_index(self._index)
+        return self._lexical_index
+
+    def create_embeddings(
+        self, documents: Union[List[dict], List[Document]], incremental: bool = False
+    ) -> EmbeddingsReport:
         """
-        return self._retriever
+        Writes documents into the store and creates their embeddings.
+
+        In incremental mode, documents whose content is already stored with an embedding are skipped,
+        and only new or changed documents are embedded. Stored documents that come from the same source
+        files (`name` metadata) but are no longer part of `documents` are deleted, so that edited
+        transcriptions don't leave stale chunks behind. The `LexicalIndex` is updated with the same changes.
+
+        Args:
+            documents (Union[List[dict], List[Document]]): The documents to store.
+            incremental (bool): If True, embed only documents that are not already stored with an embedding.
 
-    def create_embeddings(self, documents: Union[List[dict], List[Document]]) -> None:
+        Raises:
+            AIError: If the OpenAI API request fails for any reason.
+
+        Returns:
+            EmbeddingsReport: How many documents were skipped, embedded and deleted.
+        """
         try:
-            self._store.write_documents(documents)
-            self._store.update_embeddings(self._retriever)
+            with metrics.span("create_embeddings"):
+                if not incremental:
+                    with metrics.span("write_documents"):
+                        self._store.write_documents(documents)
+                    with metrics.span("update_embeddings"):
+                        self._store.update_embeddings(self._retriever)
+                    self._update_lexical_index(added=documents)
+                    return EmbeddingsReport(embedded=len(documents))
+                return self._create_embeddings_incremental(documents)
         except OpenAIError as e:
             # Catch-all for OpenAI errors. This is a temporary solution until we
             # implement different error handlers for different types of errors.
             # Tests are covering all possible OpenAI errors.
             raise AIError(e)
+
+    async def acreate_embeddings(
+        self,
+        documents: Union[List[dict], List[Document]],
+        incremental: bool = False,
+        session: Optional[aiohttp.ClientSession] = None,
+    ) -> EmbeddingsReport:
+        """
+        Writes documents into the store and creates their embeddings, without blocking the event loop.
+
+        Documents are embedded first with concurrent requests sent through the `aiohttp` session (see
+        `aio.client_session`), then written with their embeddings like `write_embeddings` does. Reads and
+        writes of the store run in the default executor. Incremental mode works like `create_embeddings`.
+
+        Args:
+            documents (Union[List[dict], List[Document]]): The documents to store.
+            incremental (bool): If True, embed only documents that are not already stored with an embedding.
+            session (aiohttp.ClientSession, optional): The session used to send requests. Defaults to a
+                                                       session for this call.
+
+        Raises:
+            AIError: If the OpenAI API request fails for any reason.
+
+        Returns:
+            EmbeddingsReport: How many documents were skipped, embedded and deleted.
+        """
+        documents = _to_documents(documents)
+        try:
+            with metrics.span("create_embeddings"):
+                new_documents = documents
+                stale_ids: List[str] = []
+                if incremental:
+                    new_documents, stale_ids = await run_blocking(self._plan_incremental, documents)
+                if new_documents:
+                    embeddings = await self._retriever.aembed_documents(new_documents, session)
+                    for document, embedding in zip(new_documents, embeddings):
+                        document.embedding = embedding
+                await run_blocking(self._write_batch, new_documents, stale_ids, documents, None)
+                if self._lexical_index is not None:
+                    await run_blocking(self._lexical_index.save)
+        except OpenAIError as e:
+            raise AIError(e)
+        return EmbeddingsReport(
+            skipped=len(documents) - len(new_documents), embedded=len(new_documents), deleted=len(stale_ids)
+        )
+
+    def _create_embeddings_incremental(self, documents: Union[List[dict], List[Document]]) -> EmbeddingsReport:
+        documents = _to_documents(documents)
+        new_documents, stale_ids = self._plan_incremental(documents)
+        if stale_ids:
+            self._store.delete_documents(ids=stale_ids)
+
+        if new_documents:
+            with metrics.span("write_documents"):
+                self._store.write_documents(new_documents, duplicate_documents="overwrite")
+            with metrics.span("update_embeddings"):
+                self._store.update_embeddings(self._retriever, update_existing_embeddings=False)
+        self._update_lexical_index(added=new_documents, removed=stale_ids)
+
+        return EmbeddingsReport(
+            skipped=len(documents) - len(new_documents), embedded=len(new_documents), deleted=len(stale_ids)
+        )
+
+    def _plan_incremental(self, documents: List[Document]) -> Tuple[List[Document], List[str]]:
+        """Finds the documents that need an embedding, and the stale documents of the same source files."""
+        ids = {doc.id for doc in documents}
+
+        # Document IDs are content hashes, so a stored ID with an embedding means unchanged content
+        stored = {doc.id: doc for doc in self._store.get_documents_by_id(list(ids))}
+        new_documents = [doc for doc in documents if not _has_embedding(stored.get(doc.id))]
+
+        # Remove chunks of the same source files that are not produced anymore. Sources are matched by the
+        # path of their transcription, so that files with the same name in different folders are kept apart.
+        paths = sorted({doc.meta["path"] for doc in documents if doc.meta.get("path")})
+        stale_ids: List[str] = []
+        if paths:
+            stale_ids = [
+                doc.id
+                for doc in self._store.get_all_documents_generator(filters={"path": paths}, return_embedding=False)
+                if doc.id not in ids
+            ]
+
+        # Documents without a path are matched by name, and so are the chunks stored before chunks had one
+        names = sorted({doc.meta["name"] for doc in documents if doc.meta.get("name")})
+        unmatched = {doc.meta["name"] for doc in documents if doc.meta.get("name") and not doc.meta.get("path")}
+        if names:
+            found = ids | set(stale_ids)
+            stale_ids += [
+                doc.id
+                for doc in self._store.get_all_documents_generator(filters={"name": names}, return_embedding=False)
+                if doc.id not in found and (not doc.meta.get("path") or doc.meta["name"] in unmatched)
+            ]
+        return new_documents, stale_ids
+
+    def write_embeddings(
+        self,
+        batches: Iterable[List[Document]],
+        incremental: bool = False,
+        on_batch: Optional[Callable[[List[Document]], None]] = None,
+    ) -> EmbeddingsReport:
+        """
+        Embeds batches of documents and writes them into the store together with their embeddings.
+
+        Unlike `create_embeddings`, documents are not read back from the store to be embedded: each batch
+        is embedded first, then written with its vectors in a single upsert. Writes run in a background
+        thread, so that a batch is embedded while the previous one is written, and at most three batches
+        are held in memory at any time. In incremental mode, each batch is handled like `create_embeddings`
+        does, so batches must hold all the chunks of their source files (see `clean_documents_stream`).
+
+        Args:
+            batches (Iterable[List[Document]]): The batches of documents to store.
+            incremental (bool): If True, embed only documents that are not already stored with an embedding.
+            on_batch (Callable[[List[Document]], None], optional): Called with each batch once it's written
+                                                                   and the lexical index is saved, e.g. to
+                                                                   record progress in a `Journal`.
+
+        Raises:
+            AIError: If the OpenAI API request fails for any reason.
+
+        Returns:
+            EmbeddingsReport: How many documents were skipped, embedded and deleted.
+        """
+        report = EmbeddingsReport()
+        batches = iter(batches)
+        checkpoint = _Checkpoint(lambda: self.lexical_index.save(), on_batch)
+        try:
+            # All store operations run in the writer thread, in order
+            with metrics.span("write_embeddings"), ThreadPoolExecutor(max_workers=1) as writer:
+                next_plan = self._submit_plan(writer, batches, incremental)
+                write: Optional[Future] = None
+                while next_plan is not None:
+                    batch, documents, stale_ids = next_plan.result()
+                    # Plan the next batch before writing this one, so it's ready when the embedding completes
+                    next_plan = self._submit_plan(writer, batches, incremental)
+                    if documents:
+                        for document, embedding in zip(documents, self._retriever.embed_documents(documents)):
+                            document.embedding = embedding
+                    if write is not None:
+                        write.result()
+                    write = writer.submit(self._write_batch, documents, stale_ids, batch, checkpoint)
+                    report.skipped += len(batch) - len(documents)
+                    report.embedded += len(documents)
+                    report.deleted += len(stale_ids)
+                if write is not None:
+                    write.result()
+        except OpenAIError as e:
+            # Catch-all for OpenAI errors. This is a temporary solution until we
+            # implement different error handlers for different types of errors.
+            # Tests are covering all possible OpenAI errors.
+            raise AIError(e)
+        finally:
+            # Batches written before a failure are saved and reported as well
+            checkpoint.flush()
+        return report
+
+    def _submit_plan(
+        self, writer: ThreadPoolExecutor, batches: Iterator[List[Document]], incremental: bool
+    ) -> Optional["Future[Tuple[List[Document], List[Document], List[str]]]"]:
+        batch = next(batches, None)
+        if batch is None:
+            return None
+
+        def plan() -> Tuple[List[Document], List[Document], List[str]]:
+            documents = _to_documents(batch)
+            if not incremental:
+                return documents, documents, []
+            return (documents, *self._plan_incremental(documents))
+
+        return writer.submit(plan)
+
+    def _write_batch(
+        self,
+        documents: List[Document],
+        stale_ids: List[str],
+        batch: List[Document],
+        checkpoint: Optional[_Checkpoint],
+    ) -> None:
+        with metrics.span("write_batch"):
+            if stale_ids:
+                self._store.delete_documents(ids=stale_ids)
+            if documents:
+                self._store.write_documents(
+                    documents, batch_size=s.DOCUMENTS_BATCH_SIZE, duplicate_documents="overwrite"
+                )
+            self._update_lexical_index(added=documents, removed=stale_ids, save=False)
+            if checkpoint is not None:
+                checkpoint.add(batch)
+
+    def _update_lexical_index(
+        self, added: Union[List[dict], List[Document]], removed: Optional[List[str]] = None, save: bool = True
+    ) -> None:
+        if not added and not removed:
+            return
+        self.lexical_index.remove(removed or [])
+        self.lexical_index.add(_to_documents(added))
+        if save:
+            self.lexical_index.save()
+
+
+def course_index(course: str, index: Optional[str] = None) -> str:
+    """Returns the name of the index that stores the documents of a course.
+
+    Milvus collection names only allow letters, digits and underscores, so other characters are replaced.
+
+    Example:
+        course_index("Zen 101")  # "document_zen_101"
+
+    Args:
+        course (str): The course name.
+        index (str, optional): The index partitioned by course. Defaults to settings DOCUMENTS_INDEX.
+
+    Raises:
+        ShoshinException: If the course name has no letters or digits.
+
+    Returns:
+        str: The index of the course.
+    """
+    slug = re.sub(r"[^0-9a-z]+", "_", course.lower()).strip("_")
+    if not slug:
+        raise ShoshinException(f"Invalid course name {course!r}: it must contain letters or digits.")
+    return f"{index or s.DOCUMENTS_INDEX}_{slug}"
+
+
+def _to_documents(documents: Union[List[dict], List[Document]]) -> List[Document]:
+    return [Document.from_dict(doc) if isinstance(doc, dict) else doc for doc in documents]
+
+
+def embedding_model() -> Tuple[str, int]:
+    """
+    Returns the embedding model of the backend selected in settings EMBEDDING_BACKEND, and its dimension.
+
+    The dimension of local models is read from settings LOCAL_EMBEDDING_DIM, or from the known models of
+    `constants.LOCAL_EMBEDDING_DIMS`. Documents embedded by different models can't be searched together:
+    load the documents again after changing model.
+
+    Raises:
+        ShoshinException: If the embedding backend is unknown, or the dimension of the local model is unknown.
+
+    Returns:
+        Tuple[str, int]: The name of the embedding model and the dimension of its embeddings.
+    """
+    if s.EMBEDDING_BACKEND == "openai":
+        return c.EMBEDDING_MODEL, c.EMBEDDING_DIM
+    if s.EMBEDDING_BACKEND == "local":
+        dim = s.LOCAL_EMBEDDING_DIM or c.LOCAL_EMBEDDING_DIMS.get(s.LOCAL_EMBEDDING_MODEL)
+        if dim is None:
+            raise ShoshinException(
+                f"Unknown dimension of the embedding model {s.LOCAL_EMBEDDING_MODEL}. Set settings LOCAL_EMBEDDING_DIM."
+            )
+        return s.LOCAL_EMBEDDING_MODEL, dim
+    raise ShoshinException(f"Unknown embedding backend {s.EMBEDDING_BACKEND}. Only 'openai' and 'local' are supported.")
+
+
+def _build_retriever(store) -> CachedEmbeddingRetriever:
+    """Creates the retriever of the embedding backend selected in settings."""
+    model, dim = embedding_model()
+    cache = EmbeddingCache(model, dim) if s.EMBEDDING_CACHE else None
+    if s.EMBEDDING_BACKEND == "local":
+        # Inference runs in-process: the Haystack encoder embeds texts in batches on CPU
+        if s.LOCAL_EMBEDDING_THREADS:
+            import torch
+
+            torch.set_num_threads(s.LOCAL_EMBEDDING_THREADS)
+        return CachedEmbeddingRetriever(
+            document_store=store,
+            embedding_model=model,
+            model_format="sentence_transformers",
+            use_gpu=False,
+            batch_size=s.LOCAL_EMBEDDING_BATCH_SIZE,
+            progress_bar=s.PROGRESS_BAR,
+            cache=cache,
+        )
+    return CachedEmbeddingRetriever(
+        api_key=s.OPENAI_API_KEY,
+        document_store=store,
+        embedding_model=model,
+        progress_bar=s.PROGRESS_BAR,
+        cache=cache,
+        engine=EmbeddingEngine(s.OPENAI_API_KEY, model),
+    )
+
+
+def _build_store(index: str):
+    """Creates the Haystack document store of the backend selected in settings."""
+    _, embedding_dim = embedding_model()
+    if s.DOCUMENT_STORE_BACKEND == "milvus":
+        if not s.DATABASE_URL:
+            raise ShoshinException("Settings DATABASE_URL is required by the `milvus` document store backend.")
+        options = {"embedding_dim": embedding_dim, "sql_url": s.DATABASE_URL, "progress_bar": s.PROGRESS_BAR}
+        if s.VECTOR_QUANTIZATION == "none":
+            return FilteredMilvusDocumentStore(index=index, **options)
+        if s.VECTOR_REDUCED_DIM:
+            raise ShoshinException("Settings VECTOR_REDUCED_DIM is only supported by the `embedded` backend.")
+        return QuantizedMilvusDocumentStore(
+            s.VECTOR_QUANTIZATION,
+            pq_subvectors=s.VECTOR_PQ_SUBVECTORS,
+            rescore_factor=s.VECTOR_RESCORE_FACTOR,
+            nlist=s.MILVUS_NLIST,
+            nprobe=s.MILVUS_NPROBE,
+            index=index,
+            **options,
+        )
+    if s.DOCUMENT_STORE_BACKEND == "embedded":
+        return EmbeddedDocumentStore(
+            s.EMBEDDED_STORE_DIR,
+            index=index,
+            embedding_dim=embedding_dim,
+            progress_bar=s.PROGRESS_BAR,
+            ann=s.EMBEDDED_STORE_ANN,
+            nprobe=s.EMBEDDED_STORE_NPROBE,
+            quantization=s.VECTOR_QUANTIZATION,
+            reduced_dim=s.VECTOR_REDUCED_DIM,
+            pq_subvectors=s.VECTOR_PQ_SUBVECTORS,
+            rescore_factor=s.VECTOR_RESCORE_FACTOR,
+        )
+    raise ShoshinException(
+        f"Unknown document store backend {s.DOCUMENT_STORE_BACKEND}. Only 'milvus' and 'embedded' are supported."
+    )
+
+
+def _has_embedding(document: Optional[Document]) -> bool:
+    """Checks if a stored document has an embedding, either inline or referenced by its vector ID."""
+    if document is None:
+        return False
+    return document.embedding is not None or document.meta.get("vector_id") is not None
@@ -0,0 +1,621 @@
+import json
+import os
+from copy import deepcopy
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from haystack.document_stores import InMemoryDocumentStore
+from haystack.schema import Document
+
+from .quantization import QUANTIZATION_METHODS, QuantizedIndex
+
+_DOCUMENTS_FILE = "documents.jsonl"
+_EMBEDDINGS_FILE = "embeddings.f32"
+
+# Metadata fields that partition the embeddings matrix: filters on them select rows without reading documents
+PARTITION_FIELDS = ("course", "lesson")
+
+
+class IVFIndex:
+    """An inverted file index that narrows the vector search to the clusters closest to the query.
+
+    Embeddings are clustered with k-means, and a search only scores the embeddings of the `nprobe`
+    clusters whose centroid is the most similar to the query.
+
+    Attributes:
+        centroids (np.ndarray): The cluster centroids, one row per cluster.
+        lists (List[np.ndarray]): The matrix rows that belong to each cluster.
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray]) -> None:
+        self.centroids = centroids
+        self.lists = lists
+
+    @classmethod
+    def build(
+        cls, matrix: np.ndarray, n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0
+    ) -> "IVFIndex":
+        """Clusters the rows of `matrix` with k-means.
+
+        Args:
+            matrix (np.ndarray): The embeddings, one row per document.
+            n_lists (int, optional): The number of clusters. Defaults to the square root of the number of rows.
+            iterations (int): The number of k-means iterations.
+            seed (int): The seed used to pick the initial centroids and the training sample.
+
+        Returns:
+            IVFIndex: The index.
+        """
+        rows = len(matrix)
+        n_lists = min(rows, n_lists or max(1, int(np.sqrt(rows))))
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample, it's enough to find good centroids and keeps the build fast
+        sample = matrix[np.sort(rng.choice(rows, size=min(rows, n_lists * 64), replace=False))]
+        sample = np.asarray(sample, dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = sample[assignment == i]
+                if len(members):
+                    centroids[i] = members.mean(axis=0)
+
+        assignment = np.argmax(np.asarray(matrix, dtype=np.float32) @ centroids.T, axis=1)
+        lists = [np.flatnonzero(assignment == i) for i in range(n_lists)]
+        return cls(centroids, lists)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Returns the matrix rows of the `nprobe` clusters closest to the query.
+
+        Args:
+            query (np.ndarray): The query embedding.
+            nprobe (int): The number of clusters to search.
+
+        Returns:
+            np.ndarray: The candidate rows.
+        """
+        closest = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.sort(np.concatenate([self.lists[i] for i in closest]))
+
+
+class EmbeddedDocumentStore(InMemoryDocumentStore):
+    """
+    An in-process document store that persists documents and embeddings to a local folder.
+
+    Each index is stored in its own folder, with documents and metadata in a JSON lines file and embeddings
+    in a float32 matrix that is memory-mapped when loaded. Vector search runs in-process as a vectorized
+    exact top-k over the matrix or, with `ann="ivf"`, over the closest clusters of an `IVFIndex`. Filters
+    are applied before scoring. Embeddings are stored sorted by the `PARTITION_FIELDS` metadata (course, then
+    lesson), and filters on these fields only score the rows of the selected partitions. It is meant for
+    small and medium courses, tests and benchmarks, and doesn't need any external service.
+
+    Written documents are appended to both files, so writing a batch costs the size of the batch, not of the
+    index. A document written again supersedes its previous line and leaves a stale row in the matrix, that
+    searches skip. Deleted documents are appended as delete records, and their rows become stale too. The
+    files are rewritten (compacted) when embeddings are updated, and when stale rows outnumber the rows of
+    stored documents.
+
+    With `quantization="int8"` or `"pq"`, searches scan a compact `QuantizedIndex` kept in memory instead of
+    the full precision matrix, and only the `top_k * rescore_factor` best candidates are re-scored with
+    their full precision embeddings, read from the memory-mapped matrix.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        index: str = "document",
+        embedding_dim: int = 768,
+        similarity: str = "dot_product",
+        progress_bar: bool = False,
+        ann: str = "flat",
+        nprobe: int = 8,
+        ivf_min_size: int = 10000,
+        quantization: str = "none",
+        reduced_dim: Optional[int] = None,
+        pq_subvectors: int = 96,
+        rescore_factor: int = 4,
+    ) -> None:
+        """
+        Creates an `EmbeddedDocumentStore` instance, loading the documents already stored in `path`.
+
+        Args:
+            path (str): The folder where indexes are stored.
+            index (str): The default index.
+            embedding_dim (int): The dimensionality of the embeddings.
+            similarity (str): The similarity function, `dot_product` or `cosine`.
+            progress_bar (bool): Whether to show progress bars.
+            ann (str): The search strategy, `flat` (exact) or `ivf` (approximate).
+            nprobe (int): The number of IVF clusters searched for each query.
+            ivf_min_size (int): The number of embeddings below which the exact search is used anyway.
+            quantization (str): The compact representation scanned by searches, `none`, `int8` or `pq`.
+            reduced_dim (int, optional): The dimension of the projection fitted on the corpus before quantization.
+            pq_subvectors (int): The number of parts (bytes) of each embedding encoded by `pq`.
+            rescore_factor (int): How many candidates per requested document are re-scored with full precision.
+        """
+        if ann not in ("flat", "ivf"):
+            raise ValueError(f"Unsupported search strategy {ann}. Only 'flat' and 'ivf' are supported.")
+        if quantization not in QUANTIZATION_METHODS:
+            raise ValueError(f"Unsupported quantization {quantization}. Only 'none', 'int8' and 'pq' are supported.")
+        super().__init__(
+            index=index,
+            embedding_dim=embedding_dim,
+            similarity=similarity,
+            progress_bar=progress_bar,
+            use_gpu=False,
+        )
+        self.path = os.path.expanduser(path)
+        self.ann = ann
+        self.nprobe = nprobe
+        self.ivf_min_size = ivf_min_size
+        self.quantization = quantization
+        self.reduced_dim = reduced_dim
+        self.pq_subvectors = pq_subvectors
+        self.rescore_factor = rescore_factor
+        self._matrices: Dict[str, np.ndarray] = {}
+        # The document stored at each matrix row, or None for stale rows
+        self._rows: Dict[str, List[Optional[str]]] = {}
+        self._document_rows: Dict[str, Dict[str, int]] = {}
+        self._live: Dict[str, np.ndarray] = {}
+        self._partitions: Dict[str, Dict[str, Dict[str, np.ndarray]]] = {}
+        self._ivf: Dict[str, IVFIndex] = {}
+        self._quantized: Dict[str, QuantizedIndex] = {}
+        self._load(index)
+
+    def _index_path(self, index: str) -> str:
+        return os.path.join(self.path, index)
+
+    def _load(self, index: str) -> None:
+        documents_file = os.path.join(self._index_path(index), _DOCUMENTS_FILE)
+        if not os.path.exists(documents_file):
+            return
+
+        embeddings_file = os.path.join(self._index_path(index), _EMBEDDINGS_FILE)
+        row_count = self._row_count(index)
+        documents: Dict[str, Tuple[Document, Optional[int]]] = {}
+        with open(documents_file) as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line left partial by an interrupted append
+                    continue
+                if item.get("deleted"):
+                    # A delete record removes the previous lines of the document
+                    documents.pop(item["id"], None)
+                    continue
+                row = item.pop("row")
+                document = Document.from_dict(item)
+                # Appended lines supersede the previous lines of the same document
+                documents[document.id] = (document, row if row is not None and row < row_count else None)
+
+        matrix = np.empty((0, self.embedding_dim), dtype=np.float32)
+        if row_count:
+            matrix = np.memmap(embeddings_file, dtype=np.float32, mode="r", shape=(row_count, self.embedding_dim))
+
+        rows: List[Optional[str]] = [None] * row_count
+        document_rows: Dict[str, int] = {}
+        self.indexes[index] = {}
+        for doc_id, (document, row) in documents.items():
+            # Embeddings are views on the memory-mapped matrix: they are not copied in memory
+            document.embedding = matrix[row] if row is not None else None
+            if row is not None:
+                rows[row] = doc_id
+                document_rows[doc_id] = row
+            self.indexes[index][doc_id] = document
+        self._matrices[index] = matrix
+        self._rows[index] = rows
+        self._document_rows[index] = document_rows
+        self._partitions[index] = _partition_rows(self.indexes[index], rows)
+        self._reset_search_indexes(index)
+
+    def _row_count(self, index: str) -> int:
+        """Returns the number of rows of the embeddings matrix file, ignoring a row left partial by a crash."""
+        embeddings_file = os.path.join(self._index_path(index), _EMBEDDINGS_FILE)
+        if not os.path.exists(embeddings_file):
+            return 0
+        return os.path.getsize(embeddings_file) // (self.embedding_dim * np.dtype(np.float32).itemsize)
+
+    def _reset_search_indexes(self, index: str) -> None:
+        self._live.pop(index, None)
+        self._ivf.pop(index, None)
+        self._quantized.pop(index, None)
+
+    def _save(self, index: str) -> None:
+        path = self._index_path(index)
+        os.makedirs(path, exist_ok=True)
+        # Rows of the same partition are contiguous, so that filtered searches read a single block
+        documents = sorted(self.indexes.get(index, {}).values(), key=_partition_key)
+
+        # Write to temporary files first: existing memory maps keep reading the previous version
+        documents_tmp = os.path.join(path, f"{_DOCUMENTS_FILE}.tmp")
+        embeddings_tmp = os.path.join(path, f"{_EMBEDDINGS_FILE}.tmp")
+        row = 0
+        with open(documents_tmp, "w") as documents_file, open(embeddings_tmp, "wb") as embeddings_file:
+            for document in documents:
+                item = _document_item(document, row if document.embedding is not None else None)
+                if document.embedding is not None:
+                    embeddings_file.write(np.asarray(document.embedding, dtype=np.float32).tobytes())
+                    row += 1
+                documents_file.write(json.dumps(item) + "\n")
+        os.replace(embeddings_tmp, os.path.join(path, _EMBEDDINGS_FILE))
+        os.replace(documents_tmp, os.path.join(path, _DOCUMENTS_FILE))
+        self._load(index)
+
+    def _append(self, index: str, documents: List[Document]) -> None:
+        """Appends written documents to the index files, marking the rows of their previous version as stale."""
+        path = self._index_path(index)
+        os.makedirs(path, exist_ok=True)
+        if index not in self._rows:
+            self._rows[index] = []
+            self._document_rows[index] = {}
+            self._partitions[index] = _partition_rows({}, [])
+        rows = self._rows[index]
+        document_rows = self._document_rows[index]
+        # Rows of an interrupted append are never referenced: they are stale
+        rows.extend([None] * (self._row_count(index) - len(rows)))
+
+        lines, appended = [], {}
+        with open(os.path.join(path, _EMBEDDINGS_FILE), "ab") as embeddings_file:
+            # Rows of the same partition are contiguous within a batch
+            for document in sorted(documents, key=_partition_key):
+                previous_row = document_rows.pop(document.id, None)
+                if previous_row is not None:
+                    rows[previous_row] = None
+                row = None
+                if document.embedding is not None:
+                    row = len(rows)
+                    embeddings_file.write(np.asarray(document.embedding, dtype=np.float32).tobytes())
+                    rows.append(document.id)
+                    document_rows[document.id] = row
+                    appended[document.id] = row
+                lines.append(json.dumps(_document_item(document, row)) + "\n")
+
+        # Documents are written after their embeddings: a document line never references a missing row
+        self._append_lines(index, lines)
+
+        matrix = np.empty((0, self.embedding_dim), dtype=np.float32)
+        if rows:
+            matrix = np.memmap(
+                os.path.join(path, _EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(len(rows), self.embedding_dim)
+            )
+        for doc_id, row in appended.items():
+            self.indexes[index][doc_id].embedding = matrix[row]
+        self._matrices[index] = matrix
+        _add_partition_rows(self._partitions[index], self.indexes[index], appended)
+        self._reset_search_indexes(index)
+        self._compact_if_stale(index)
+
+    def _append_deletes(self, index: str, ids: List[str]) -> None:
+        """Appends delete records of documents to the index files, marking their rows as stale."""
+        self._append_lines(index, [json.dumps({"id": doc_id, "deleted": True}) + "\n" for doc_id in ids])
+        rows = self._rows[index]
+        document_rows = self._document_rows[index]
+        for doc_id in ids:
+            row = document_rows.pop(doc_id, None)
+            if row is not None:
+                rows[row] = None
+        self._partitions[index] = _partition_rows(self.indexes[index], rows)
+        self._reset_search_indexes(index)
+        self._compact_if_stale(index)
+
+    def _append_lines(self, index: str, lines: List[str]) -> None:
+        documents_file = os.path.join(self._index_path(index), _DOCUMENTS_FILE)
+        with open(documents_file, "a+") as f:
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                if f.read(1) != "\n":
+                    # Terminate a line left partial by an interrupted append
+                    f.write("\n")
+            f.writelines(lines)
+
+    def _compact_if_stale(self, index: str) -> None:
+        if len(self._rows[index]) > 2 * len(self._document_rows[index]):
+            # Stale rows outnumber stored documents: compact the files
+            self._save(index)
+
+    def _live_rows(self, index: str) -> Optional[np.ndarray]:
+        """Returns the rows of stored documents, or None if no row is stale."""
+        rows = self._rows[index]
+        if len(self._document_rows[index]) == len(rows):
+            return None
+        if index not in self._live:
+            self._live[index] = np.array([row for row, doc_id in enumerate(rows) if doc_id is not None], dtype=np.int64)
+        return self._live[index]
+
+    def write_documents(self, documents: Union[List[dict], List[Document]], index: Optional[str] = None, **kwargs):
+        """Writes documents into the store and appends them to the index files."""
+        index = index or self.index
+        field_map = self._create_document_field_map()
+        objects = [Document.from_dict(d, field_map=field_map) if isinstance(d, dict) else d for d in documents]
+        stored = self.indexes.get(index, {})
+        previous = {doc.id: stored.get(doc.id) for doc in objects}
+        super().write_documents(objects, index=index, **kwargs)
+
+        # Skipped duplicates keep their stored version
+        stored = self.indexes[index]
+        written = [stored[doc_id] for doc_id, document in previous.items() if stored[doc_id] is not document]
+        if written:
+            self._append(index, written)
+
+    def update_embeddings(self, retriever, index: Optional[str] = None, **kwargs):
+        """Updates the embeddings of the stored documents and persists the index."""
+        super().update_embeddings(retriever, index=index, **kwargs)
+        self._save(index or self.index)
+
+    def delete_documents(self, index: Optional[str] = None, ids: Optional[List[str]] = None, **kwargs):
+        """Deletes documents from the store and appends their delete records to the index files."""
+        index = index or self.index
+        stored = set(self.indexes.get(index, {}))
+        super().delete_documents(index=index, ids=ids, **kwargs)
+        deleted = sorted(stored - set(self.indexes.get(index, {})))
+        if deleted and index in self._rows:
+            self._append_deletes(index, deleted)
+
+    def get_documents_by_id(self, ids: List[str], index: Optional[str] = None, **kwargs) -> List[Document]:
+        """Returns the stored documents among `ids`, skipping unknown IDs like the Milvus backend does."""
+        documents = self.indexes.get(index or self.index, {})
+        return super().get_documents_by_id([id for id in ids if id in documents], index=index, **kwargs)
+
+    def delete_index(self, index: str):
+        """Deletes an index and its files."""
+        super().delete_index(index)
+        for name in (_DOCUMENTS_FILE, _EMBEDDINGS_FILE):
+            file = os.path.join(self._index_path(index), name)
+            if os.path.exists(file):
+                os.remove(file)
+        self._matrices.pop(index, None)
+        self._rows.pop(index, None)
+        self._document_rows.pop(index, None)
+        self._partitions.pop(index, None)
+        self._reset_search_indexes(index)
+
+    def _candidates(self, index: str, query: np.ndarray, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """Returns the matrix rows to score, or None to score the whole matrix."""
+        live = self._live_rows(index)
+        if filters:
+            partition = self._partition(index, filters)
+            if partition is not None:
+                return partition if live is None else np.intersect1d(partition, live, assume_unique=True)
+            documents = self.get_all_documents(index=index, filters=filters, return_embedding=False)
+            document_rows = self._document_rows[index]
+            return np.array(
+                sorted(document_rows[doc.id] for doc in documents if doc.id in document_rows), dtype=np.int64
+            )
+
+        if self.ann == "ivf" and len(self._rows[index]) >= self.ivf_min_size:
+            if index not in self._ivf:
+                self._ivf[index] = IVFIndex.build(self._matrices[index])
+            candidates = self._ivf[index].candidates(query, self.nprobe)
+            return candidates if live is None else np.intersect1d(candidates, live)
+        return live
+
+    def _partition(self, index: str, filters: dict) -> Optional[np.ndarray]:
+        """Returns the rows selected by filters on `PARTITION_FIELDS`, or None if filters use other fields."""
+        if not set(filters) <= set(PARTITION_FIELDS):
+            return None
+        selected: Optional[np.ndarray] = None
+        for field, condition in filters.items():
+            values = _filter_values(condition)
+            if values is None:
+                return None
+            partitions = self._partitions[index][field]
+            blocks = [partitions[value] for value in values if value in partitions]
+            rows = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        return None if selected is None else np.sort(selected)
+
+    def search_index_bytes(self, index: Optional[str] = None) -> int:
+        """Returns the memory scanned by searches, in bytes: the quantized codes, or the full precision matrix."""
+        index = index or self.index
+        if index not in self._matrices:
+            return 0
+        if self.quantization != "none" and self._rows[index]:
+            return self._quantized_index(index).nbytes
+        return self._matrices[index].nbytes
+
+    def _quantized_index(self, index: str) -> QuantizedIndex:
+        if index not in self._quantized:
+            self._quantized[index] = QuantizedIndex.build(
+                self._matrices[index], self.quantization, reduced_dim=self.reduced_dim, subvectors=self.pq_subvectors
+            )
+        return self._quantized[index]
+
+    def query_by_embedding(
+        self,
+        query_emb: np.ndarray,
+        filters: Optional[dict] = None,
+        top_k: int = 10,
+        index: Optional[str] = None,
+        return_embedding: Optional[bool] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: bool = True,
+    ) -> List[Document]:
+        """
+        Finds the documents most similar to the query embedding with a vectorized search over the embeddings matrix.
+
+        Args:
+            query_emb (np.ndarray): The query embedding.
+            filters (dict, optional): Metadata filters, applied before scoring.
+            top_k (int): How many documents to return.
+            index (str, optional): The index to search. Defaults to the store index.
+            return_embedding (bool, optional): Whether to return the document embeddings.
+            headers (Dict[str, str], optional): Not supported.
+            scale_score (bool): Whether to scale the similarity score to the unit interval.
+
+        Returns:
+            List[Document]: The most similar documents, sorted by score.
+        """
+        if headers:
+            raise NotImplementedError("EmbeddedDocumentStore does not support headers.")
+
+        index = index or self.index
+        if return_embedding is None:
+            return_embedding = self.return_embedding
+        if query_emb is None or index not in self._matrices or not self._document_rows[index]:
+            return []
+
+        query = np.asarray(query_emb, dtype=np.float32).reshape(-1)
+        matrix = self._matrices[index]
+        candidates = self._candidates(index, query, filters)
+        if candidates is not None and len(candidates) == 0:
+            return []
+        if self.quantization != "none":
+            # Keep the best candidates by approximate score, then re-score them with full precision
+            candidates = self._quantized_index(index).candidates(
+                query, top_k * self.rescore_factor, rows=candidates, cosine=self.similarity == "cosine"
+            )
+
+        vectors = matrix if candidates is None else matrix[candidates]
+        scores = np.asarray(vectors @ query)
+        if self.similarity == "cosine":
+            norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+            scores = scores / np.where(norms > 0, norms, 1)
+        return self._top_documents(index, scores, candidates, top_k, scale_score, return_embedding)
+
+    def query_by_embedding_batch(
+        self,
+        query_embs: Union[List[np.ndarray], np.ndarray],
+        filters: Optional[Union[dict, List[Optional[dict]]]] = None,
+        top_k: int = 10,
+        index: Optional[str] = None,
+        return_embedding: Optional[bool] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: bool = True,
+    ) -> List[List[Document]]:
+        """
+        Finds the documents most similar to each query embedding.
+
+        Exact searches without filters score all queries with a single matrix product, instead of one
+        product per query. Filtered, IVF and quantized searches run query by query, like `query_by_embedding`.
+
+        Args:
+            query_embs (List[np.ndarray] | np.ndarray): The query embeddings.
+            filters (dict | List[dict], optional): Metadata filters, for all queries or one per query.
+            top_k (int): How many documents to return for each query.
+            index (str, optional): The index to search. Defaults to the store index.
+            return_embedding (bool, optional): Whether to return the document embeddings.
+            headers (Dict[str, str], optional): Not supported.
+            scale_score (bool): Whether to scale the similarity score to the unit interval.
+
+        Returns:
+            List[List[Document]]: The most similar documents of each query, sorted by score.
+        """
+        index = index or self.index
+        if (
+            filters
+            or headers
+            or len(query_embs) == 0
+            or index not in self._matrices
+            or not self._document_rows[index]
+            or self._live_rows(index) is not None
+            or (self.ann == "ivf" and len(self._rows[index]) >= self.ivf_min_size)
+            or self.quantization != "none"
+        ):
+            return super().query_by_embedding_batch(
+                query_embs=query_embs,
+                filters=filters,
+                top_k=top_k,
+                index=index,
+                return_embedding=return_embedding,
+                headers=headers,
+                scale_score=scale_score,
+            )
+
+        if return_embedding is None:
+            return_embedding = self.return_embedding
+        queries = np.asarray(query_embs, dtype=np.float32).reshape(len(query_embs), -1)
+        matrix = self._matrices[index]
+        scores = np.asarray(matrix @ queries.T)
+        if self.similarity == "cosine":
+            norms = np.outer(np.linalg.norm(matrix, axis=1), np.linalg.norm(queries, axis=1))
+            scores = scores / np.where(norms > 0, norms, 1)
+        return [
+            self._top_documents(index, scores[:, i], None, top_k, scale_score, return_embedding)
+            for i in range(len(queries))
+        ]
+
+    def _top_documents(
+        self,
+        index: str,
+        scores: np.ndarray,
+        candidates: Optional[np.ndarray],
+        top_k: int,
+        scale_score: bool,
+        return_embedding: bool,
+    ) -> List[Document]:
+        """Returns the `top_k` documents by score, where `scores` are computed for the `candidates` rows."""
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            row = int(position if candidates is None else candidates[position])
+            document = self.indexes[index][self._rows[index][row]]
+            score = float(scores[position])
+            if scale_score:
+                score = self.scale_to_unit_interval(score, self.similarity)
+            results.append(
+                Document(
+                    id=document.id,
+                    content=document.content,
+                    content_type=document.content_type,
+                    meta=deepcopy(document.meta),
+                    embedding=np.array(document.embedding) if return_embedding else None,
+                    score=score,
+                )
+            )
+        return results
+
+
+def _partition_key(document: Document) -> tuple:
+    return tuple(str(document.meta.get(field, "")) for field in PARTITION_FIELDS)
+
+
+def _document_item(document: Document, row: Optional[int]) -> dict:
+    """Returns the line of a document in the documents file, referencing its row of the embeddings matrix."""
+    item = document.to_dict()
+    item.pop("embedding", None)
+    item.pop("score", None)
+    item["row"] = row
+    return item
+
+
+def _partition_rows(documents: Dict[str, Document], rows: List[Optional[str]]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Maps each value of the `PARTITION_FIELDS` to the matrix rows of its documents."""
+    partitions: Dict[str, Dict[str, np.ndarray]] = {field: {} for field in PARTITION_FIELDS}
+    _add_partition_rows(partitions, documents, {doc_id: row for row, doc_id in enumerate(rows) if doc_id is not None})
+    return partitions
+
+
+def _add_partition_rows(
+    partitions: Dict[str, Dict[str, np.ndarray]], documents: Dict[str, Document], rows: Dict[str, int]
+) -> None:
+    """Adds the `rows` of documents (by ID) to the rows of their partitions."""
+    added: Dict[str, Dict[str, List[int]]] = {field: {} for field in PARTITION_FIELDS}
+    for doc_id, row in rows.items():
+        meta = documents[doc_id].meta
+        for field in PARTITION_FIELDS:
+            # Like Haystack filters, string conditions only match string values
+            if isinstance(meta.get(field), str):
+                added[field].setdefault(meta[field], []).append(row)
+    for field, values in added.items():
+        for value, value_rows in values.items():
+            new_rows = np.array(value_rows, dtype=np.int64)
+            previous = partitions[field].get(value)
+            partitions[field][value] = new_rows if previous is None else np.concatenate([previous, new_rows])
+
+
+def _filter_values(condition: Any) -> Optional[List[str]]:
+    """Returns the values matched by a filter condition (a value, a list, `$eq` or `$in`), or None if unsupported."""
+    if isinstance(condition, dict):
+        if len(condition) != 1:
+            return None
+        operator, condition = next(iter(condition.items()))
+        if operator not in ("$eq", "$in"):
+            return None
+    values = condition if isinstance(condition, (list, tuple)) else [condition]
+    if not all(isinstance(value, str) for value in values):
+        return None
+    return list(values)
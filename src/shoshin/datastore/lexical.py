@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+from haystack.schema import Document
+
+from ..conf import settings as s
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits a text into lowercase word tokens, keeping names, numbers and identifiers (e.g. `git_diff`) whole."""
+    return _TOKEN.findall(text.lower())
+
+
+class LexicalIndex:
+    """A persistent BM25 inverted index of the stored documents.
+
+    The index keeps the term frequencies of each document, keyed by document ID, and rebuilds the postings
+    in memory when loaded. It's stored as a JSON file next to the vector index, one file per index, and
+    it's updated when documents are loaded into the `DocumentStore`.
+
+    Attributes:
+        path (str): The file where the index is stored.
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 length normalization.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75) -> None:
+        """
+        Creates a `LexicalIndex` instance, loading the index stored in `path` if any.
+
+        Args:
+            path (str): The file where the index is stored.
+            k1 (float): The BM25 term frequency saturation.
+            b (float): The BM25 length normalization.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._documents: Dict[str, Dict[str, int]] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                for doc_id, terms in json.load(f)["documents"].items():
+                    self._add(doc_id, terms)
+
+    @classmethod
+    def for_index(cls, index: str) -> "LexicalIndex":
+        """Loads the lexical index of a document store index from settings LEXICAL_INDEX_DIR."""
+        return cls(os.path.join(os.path.expanduser(s.LEXICAL_INDEX_DIR), f"{index}.json"))
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _add(self, doc_id: str, terms: Dict[str, int]) -> None:
+        self._documents[doc_id] = terms
+        self._lengths[doc_id] = sum(terms.values())
+        self._total_length += self._lengths[doc_id]
+        for term, frequency in terms.items():
+            self._postings[term][doc_id] = frequency
+
+    def add(self, documents: Iterable[Document]) -> None:
+        """Indexes documents, replacing documents with the same ID.
+
+        Args:
+            documents (Iterable[Document]): The documents to index.
+        """
+        documents = list(documents)
+        self.remove([doc.id for doc in documents])
+        for document in documents:
+            self._add(document.id, dict(Counter(tokenize(document.content))))
+
+    def remove(self, ids: Iterable[str]) -> None:
+        """Removes documents from the index. Unknown IDs are ignored.
+
+        Args:
+            ids (Iterable[str]): The IDs of the documents to remove.
+        """
+        for doc_id in ids:
+            terms = self._documents.pop(doc_id, None)
+            if terms is None:
+                continue
+            self._total_length -= self._lengths.pop(doc_id)
+            for term in terms:
+                del self._postings[term][doc_id]
+                if not self._postings[term]:
+                    del self._postings[term]
+
+    def save(self) -> None:
+        """Writes the index to its file."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"documents": self._documents}, f)
+        os.replace(tmp_path, self.path)
+
+    def search(self, query: str, top_k: int, ids: Optional[Collection[str]] = None) -> List[Tuple[str, float]]:
+        """Ranks documents by their BM25 score for the query.
+
+        Term statistics are computed on the whole index, so that scores don't depend on `ids`.
+
+        Args:
+            query (str): The query.
+            top_k (int): How many documents to return.
+            ids (Collection[str], optional): The IDs of the documents to rank, e.g. the documents of some
+                                             lessons. If None, all documents are ranked.
+
+        Returns:
+            List[Tuple[str, float]]: The IDs and scores of the best matching documents, best first.
+        """
+        if not self._documents or (ids is not None and not ids):
+            return []
+
+        documents = len(self._documents)
+        average_length = self._total_length / documents
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                if ids is not None and doc_id not in ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+def is_confident(results: List[Tuple[str, float]], margin: Optional[float], min_score: float) -> bool:
+    """Checks if the best lexical match clearly outranks the others.
+
+    The margin applies to the second score, but never to less than `min_score`: a single match, or a match
+    among weak ones, must still score `margin * min_score`, so that an incidental match of a common word
+    never skips the embedding search.
+
+    Args:
+        results (List[Tuple[str, float]]): The results of `LexicalIndex.search`, best first.
+        margin (float, optional): How many times the best score must exceed the second one. If not set,
+                                  no match is considered confident.
+        min_score (float): The BM25 score the margin is applied to when the second score is lower.
+
+    Returns:
+        bool: True if the best match is confident.
+    """
+    if not margin or not results:
+        return False
+    second = results[1][1] if len(results) > 1 else 0.0
+    return results[0][1] >= margin * max(second, min_score)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], top_k: int, k: int = 60) -> List[Document]:
+    """Merges ranked lists of documents with reciprocal rank fusion.
+
+    Each document scores `1 / (k + rank)` in every list where it appears, so documents ranked high by
+    several retrievers come first, without comparing scores computed on different scales.
+
+    Args:
+        rankings (List[List[Document]]): The ranked lists, best first.
+        top_k (int): How many documents to return.
+        k (int): The rank smoothing constant.
+
+    Returns:
+        List[Document]: The merged list, with the fused score set on each document.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.id] += 1 / (k + rank)
+            documents.setdefault(document.id, document)
+
+    fused = []
+    for doc_id in sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)[:top_k]:
+        document = documents[doc_id]
+        document.score = scores[doc_id]
+        fused.append(document)
+    return fused
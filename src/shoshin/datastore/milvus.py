@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+from haystack.schema import Document
+from milvus_documentstore import MilvusDocumentStore
+
+from .quantization import rescore
+
+# Milvus index types storing compact vectors, by settings VECTOR_QUANTIZATION
+MILVUS_INDEX_TYPES = {"int8": "IVF_SQ8", "pq": "IVF_PQ"}
+
+
+class FilteredMilvusDocumentStore(MilvusDocumentStore):
+    """
+    A Milvus document store that applies metadata filters within the vector search.
+
+    `MilvusDocumentStore` keeps metadata in its SQL database and ignores the filters of its searches. Here, the
+    vector IDs of the documents matching the filters are read from the SQL database first, and the Milvus search
+    is restricted to them with a boolean expression: the `top_k` results all match the filters.
+    """
+
+    def query_by_embedding(
+        self,
+        query_emb: np.ndarray,
+        filters: Optional[dict] = None,
+        top_k: int = 10,
+        index: Optional[str] = None,
+        return_embedding: Optional[bool] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: bool = True,
+    ) -> List[Document]:
+        """
+        Finds the documents most similar to the query embedding among the documents matching the filters.
+
+        Returns:
+            List[Document]: The most similar documents, best first.
+        """
+        if not filters:
+            return super().query_by_embedding(
+                query_emb=query_emb,
+                top_k=top_k,
+                index=index,
+                return_embedding=return_embedding,
+                headers=headers,
+                scale_score=scale_score,
+            )
+
+        index = index or self.index
+        if return_embedding is None:
+            return_embedding = self.return_embedding
+        vector_ids = [
+            str(doc.meta["vector_id"])
+            for doc in self.get_all_documents_generator(index=index, filters=filters, return_embedding=False)
+            if doc.meta.get("vector_id") is not None
+        ]
+        if not vector_ids:
+            return []
+
+        query_emb = query_emb.reshape(-1).astype(np.float32)
+        if self.cosine:
+            self.normalize_embedding(query_emb)
+        results = self.collection.search(
+            data=[query_emb.tolist()],
+            anns_field=self.embedding_field,
+            param={"metric_type": self.metric_type, **self.search_param},
+            limit=top_k,
+            expr=f"{self.id_field} in [{', '.join(vector_ids)}]",
+        )
+        scores = {str(vector_id): distance for vector_id, distance in zip(results[0].ids, results[0].distances)}
+        documents = self.get_documents_by_vector_ids(list(scores), index=index)
+        if return_embedding:
+            self._populate_embeddings_to_docs(index=index, docs=documents)
+        for document in documents:
+            score = scores[document.meta["vector_id"]]
+            document.score = self.scale_to_unit_interval(score, self.similarity) if scale_score else score
+        return sorted(documents, key=lambda doc: doc.score, reverse=True)
+
+
+class QuantizedMilvusDocumentStore(FilteredMilvusDocumentStore):
+    """
+    A Milvus document store searching a quantized index (`IVF_SQ8` or `IVF_PQ`), with full precision re-scoring.
+
+    Milvus scans the compact index to find `top_k * rescore_factor` candidates, which are then re-scored with
+    their full precision embeddings (Milvus keeps the raw vectors next to the index) to return the `top_k` best.
+    The index groups embeddings in `nlist` clusters, and searches only the `nprobe` closest to the query: Milvus
+    suggests about `4 * sqrt(n)` clusters for `n` embeddings, and more probes trade speed for recall.
+    """
+
+    def __init__(
+        self,
+        quantization: str,
+        pq_subvectors: int = 96,
+        rescore_factor: int = 4,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        **kwargs,
+    ) -> None:
+        """
+        Creates a `QuantizedMilvusDocumentStore` instance.
+
+        Args:
+            quantization (str): The compact representation, `int8` or `pq`.
+            pq_subvectors (int): The number of parts (bytes) of each embedding encoded by `pq`.
+            rescore_factor (int): How many candidates per requested document are re-scored with full precision.
+            nlist (int): The number of clusters of the index.
+            nprobe (int): The number of clusters searched for each query.
+            **kwargs: The `MilvusDocumentStore` arguments.
+
+        Raises:
+            ValueError: If the quantization is not supported.
+        """
+        if quantization not in MILVUS_INDEX_TYPES:
+            raise ValueError(f"Unsupported quantization {quantization}. Only 'int8' and 'pq' are supported.")
+        index_param = {"nlist": nlist}
+        if quantization == "pq":
+            index_param.update({"m": pq_subvectors, "nbits": 8})
+        super().__init__(
+            index_type=MILVUS_INDEX_TYPES[quantization],
+            index_param=index_param,
+            search_param={"nprobe": nprobe},
+            **kwargs,
+        )
+        self.rescore_factor = rescore_factor
+
+    def query_by_embedding(
+        self,
+        query_emb: np.ndarray,
+        filters: Optional[dict] = None,
+        top_k: int = 10,
+        index: Optional[str] = None,
+        return_embedding: Optional[bool] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: bool = True,
+    ) -> List[Document]:
+        """
+        Finds the documents most similar to the query embedding, re-scoring the candidates of the quantized index.
+
+        Returns:
+            List[Document]: The most similar documents, sorted by their exact score.
+        """
+        if return_embedding is None:
+            return_embedding = self.return_embedding
+        candidates = super().query_by_embedding(
+            query_emb=query_emb,
+            filters=filters,
+            top_k=top_k * self.rescore_factor,
+            index=index,
+            return_embedding=True,
+            headers=headers,
+            scale_score=False,
+        )
+        documents = rescore(candidates, query_emb, top_k, self.similarity)
+        for document in documents:
+            if scale_score:
+                document.score = self.scale_to_unit_interval(document.score, self.similarity)
+            if not return_embedding:
+                document.embedding = None
+        return documents
@@ -0,0 +1,337 @@
+from typing import List, Optional, Union
+
+import numpy as np
+from haystack.schema import Document
+
+# Supported compact representations, see settings VECTOR_QUANTIZATION
+QUANTIZATION_METHODS = ("none", "int8", "pq")
+
+# Rows dequantized at once when scoring: small blocks stay in the CPU cache
+_SCORE_BLOCK_ROWS = 256
+
+# Rows encoded at once, so that the memory-mapped matrix is never copied in memory at once
+_ENCODE_BLOCK_ROWS = 8192
+
+# Rows used to fit projections and codebooks
+_TRAINING_ROWS = 20000
+
+
+def _training_sample(matrix: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    rows = len(matrix)
+    sample = matrix[np.sort(rng.choice(rows, size=min(rows, _TRAINING_ROWS), replace=False))]
+    return np.asarray(sample, dtype=np.float32)
+
+
+class Projection:
+    """A linear dimensionality reduction (PCA) fitted on the corpus.
+
+    Dot products of projected vectors approximate the dot products of the original vectors, up to the
+    variance dropped with the discarded components.
+
+    Attributes:
+        mean (np.ndarray): The mean of the training vectors.
+        components (np.ndarray): The principal components, one row per output dimension.
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray) -> None:
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, dim: int, seed: int = 0) -> "Projection":
+        """Fits the `dim` principal components of the rows of `matrix`.
+
+        Args:
+            matrix (np.ndarray): The embeddings, one row per document.
+            dim (int): The output dimension.
+            seed (int): The seed used to pick the training sample.
+
+        Raises:
+            ValueError: If `dim` is not lower than the embeddings dimension.
+
+        Returns:
+            Projection: The projection.
+        """
+        if not 0 < dim < matrix.shape[1]:
+            raise ValueError(f"Reduced dimension {dim} must be between 1 and {matrix.shape[1] - 1}.")
+        sample = _training_sample(matrix, np.random.default_rng(seed))
+        mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        components = np.zeros((dim, matrix.shape[1]), dtype=np.float32)
+        components[: min(dim, len(vt))] = vt[:dim]
+        return cls(mean.astype(np.float32), components)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Projects vectors (one per row) or a single vector."""
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+
+    def project_query(self, query: np.ndarray) -> np.ndarray:
+        """Projects a query, so that `transform(x) @ project_query(q) + mean @ q` approximates `x @ q`."""
+        return self.components @ query
+
+
+class ScalarQuantizer:
+    """An int8 scalar quantizer: each dimension is mapped to 255 levels between its corpus min and max.
+
+    Codes take a quarter of the memory of float32 vectors, and dot products are computed from the codes
+    without decoding them first.
+
+    Attributes:
+        center (np.ndarray): The middle of the range of each dimension.
+        scale (np.ndarray): The width of a level of each dimension.
+    """
+
+    def __init__(self, center: np.ndarray, scale: np.ndarray) -> None:
+        self.center = center
+        self.scale = scale
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, seed: int = 0) -> "ScalarQuantizer":
+        """Fits the range of each dimension on the rows of `matrix`."""
+        sample = _training_sample(matrix, np.random.default_rng(seed))
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        scale = np.where(high > low, (high - low) / 254, 1.0).astype(np.float32)
+        return cls(((high + low) / 2).astype(np.float32), scale)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Returns the int8 codes of vectors, one row per vector."""
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.center) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Returns the approximate dot products between the encoded vectors and the query."""
+        weights = (query * self.scale).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _SCORE_BLOCK_ROWS):
+            block = slice(start, start + _SCORE_BLOCK_ROWS)
+            scores[block] = codes[block].astype(np.float32) @ weights
+        return scores + float(self.center @ query)
+
+
+class ProductQuantizer:
+    """A product quantizer: vectors are split in `subvectors` parts, each encoded by its closest centroid.
+
+    Each part is stored as one byte (256 centroids per part), e.g. 96 bytes for a 1536-dim embedding split
+    in 96 parts instead of 6144 bytes. Dot products with a query are the sums of the dot products between
+    the query parts and the centroids of the codes, looked up from a table computed once per query.
+
+    Attributes:
+        centroids (np.ndarray): The centroids of each part, with shape (subvectors, 256, dim / subvectors).
+    """
+
+    def __init__(self, centroids: np.ndarray) -> None:
+        self.centroids = centroids
+
+    @property
+    def subvectors(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, subvectors: int, iterations: int = 10, seed: int = 0) -> "ProductQuantizer":
+        """Fits the centroids of each part with k-means on the rows of `matrix`.
+
+        Args:
+            matrix (np.ndarray): The embeddings, one row per document.
+            subvectors (int): The number of parts, which must divide the embeddings dimension.
+            iterations (int): The number of k-means iterations.
+            seed (int): The seed used to pick the training sample and the initial centroids.
+
+        Raises:
+            ValueError: If the embeddings dimension is not a multiple of `subvectors`.
+
+        Returns:
+            ProductQuantizer: The quantizer.
+        """
+        dim = matrix.shape[1]
+        if subvectors <= 0 or dim % subvectors:
+            raise ValueError(f"Embeddings dimension {dim} is not a multiple of {subvectors} subvectors.")
+        rng = np.random.default_rng(seed)
+        sample = _training_sample(matrix, rng).reshape(-1, subvectors, dim // subvectors)
+        n_centroids = min(256, len(sample))
+        centroids = np.empty((subvectors, n_centroids, dim // subvectors), dtype=np.float32)
+        for part in range(subvectors):
+            vectors = sample[:, part]
+            part_centroids = vectors[rng.choice(len(vectors), size=n_centroids, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = _closest(vectors, part_centroids)
+                counts = np.bincount(assignment, minlength=n_centroids)
+                sums = np.zeros_like(part_centroids)
+                np.add.at(sums, assignment, vectors)
+                # Centroids without members keep their position
+                filled = counts > 0
+                part_centroids[filled] = sums[filled] / counts[filled, None]
+            centroids[part] = part_centroids
+        return cls(centroids)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Returns the codes of vectors, one row of `subvectors` bytes per vector."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        parts = vectors.reshape(len(vectors), self.subvectors, -1)
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for part in range(self.subvectors):
+            codes[:, part] = _closest(parts[:, part], self.centroids[part])
+        return codes
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Returns the approximate dot products between the encoded vectors and the query."""
+        table = np.einsum("pkd,pd->pk", self.centroids, query.reshape(self.subvectors, -1).astype(np.float32))
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for part in range(self.subvectors):
+            scores += table[part].take(codes[:, part])
+        return scores
+
+
+def _closest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Returns the index of the closest centroid (L2) of each vector."""
+    return np.argmin((centroids**2).sum(axis=1) - 2 * (vectors @ centroids.T), axis=1)
+
+
+class QuantizedIndex:
+    """
+    A compact copy of the embeddings matrix, used to select the candidates of a search.
+
+    Embeddings are optionally projected to fewer dimensions, then encoded with a `ScalarQuantizer` (`int8`)
+    or a `ProductQuantizer` (`pq`). Scores computed from the codes are approximate: searches keep more
+    candidates than requested and re-score them with the full precision embeddings (see `candidates`).
+
+    Attributes:
+        quantizer (ScalarQuantizer | ProductQuantizer): The quantizer of the codes.
+        codes (np.ndarray): The codes, one row per embedding.
+        norms (np.ndarray): The norms of the full precision embeddings, used by the cosine similarity.
+        projection (Projection | None): The dimensionality reduction applied before quantization.
+    """
+
+    def __init__(
+        self,
+        quantizer: Union[ScalarQuantizer, ProductQuantizer],
+        codes: np.ndarray,
+        norms: np.ndarray,
+        projection: Optional[Projection] = None,
+    ) -> None:
+        self.quantizer = quantizer
+        self.codes = codes
+        self.norms = norms
+        self.projection = projection
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        method: str,
+        reduced_dim: Optional[int] = None,
+        subvectors: int = 96,
+        seed: int = 0,
+    ) -> "QuantizedIndex":
+        """Encodes the rows of `matrix`.
+
+        Args:
+            matrix (np.ndarray): The embeddings, one row per document.
+            method (str): The quantization, `int8` or `pq`.
+            reduced_dim (int, optional): The dimension of the projection fitted before quantization. If None,
+                                         embeddings are quantized with their full dimension.
+            subvectors (int): The number of parts of the product quantizer.
+            seed (int): The seed of the training samples.
+
+        Raises:
+            ValueError: If the quantization method or its parameters are not supported.
+
+        Returns:
+            QuantizedIndex: The index.
+        """
+        if method not in ("int8", "pq"):
+            raise ValueError(f"Unsupported quantization {method}. Only 'int8' and 'pq' are supported.")
+        projection = Projection.fit(matrix, reduced_dim, seed=seed) if reduced_dim else None
+
+        training = _training_sample(matrix, np.random.default_rng(seed))
+        if projection is not None:
+            training = projection.transform(training)
+        if method == "int8":
+            quantizer: Union[ScalarQuantizer, ProductQuantizer] = ScalarQuantizer.fit(training, seed=seed)
+        else:
+            quantizer = ProductQuantizer.fit(training, subvectors, seed=seed)
+
+        codes, norms = [], []
+        for start in range(0, len(matrix), _ENCODE_BLOCK_ROWS):
+            block = np.asarray(matrix[slice(start, start + _ENCODE_BLOCK_ROWS)], dtype=np.float32)
+            norms.append(np.linalg.norm(block, axis=1))
+            codes.append(quantizer.encode(projection.transform(block) if projection is not None else block))
+        # Product quantization scores codes part by part: store each part contiguously
+        order = "F" if method == "pq" else "C"
+        return cls(quantizer, np.concatenate(codes).copy(order=order), np.concatenate(norms), projection)
+
+    @property
+    def nbytes(self) -> int:
+        """The memory taken by the codes, in bytes."""
+        return self.codes.nbytes
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None, cosine: bool = False) -> np.ndarray:
+        """Returns the approximate similarity between the query and the embeddings of `rows` (default: all rows).
+
+        Args:
+            query (np.ndarray): The query embedding, with full dimension.
+            rows (np.ndarray, optional): The rows to score.
+            cosine (bool): Whether to return the cosine similarity instead of the dot product.
+
+        Returns:
+            np.ndarray: The approximate scores, in the order of `rows`.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.projection is None:
+            scores = self.quantizer.scores(codes, query)
+        else:
+            scores = self.quantizer.scores(codes, self.projection.project_query(query))
+            scores += float(self.projection.mean @ query)
+        if cosine:
+            norms = (self.norms if rows is None else self.norms[rows]) * np.linalg.norm(query)
+            scores = scores / np.where(norms > 0, norms, 1)
+        return scores
+
+    def candidates(
+        self, query: np.ndarray, count: int, rows: Optional[np.ndarray] = None, cosine: bool = False
+    ) -> np.ndarray:
+        """Returns the `count` rows with the best approximate scores, to be re-scored with full precision.
+
+        Args:
+            query (np.ndarray): The query embedding.
+            count (int): The number of candidates.
+            rows (np.ndarray, optional): The rows to search. Defaults to all rows.
+            cosine (bool): Whether to rank by cosine similarity instead of dot product.
+
+        Returns:
+            np.ndarray: The candidate rows, sorted.
+        """
+        scores = self.scores(query, rows, cosine)
+        count = min(count, len(scores))
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, count - 1)[:count]
+        return np.sort(top if rows is None else rows[top])
+
+
+def rescore(documents: List[Document], query: np.ndarray, top_k: int, similarity: str) -> List[Document]:
+    """Re-scores candidate documents with their full precision embeddings, keeping the `top_k` best.
+
+    Args:
+        documents (List[Document]): The candidates, with their embeddings.
+        query (np.ndarray): The query embedding.
+        top_k (int): How many documents to keep.
+        similarity (str): The similarity function, `dot_product` or `cosine`.
+
+    Returns:
+        List[Document]: The best documents, sorted by their exact score.
+    """
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    scored = []
+    for document in documents:
+        if document.embedding is None:
+            continue
+        embedding = np.asarray(document.embedding, dtype=np.float32)
+        score = float(embedding @ query)
+        if similarity == "cosine":
+            norm = float(np.linalg.norm(embedding) * np.linalg.norm(query))
+            score = score / norm if norm > 0 else score
+        document.score = score
+        scored.append(document)
+    scored.sort(key=lambda document: document.score, reverse=True)
+    return scored[:top_k]
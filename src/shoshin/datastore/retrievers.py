@@ -0,0 +1,439 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import aiohttp
+import numpy as np
+from haystack.document_stores import BaseDocumentStore
+from haystack.nodes import BaseRetriever, EmbeddingRetriever
+from haystack.schema import Document
+
+from ..ai.embeddings import EmbeddingEngine
+from ..aio import run_blocking
+from ..cache.embeddings import EmbeddingCache
+from ..conf import constants as c
+from ..metrics import metrics
+from .lexical import LexicalIndex, is_confident, reciprocal_rank_fusion
+
+
+class CachedEmbeddingRetriever(EmbeddingRetriever):
+    """
+    An `EmbeddingRetriever` that reads embeddings from an `EmbeddingCache` before calling the embedding model.
+
+    Both document and query embeddings go through the cache, and only texts that are not cached are sent
+    to the model. When an `EmbeddingEngine` is set, missing embeddings are computed with concurrent batched
+    requests instead of the sequential Haystack encoder. Without a cache and an engine, the retriever behaves
+    like `EmbeddingRetriever`. `aembed_queries` and `aembed_documents` compute missing embeddings with the
+    async API of the engine.
+
+    Attributes:
+        cache (EmbeddingCache | None): The embedding cache.
+        engine (EmbeddingEngine | None): The engine used to compute embeddings.
+    """
+
+    def __init__(
+        self, *args, cache: Optional[EmbeddingCache] = None, engine: Optional[EmbeddingEngine] = None, **kwargs
+    ) -> None:
+        """
+        Creates a `CachedEmbeddingRetriever` instance.
+
+        Args:
+            *args: Positional arguments forwarded to `EmbeddingRetriever`.
+            cache (EmbeddingCache, optional): The embedding cache. If None, embeddings are not cached.
+            engine (EmbeddingEngine, optional): The engine used to compute embeddings. If None, the Haystack
+                                                encoder is used.
+            **kwargs: Keyword arguments forwarded to `EmbeddingRetriever`.
+        """
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+        self.engine = engine
+
+    def _cached(self, cache: EmbeddingCache, texts: Sequence[str]) -> Tuple[list, List[int]]:
+        """Returns the cached embedding of each text (or None), and the indexes of the missing ones."""
+        cached = cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        metrics.increment("embedding_cache.hits", len(texts) - len(missing))
+        metrics.increment("embedding_cache.misses", len(missing))
+        return cached, missing
+
+    def _merge_cached(
+        self, cache: EmbeddingCache, texts: Sequence[str], cached: list, missing: List[int], embeddings: np.ndarray
+    ) -> np.ndarray:
+        cache.set_many([texts[i] for i in missing], embeddings)
+        for i, embedding in zip(missing, embeddings):
+            cached[i] = embedding
+        return np.array(cached)
+
+    def _embed_cached(self, texts: Sequence[str], embed: Callable[[List[int]], np.ndarray]) -> np.ndarray:
+        cache = self.cache
+        if cache is None:
+            return embed(list(range(len(texts))))
+
+        cached, missing = self._cached(cache, texts)
+        if not missing:
+            return np.array(cached)
+        return self._merge_cached(cache, texts, cached, missing, embed(missing))
+
+    async def _aembed_cached(
+        self, texts: Sequence[str], embed: Callable[[List[int]], Awaitable[np.ndarray]]
+    ) -> np.ndarray:
+        cache = self.cache
+        if cache is None:
+            return await embed(list(range(len(texts))))
+
+        cached, missing = self._cached(cache, texts)
+        if not missing:
+            return np.array(cached)
+        return self._merge_cached(cache, texts, cached, missing, await embed(missing))
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Creates embeddings for a list of queries, reusing cached embeddings.
+
+        Args:
+            queries (List[str]): The queries to embed.
+
+        Returns:
+            np.ndarray: The embeddings, one row per query.
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+        if not queries:
+            return super().embed_queries(queries)
+
+        def embed(missing: List[int]) -> np.ndarray:
+            if self.engine is not None:
+                return self.engine.embed([queries[i] for i in missing])
+            return super(CachedEmbeddingRetriever, self).embed_queries([queries[i] for i in missing])
+
+        with metrics.span("embed_queries"):
+            return self._embed_cached(queries, embed)
+
+    def embed_documents(self, documents: List[Document]) -> np.ndarray:
+        """
+        Creates embeddings for a list of documents, reusing cached embeddings.
+
+        Args:
+            documents (List[Document]): The documents to embed.
+
+        Returns:
+            np.ndarray: The embeddings, one row per document.
+        """
+        if not documents:
+            return super().embed_documents(documents)
+
+        def embed(missing: List[int]) -> np.ndarray:
+            if self.engine is not None:
+                return self.engine.embed([documents[i].content for i in missing])
+            return super(CachedEmbeddingRetriever, self).embed_documents([documents[i] for i in missing])
+
+        with metrics.span("embed_documents"):
+            return self._embed_cached([doc.content for doc in documents], embed)
+
+    async def aembed_queries(self, queries: List[str], session: Optional[aiohttp.ClientSession] = None) -> np.ndarray:
+        """
+        Creates embeddings for a list of queries, reusing cached embeddings, without blocking the event loop.
+
+        Args:
+            queries (List[str]): The queries to embed.
+            session (aiohttp.ClientSession, optional): The session used to send requests.
+
+        Returns:
+            np.ndarray: The embeddings, one row per query.
+        """
+        engine = self.engine
+        if engine is None:
+            # The Haystack encoder is blocking: run it in the executor
+            return await run_blocking(self.embed_queries, queries)
+        with metrics.span("embed_queries"):
+            return await self._aembed_cached(
+                # Questions of concurrent coroutines are embedded with a single request
+                queries,
+                lambda missing: engine.aembed([queries[i] for i in missing], session, coalesce=True),
+            )
+
+    async def aembed_documents(
+        self, documents: List[Document], session: Optional[aiohttp.ClientSession] = None
+    ) -> np.ndarray:
+        """
+        Creates embeddings for a list of documents, reusing cached embeddings, without blocking the event loop.
+
+        Args:
+            documents (List[Document]): The documents to embed.
+            session (aiohttp.ClientSession, optional): The session used to send requests.
+
+        Returns:
+            np.ndarray: The embeddings, one row per document.
+        """
+        engine = self.engine
+        if engine is None:
+            return await run_blocking(self.embed_documents, documents)
+        texts = [doc.content for doc in documents]
+        with metrics.span("embed_documents"):
+            return await self._aembed_cached(texts, lambda missing: engine.aembed([texts[i] for i in missing], session))
+
+    def retrieve(self, *args, **kwargs) -> List[Document]:
+        """
+        Retrieves the documents most relevant to the query. See `EmbeddingRetriever.retrieve`.
+
+        Returns:
+            List[Document]: The documents, best first.
+        """
+        with metrics.span("retrieve"):
+            return super().retrieve(*args, **kwargs)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    A retriever that merges BM25 and embedding search results with reciprocal rank fusion.
+
+    Dense retrieval blurs exact tokens such as names and commands, while the `LexicalIndex` matches them
+    exactly: documents ranked high by both searches come first. When the best lexical match clearly
+    outranks the others (see `is_confident`), lexical results are returned as they are and the query
+    embedding is not computed at all.
+
+    Attributes:
+        embedding_retriever (EmbeddingRetriever): The retriever used to embed queries.
+        lexical_index (LexicalIndex): The BM25 index of the stored documents.
+        document_store (BaseDocumentStore): The store searched by embedding.
+    """
+
+    def __init__(
+        self,
+        embedding_retriever: EmbeddingRetriever,
+        lexical_index: LexicalIndex,
+        top_k: int = c.RETRIEVER_TOP_K,
+        lexical_margin: Optional[float] = None,
+        lexical_min_score: float = 5.0,
+        rrf_k: int = c.RRF_K,
+    ) -> None:
+        """
+        Creates a `HybridRetriever` instance.
+
+        Args:
+            embedding_retriever (EmbeddingRetriever): The retriever used to embed queries.
+            lexical_index (LexicalIndex): The BM25 index of the stored documents.
+            top_k (int): How many documents to return by default.
+            lexical_margin (float, optional): How many times the best BM25 score must exceed the second one
+                                              to skip the embedding search. If None, both searches always run.
+            lexical_min_score (float): The BM25 score the margin is applied to when the second score is lower,
+                                       so that a single weak match is never confident.
+            rrf_k (int): The rank smoothing constant of the reciprocal rank fusion.
+        """
+        super().__init__()
+        self.embedding_retriever = embedding_retriever
+        self.lexical_index = lexical_index
+        self.document_store = embedding_retriever.document_store
+        self.top_k = top_k
+        self.lexical_margin = lexical_margin
+        self.lexical_min_score = lexical_min_score
+        self.rrf_k = rrf_k
+
+    def _lexical_documents(self, results: List[Tuple[str, float]], index: Optional[str]) -> List[Document]:
+        if not results:
+            return []
+        stored = {doc.id: doc for doc in self.document_store.get_documents_by_id([i for i, _ in results], index=index)}
+        return [stored[doc_id] for doc_id, _ in results if doc_id in stored]
+
+    def _filtered_ids(self, filters: Optional[dict], index: Optional[str]) -> Optional[Set[str]]:
+        """Returns the IDs of the stored documents matching the filters, or None if there are no filters."""
+        if not filters:
+            return None
+        documents = self.document_store.get_all_documents_generator(
+            index=index, filters=filters, return_embedding=False
+        )
+        return {doc.id for doc in documents}
+
+    def _lexical_search(
+        self, queries: List[str], filters: Optional[dict], top_k: int, index: Optional[str]
+    ) -> List[Tuple[List[Document], bool]]:
+        """
+        Returns the BM25 results of each query, and whether they are confident enough to skip the embedding search.
+
+        Only the documents matching the filters are scored, so that the best matches of other lessons never
+        push the matches of the selected ones out of the `top_k`.
+        """
+        results = []
+        with metrics.span("lexical_search"):
+            ids = self._filtered_ids(filters, index)
+            for query in queries:
+                lexical = self.lexical_index.search(query, top_k, ids=ids)
+                lexical_documents = self._lexical_documents(lexical, index)
+                confident = (
+                    is_confident(lexical, self.lexical_margin, self.lexical_min_score)
+                    and bool(lexical_documents)
+                    and lexical_documents[0].id == lexical[0][0]
+                )
+                if confident:
+                    metrics.increment("hybrid.lexical_only")
+                results.append((lexical_documents, confident))
+        return results
+
+    def retrieve_with_embedding(
+        self,
+        query: str,
+        filters: Optional[dict] = None,
+        top_k: Optional[int] = None,
+        index: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: Optional[bool] = None,
+    ) -> Tuple[List[Document], Optional[np.ndarray]]:
+        """
+        Retrieves the documents most relevant to the query, returning the query embedding if it was computed.
+
+        Args:
+            query (str): The query.
+            filters (dict, optional): Metadata filters applied to both searches.
+            top_k (int, optional): How many documents to return. Defaults to the retriever `top_k`.
+            index (str, optional): The index to search.
+            headers (Dict[str, str], optional): Custom HTTP headers for the document store.
+            scale_score (bool, optional): Whether to scale embedding similarity scores to the unit interval.
+
+        Returns:
+            Tuple[List[Document], Optional[np.ndarray]]: The documents, and the query embedding or None
+                                                         if the lexical match was confident.
+        """
+        with metrics.span("retrieve"):
+            top_k = top_k or self.top_k
+            lexical_documents, confident = self._lexical_search([query], filters, top_k, index)[0]
+            if confident:
+                return lexical_documents, None
+
+            if scale_score is None:
+                scale_score = self.embedding_retriever.scale_score
+            embedding = self.embedding_retriever.embed_queries([query])[0]
+            with metrics.span("vector_search"):
+                dense_documents = self.document_store.query_by_embedding(
+                    query_emb=embedding,
+                    filters=filters,
+                    top_k=top_k,
+                    index=index,
+                    headers=headers,
+                    scale_score=scale_score,
+                )
+            return reciprocal_rank_fusion([dense_documents, lexical_documents], top_k, self.rrf_k), embedding
+
+    async def aretrieve_with_embedding(
+        self,
+        query: str,
+        filters: Optional[dict] = None,
+        top_k: Optional[int] = None,
+        index: Optional[str] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+    ) -> Tuple[List[Document], Optional[np.ndarray]]:
+        """
+        Retrieves the documents most relevant to the query without blocking the event loop.
+
+        The query is embedded with the async API of the embedding retriever, while the searches of the
+        document store run in the default executor. See `retrieve_with_embedding`.
+
+        Returns:
+            Tuple[List[Document], Optional[np.ndarray]]: The documents, and the query embedding or None
+                                                         if the lexical match was confident.
+        """
+        with metrics.span("retrieve"):
+            top_k = top_k or self.top_k
+            lexical_documents, confident = (await run_blocking(self._lexical_search, [query], filters, top_k, index))[0]
+            if confident:
+                return lexical_documents, None
+
+            embedding = (await self.embedding_retriever.aembed_queries([query], session))[0]
+            with metrics.span("vector_search"):
+                dense_documents = await run_blocking(
+                    self.document_store.query_by_embedding,
+                    query_emb=embedding,
+                    filters=filters,
+                    top_k=top_k,
+                    index=index,
+                    scale_score=self.embedding_retriever.scale_score,
+                )
+            return reciprocal_rank_fusion([dense_documents, lexical_documents], top_k, self.rrf_k), embedding
+
+    def retrieve(
+        self,
+        query: str,
+        filters: Optional[dict] = None,
+        top_k: Optional[int] = None,
+        index: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: Optional[bool] = None,
+        document_store: Optional[BaseDocumentStore] = None,
+    ) -> List[Document]:
+        """
+        Retrieves the documents most relevant to the query. See `retrieve_with_embedding`.
+
+        Returns:
+            List[Document]: The documents, best first.
+        """
+        documents, _ = self.retrieve_with_embedding(query, filters, top_k, index, headers, scale_score)
+        return documents
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        filters: Optional[dict] = None,
+        top_k: Optional[int] = None,
+        index: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        batch_size: Optional[int] = None,
+        scale_score: Optional[bool] = None,
+        document_store: Optional[BaseDocumentStore] = None,
+    ) -> List[List[Document]]:
+        """
+        Retrieves the documents most relevant to each query. See `retrieve_batch_with_embeddings`.
+
+        Returns:
+            List[List[Document]]: The documents of each query, best first.
+        """
+        results = self.retrieve_batch_with_embeddings(queries, filters, top_k, index, headers, scale_score)
+        return [documents for documents, _ in results]
+
+    def retrieve_batch_with_embeddings(
+        self,
+        queries: List[str],
+        filters: Optional[dict] = None,
+        top_k: Optional[int] = None,
+        index: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: Optional[bool] = None,
+    ) -> List[Tuple[List[Document], Optional[np.ndarray]]]:
+        """
+        Retrieves the documents most relevant to each query, like `retrieve_with_embedding`.
+
+        Queries without a confident lexical match are embedded with a single `embed_queries` call, and
+        searched with a single `query_by_embedding_batch` call.
+
+        Args:
+            queries (List[str]): The queries.
+            filters (dict, optional): Metadata filters applied to both searches.
+            top_k (int, optional): How many documents to return for each query. Defaults to the retriever `top_k`.
+            index (str, optional): The index to search.
+            headers (Dict[str, str], optional): Custom HTTP headers for the document store.
+            scale_score (bool, optional): Whether to scale embedding similarity scores to the unit interval.
+
+        Returns:
+            List[Tuple[List[Document], Optional[np.ndarray]]]: For each query, its documents and its embedding,
+                                                               or None if the lexical match was confident.
+        """
+        with metrics.span("retrieve"):
+            top_k = top_k or self.top_k
+            lexical = self._lexical_search(queries, filters, top_k, index)
+            results: List[Tuple[List[Document], Optional[np.ndarray]]] = [(documents, None) for documents, _ in lexical]
+            pending = [i for i, (_, confident) in enumerate(lexical) if not confident]
+            if not pending:
+                return results
+
+            if scale_score is None:
+                scale_score = self.embedding_retriever.scale_score
+            embeddings = self.embedding_retriever.embed_queries([queries[i] for i in pending])
+            with metrics.span("vector_search"):
+                dense = self.document_store.query_by_embedding_batch(
+                    query_embs=embeddings,
+                    filters=filters,
+                    top_k=top_k,
+                    index=index,
+                    headers=headers,
+                    scale_score=scale_score,
+                )
+            for i, embedding, dense_documents in zip(pending, embeddings, dense):
+                fused = reciprocal_rank_fusion([dense_documents, lexical[i][0]], top_k, self.rrf_k)
+                results[i] = (fused, embedding)
+            return results
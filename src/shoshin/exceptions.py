@@ -1,8 +1,14 @@
-from ffmpeg import Error as FFMpegError
-from openai.error import OpenAIError
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .__about__ import __version__ as VERSION
 
+if TYPE_CHECKING:
+    # Only used by annotations, so that importing exceptions never loads ffmpeg or openai
+    from ffmpeg import Error as FFMpegError
+    from openai.error import OpenAIError
+
 _TROUBLESHOOTING_DOCS_URL = f"https://github.com/palazzem/shoshin/wiki/{VERSION}-"
 
 
@@ -0,0 +1,190 @@
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, Optional
+
+# Separates the names of nested spans, e.g. `query/retrieve/embed_queries`
+SPAN_SEPARATOR = "/"
+
+_PROMETHEUS_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+@dataclass
+class SpanStats:
+    """The aggregated durations of a span.
+
+    Attributes:
+        count (int): How many times the span ran.
+        total (float): The total duration, in seconds.
+        min (float): The shortest duration, in seconds.
+        max (float): The longest duration, in seconds.
+    """
+
+    count: int = 0
+    total: float = 0.0
+    min: float = float("inf")
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        """Returns the mean duration, in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.min = min(self.min, duration)
+        self.max = max(self.max, duration)
+
+
+class Metrics:
+    """
+    A registry of timed spans and counters, shared by all threads of the process.
+
+    Spans time the stages of Shoshin operations (e.g. retrieval or generation of `ai.query`), and are named
+    after the spans they run in: a `retrieve` span started in a `query` span is recorded as `query/retrieve`,
+    so the time of an operation can be broken down by stage. Spans started in worker threads are recorded
+    at the top level, while each asyncio task nests its spans in the spans of the task that created it.
+    Counters track quantities such as API requests, tokens, retries and cache hits.
+
+    Example:
+        with metrics.span("query"):
+            metrics.increment("answer_cache.misses")
+
+    Metrics can be exported as JSON (`to_dict`) or in the Prometheus text format (`to_prometheus`).
+    """
+
+    def __init__(self) -> None:
+        self._spans: Dict[str, SpanStats] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # The path of the current span: a context variable, so that concurrent coroutines don't share it
+        self._current: ContextVar[Optional[str]] = ContextVar("span", default=None)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Times the enclosed block, nested in the spans of the current thread or asyncio task.
+
+        Args:
+            name (str): The span name.
+        """
+        parent = self._current.get()
+        path = name if parent is None else SPAN_SEPARATOR.join([parent, name])
+        token = self._current.set(path)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self._current.reset(token)
+            with self._lock:
+                stats = self._spans.get(path)
+                if stats is None:
+                    stats = self._spans[path] = SpanStats()
+                stats.add(duration)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Adds `value` to a counter.
+
+        Args:
+            name (str): The counter name, e.g. `openai.embeddings.tokens`.
+            value (float): The amount added to the counter.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def spans(self) -> Dict[str, SpanStats]:
+        """Returns a copy of the span statistics, by span path."""
+        with self._lock:
+            return {path: SpanStats(**asdict(stats)) for path, stats in self._spans.items()}
+
+    def counters(self) -> Dict[str, float]:
+        """Returns a copy of the counters, by name."""
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self) -> None:
+        """Forgets all spans and counters."""
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """Exports the metrics as a JSON serializable dictionary, with durations in seconds."""
+        spans = {
+            path: {"count": stats.count, "total": stats.total, "mean": stats.mean, "min": stats.min, "max": stats.max}
+            for path, stats in sorted(self.spans().items())
+        }
+        return {"spans": spans, "counters": dict(sorted(self.counters().items()))}
+
+    def to_json(self) -> str:
+        """Exports the metrics as a JSON document."""
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "shoshin") -> str:
+        """Exports the metrics in the Prometheus text format.
+
+        Spans are exported as the `<prefix>_span_seconds` summary, labeled by span path, and each counter
+        as a `<prefix>_<name>_total` counter.
+
+        Args:
+            prefix (str): The prefix of the metric names.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        lines = [
+            f"# HELP {prefix}_span_seconds Time spent in each stage of Shoshin operations.",
+            f"# TYPE {prefix}_span_seconds summary",
+        ]
+        for path, stats in sorted(self.spans().items()):
+            label = path.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{prefix}_span_seconds_count{{span="{label}"}} {stats.count}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{label}"}} {stats.total:.6f}')
+        for name, value in sorted(self.counters().items()):
+            metric = f"{prefix}_{_PROMETHEUS_NAME.sub('_', name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def breakdown(self) -> str:
+        """Formats spans as an indented tree, followed by counters.
+
+        For each span, the report shows its self time (not spent in nested spans) and its share of the
+        top-level span time, so the slowest stages stand out.
+
+        Returns:
+            str: A human readable report.
+        """
+        spans = self.spans()
+        nested: Dict[str, float] = {}
+        for path, stats in spans.items():
+            parent = path.rpartition(SPAN_SEPARATOR)[0]
+            if parent:
+                nested[parent] = nested.get(parent, 0.0) + stats.total
+
+        header = f"{'span':<40} {'count':>7} {'total ms':>10} {'self ms':>10} {'mean ms':>10} {'max ms':>10} {'%':>6}"
+        lines = [header]
+        for path, stats in sorted(spans.items()):
+            parts = path.split(SPAN_SEPARATOR)
+            root = spans.get(parts[0])
+            share = stats.total / root.total * 100 if root is not None and root.total else 100.0
+            name = "  " * (len(parts) - 1) + parts[-1]
+            self_time = max(stats.total - nested.get(path, 0.0), 0.0)
+            lines.append(
+                f"{name:<40} {stats.count:>7} {stats.total * 1000:>10.1f} {self_time * 1000:>10.1f} "
+                f"{stats.mean * 1000:>10.1f} {stats.max * 1000:>10.1f} {share:>5.1f}%"
+            )
+        counters = self.counters()
+        if counters:
+            lines.append("")
+            lines.extend(f"{name:<48} {value:>10g}" for name, value in sorted(counters.items()))
+        return "\n".join(lines)
+
+
+# Metrics of the current process
+metrics = Metrics()
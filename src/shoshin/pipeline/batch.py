@@ -0,0 +1,171 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ..exceptions import AudioExtractionError
+from . import processors
+from .journal import EXTRACTED, Journal, fingerprint
+
+VIDEO_EXTENSIONS = (".mp4",)
+
+
+@dataclass
+class ConversionResult:
+    """The outcome of a single audio extraction job.
+
+    Attributes:
+        video_file (str): The path of the source video file.
+        output_file (str): The path of the extracted MP3 file.
+        size (int): The size in bytes of the source video file.
+        elapsed (float): The wall-clock time spent on the extraction, in seconds.
+        skipped (bool): True if the output was already up to date and the job did not run.
+        error (str | None): The error message if the extraction failed.
+    """
+
+    video_file: str
+    output_file: str
+    size: int
+    elapsed: float = 0.0
+    skipped: bool = False
+    error: Optional[str] = None
+
+    @property
+    def throughput(self) -> float:
+        """Returns the processed bytes per second, or 0 if the job did not run."""
+        if self.skipped or self.error or self.elapsed <= 0:
+            return 0.0
+        return self.size / self.elapsed
+
+
+def find_video_files(path: str) -> List[str]:
+    """Finds all video files referenced by `path`.
+
+    The path can be a single video file, a directory (not traversed recursively) or a glob pattern.
+    Only files with a supported video extension are returned.
+
+    Args:
+        path (str): A video file, a directory or a glob pattern.
+
+    Returns:
+        List[str]: The sorted list of video files.
+    """
+    if os.path.isdir(path):
+        candidates = [os.path.join(path, name) for name in os.listdir(path)]
+    else:
+        candidates = glob.glob(path)
+
+    return sorted(f for f in candidates if os.path.isfile(f) and os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS)
+
+
+def is_up_to_date(source: str, output: str) -> bool:
+    """Checks if `output` exists and is newer than `source`.
+
+    Args:
+        source (str): The path of the source file.
+        output (str): The path of the generated file.
+
+    Returns:
+        bool: True if the output doesn't need to be generated again.
+    """
+    return os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(source)
+
+
+def is_completed(source: str, output: str, stage: str, journal: Optional[Journal] = None) -> bool:
+    """Checks if `output` is up to date and was not left behind by an interrupted run of `stage`.
+
+    Outputs without a journal record, e.g. generated before the journal was introduced, are trusted.
+
+    Args:
+        source (str): The path of the source file, used as the journal item.
+        output (str): The path of the generated file.
+        stage (str): The stage that generates `output` from `source`.
+        journal (Journal, optional): The journal where the stage is recorded.
+
+    Returns:
+        bool: True if the output doesn't need to be generated again.
+    """
+    if not is_up_to_date(source, output):
+        return False
+    return journal is None or not journal.is_interrupted(source, stage)
+
+
+def _extract(video_file: str, output_file: str) -> ConversionResult:
+    """Runs a single extraction job, capturing errors so that one broken video doesn't abort the batch."""
+    size = os.path.getsize(video_file)
+    start = time.perf_counter()
+    try:
+        processors.extract_audio_from_video(video_file, output_file)
+    except AudioExtractionError as e:
+        return ConversionResult(video_file, output_file, size, time.perf_counter() - start, error=str(e))
+    return ConversionResult(video_file, output_file, size, time.perf_counter() - start)
+
+
+def extract_audio_from_videos(
+    jobs: Iterable[Tuple[str, str]], workers: int = 1, force: bool = False, journal: Optional[Journal] = None
+) -> Iterator[ConversionResult]:
+    """Extracts the audio track of many video files, running several `ffmpeg` processes at once.
+
+    Jobs whose output is already newer than the source video are skipped unless `force` is set.
+    Results are yielded as soon as each job completes, so their order may differ from `jobs`.
+
+    When a `Journal` is given, each job is recorded as started before it runs and as completed after
+    it succeeds. Outputs of jobs that were started but never completed, e.g. because the previous run
+    was interrupted, are extracted again even if they are newer than the source video.
+
+    Args:
+        jobs (Iterable[Tuple[str, str]]): Pairs of (video file, output MP3 file).
+        workers (int): The number of processes used to run extraction jobs. With 1 worker,
+                       jobs run sequentially in the current process.
+        force (bool): If True, outputs are generated even if they are up to date.
+        journal (Journal, optional): The journal where completed jobs are recorded.
+
+    Yields:
+        ConversionResult: The outcome of each job.
+    """
+    pending = []
+    for video_file, output_file in jobs:
+        if not force and is_completed(video_file, output_file, EXTRACTED, journal):
+            yield ConversionResult(video_file, output_file, os.path.getsize(video_file), skipped=True)
+        else:
+            pending.append((video_file, output_file))
+
+    for result in _run_extractions(pending, workers, journal):
+        if journal is not None and result.error is None:
+            journal.mark_done(result.video_file, EXTRACTED, fingerprint(result.video_file))
+        yield result
+
+
+def _run_extractions(
+    jobs: List[Tuple[str, str]], workers: int, journal: Optional[Journal]
+) -> Iterator[ConversionResult]:
+    if journal is not None:
+        for video_file, _ in jobs:
+            journal.start(video_file, EXTRACTED)
+
+    if workers <= 1:
+        for video_file, output_file in jobs:
+            yield _extract(video_file, output_file)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_extract, video_file, output_file) for video_file, output_file in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def output_path(video_file: str, output_dir: str, extension: str = ".mp3") -> str:
+    """Returns the output path for `video_file` inside `output_dir`, replacing its extension.
+
+    Args:
+        video_file (str): The path of the source file.
+        output_dir (str): The folder where the output is stored.
+        extension (str): The extension of the output file.
+
+    Returns:
+        str: The output file path.
+    """
+    return os.path.join(output_dir, Path(video_file).stem + extension)
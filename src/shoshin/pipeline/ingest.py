@@ -0,0 +1,315 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from haystack.schema import Document
+
+from ..datastore.documents import DocumentStore, EmbeddingsReport
+from ..exceptions import ShoshinException
+from . import batch, processors
+from .journal import EXTRACTED, TRANSCRIBED, Journal, embedded_stage, fingerprint
+
+# Ingest stages, in pipeline order
+EXTRACT = "extract"
+TRANSCRIBE = "transcribe"
+EMBED = "embed"
+
+# Marks the end of the items of a queue
+_END = object()
+
+# How often blocked workers check if the pipeline was cancelled, in seconds
+_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class StageProgress:
+    """The progress of an ingest stage.
+
+    Attributes:
+        name (str): The stage name.
+        completed (int): Items processed by the stage.
+        skipped (int): Items already processed by a previous run.
+        failed (int): Items that failed, and are not handed to the next stages.
+        busy (float): The time spent by the stage workers on items, in seconds.
+    """
+
+    name: str
+    completed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    busy: float = 0.0
+
+
+@dataclass
+class IngestReport:
+    """The outcome of an ingest run.
+
+    Attributes:
+        stages (Dict[str, StageProgress]): The progress of each stage, by name.
+        embeddings (EmbeddingsReport): How many documents were skipped, embedded and deleted.
+        elapsed (float): The wall-clock time of the run, in seconds.
+    """
+
+    stages: Dict[str, StageProgress] = field(default_factory=dict)
+    embeddings: EmbeddingsReport = field(default_factory=EmbeddingsReport)
+    elapsed: float = 0.0
+
+
+@dataclass
+class Lesson:
+    """The files generated for a video while it moves through the ingest stages.
+
+    Attributes:
+        video (str): The path of the source video file.
+        audio (str): The path of the extracted MP3 file.
+        transcription (str): The path of the transcription text file.
+    """
+
+    video: str
+    audio: str
+    transcription: str
+
+
+ProgressCallback = Callable[[StageProgress, str, Optional[str]], None]
+
+
+def _get(items: queue.Queue, cancelled: threading.Event):
+    while not cancelled.is_set():
+        try:
+            return items.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def _put(items: queue.Queue, item, cancelled: threading.Event) -> None:
+    while not cancelled.is_set():
+        try:
+            items.put(item, timeout=_POLL_INTERVAL)
+            return
+        except queue.Full:
+            continue
+
+
+class _Stage:
+    """A pool of threads that runs `func` on each lesson of `inbox`, and hands it to `outbox` if it succeeds.
+
+    `func` returns True if the lesson was skipped. Errors raised by Shoshin (e.g. a broken video) fail
+    only the current lesson, while unexpected errors cancel the whole pipeline.
+    """
+
+    def __init__(
+        self,
+        progress: StageProgress,
+        func: Callable[[Lesson], bool],
+        workers: int,
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        cancelled: threading.Event,
+        record: Callable[..., None],
+    ) -> None:
+        self.progress = progress
+        self.error: Optional[BaseException] = None
+        self._func = func
+        self._inbox = inbox
+        self._outbox = outbox
+        self._cancelled = cancelled
+        self._record = record
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ingest-{progress.name}-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        self._running = len(self._threads)
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self) -> None:
+        try:
+            while True:
+                lesson = _get(self._inbox, self._cancelled)
+                if lesson is _END:
+                    # Let the other workers of the stage see the end of the items too
+                    _put(self._inbox, _END, self._cancelled)
+                    break
+                self._process(lesson)
+        except BaseException as e:
+            self.error = e
+            self._cancelled.set()
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                _put(self._outbox, _END, self._cancelled)
+
+    def _process(self, lesson: Lesson) -> None:
+        start = time.perf_counter()
+        try:
+            skipped = self._func(lesson)
+        except ShoshinException as e:
+            self._record(self.progress, lesson.video, time.perf_counter() - start, error=str(e))
+            return
+        self._record(self.progress, lesson.video, time.perf_counter() - start, skipped=skipped)
+        _put(self._outbox, lesson, self._cancelled)
+
+
+def ingest(
+    video_files: Sequence[str],
+    output_dir: str,
+    document_store: DocumentStore,
+    language: str,
+    extract_workers: Optional[int] = None,
+    transcribe_workers: int = 2,
+    preprocess_workers: int = 1,
+    queue_size: int = 4,
+    incremental: bool = False,
+    journal: Optional[Journal] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> IngestReport:
+    """Extracts, transcribes and embeds video files into the Document Store, running all stages at once.
+
+    Stages are connected by queues holding at most `queue_size` lessons, and each stage has its own
+    workers: `ffmpeg` extractions use the CPU, while transcriptions wait for the OpenAI API. Transcriptions
+    are then preprocessed and written to the store with their embeddings through
+    `DocumentStore.write_embeddings`, which embeds a batch while the previous one is written. So the first
+    lessons are embedded while the last ones are still being extracted, and no resource waits for a whole
+    stage to complete.
+
+    Audio files are stored in `<output_dir>/audio` and transcriptions in `<output_dir>/transcriptions`. Up to
+    date outputs are not generated again, unless the journal shows that their stage was interrupted. A video
+    that fails to extract or to transcribe is reported and dropped, without stopping the other lessons.
+
+    Args:
+        video_files (Sequence[str]): The video files to ingest.
+        output_dir (str): The folder where audio files and transcriptions are stored.
+        document_store (DocumentStore): The store where transcriptions are embedded, tagged with its course.
+        language (str): The language of the transcriptions, used for preprocessing.
+        extract_workers (int, optional): The number of concurrent `ffmpeg` processes. Defaults to the number of CPUs.
+        transcribe_workers (int): The number of audio files transcribed at once. Each file is split in chunks
+                                  transcribed with settings TRANSCRIPTION_WORKERS concurrent requests.
+        preprocess_workers (int): The number of preprocessing processes (see `clean_documents_stream`).
+        queue_size (int): The maximum number of lessons waiting between two stages.
+        incremental (bool): If True, embed only documents that are not already stored with an embedding.
+        journal (Journal, optional): The journal where completed stages are recorded.
+        on_progress (Callable[[StageProgress, str, Optional[str]], None], optional): Called with the stage
+            progress, the video file and the error message (if any) each time a stage completes a lesson.
+
+    Raises:
+        AIError: If the OpenAI API request fails while embedding documents.
+
+    Returns:
+        IngestReport: The progress of each stage and the embeddings report.
+    """
+    start = time.perf_counter()
+    audio_dir = os.path.join(output_dir, "audio")
+    transcriptions_dir = os.path.join(output_dir, "transcriptions")
+    os.makedirs(audio_dir, exist_ok=True)
+    os.makedirs(transcriptions_dir, exist_ok=True)
+
+    report = IngestReport(stages={name: StageProgress(name) for name in (EXTRACT, TRANSCRIBE, EMBED)})
+    lock = threading.Lock()
+
+    def record(progress: StageProgress, item: str, busy: float, skipped: bool = False, error: Optional[str] = None):
+        with lock:
+            progress.busy += busy
+            if error is not None:
+                progress.failed += 1
+            elif skipped:
+                progress.skipped += 1
+            else:
+                progress.completed += 1
+            if on_progress is not None:
+                on_progress(progress, item, error)
+
+    def extract(lesson: Lesson) -> bool:
+        if batch.is_completed(lesson.video, lesson.audio, EXTRACTED, journal):
+            return True
+        if journal is not None:
+            journal.start(lesson.video, EXTRACTED)
+        processors.extract_audio_from_video(lesson.video, lesson.audio)
+        if journal is not None:
+            journal.mark_done(lesson.video, EXTRACTED, fingerprint(lesson.video))
+        return False
+
+    def transcribe(lesson: Lesson) -> bool:
+        if batch.is_completed(lesson.audio, lesson.transcription, TRANSCRIBED, journal):
+            return True
+        if journal is not None:
+            journal.start(lesson.audio, TRANSCRIBED)
+        processors.transcribe_speech_to_text(lesson.audio, lesson.transcription)
+        if journal is not None:
+            journal.mark_done(lesson.audio, TRANSCRIBED, fingerprint(lesson.audio))
+        return False
+
+    lessons = [
+        Lesson(
+            video,
+            batch.output_path(video, audio_dir),
+            batch.output_path(video, transcriptions_dir, extension=".txt"),
+        )
+        for video in video_files
+    ]
+    videos: queue.Queue = queue.Queue()
+    for lesson in lessons:
+        videos.put(lesson)
+    videos.put(_END)
+    audio: queue.Queue = queue.Queue(maxsize=queue_size)
+    transcriptions: queue.Queue = queue.Queue(maxsize=queue_size)
+    cancelled = threading.Event()
+    stages = [
+        _Stage(
+            report.stages[EXTRACT], extract, extract_workers or os.cpu_count() or 1, videos, audio, cancelled, record
+        ),
+        _Stage(report.stages[TRANSCRIBE], transcribe, transcribe_workers, audio, transcriptions, cancelled, record),
+    ]
+
+    # Transcriptions are embedded once, and recorded in the journal when their batch is written
+    stage = embedded_stage(document_store.index)
+    embedding: Dict[str, Lesson] = {}
+
+    def transcribed() -> Iterator[Document]:
+        while True:
+            lesson = _get(transcriptions, cancelled)
+            if lesson is _END:
+                return
+            if journal is not None and journal.is_done(lesson.transcription, stage, fingerprint(lesson.transcription)):
+                record(report.stages[EMBED], lesson.video, 0.0, skipped=True)
+                continue
+            embedding[str(Path(lesson.transcription))] = lesson
+            yield from processors.read_transcriptions([Path(lesson.transcription)], course=document_store.course)
+
+    def on_batch(documents: List[Document]) -> None:
+        for path in {doc.meta.get("path") for doc in documents}:
+            lesson = embedding.pop(path, None)
+            if lesson is None:
+                continue
+            if journal is not None:
+                journal.mark_done(lesson.transcription, stage, fingerprint(lesson.transcription))
+            record(report.stages[EMBED], lesson.video, 0.0)
+
+    for worker in stages:
+        worker.start()
+    try:
+        batches = processors.clean_documents_stream(transcribed(), language, workers=preprocess_workers)
+        report.embeddings = document_store.write_embeddings(batches, incremental=incremental, on_batch=on_batch)
+    finally:
+        cancelled.set()
+        for worker in stages:
+            worker.join()
+
+    for worker in stages:
+        if worker.error is not None:
+            raise worker.error
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+JOURNAL_FILE = ".shoshin-journal.db"
+
+# Ingest stages recorded in the journal
+EXTRACTED = "extracted"
+TRANSCRIBED = "transcribed"
+EMBEDDED = "embedded"
+
+_STARTED = "started"
+_DONE = "done"
+
+
+def embedded_stage(index: str) -> str:
+    """Returns the stage recording the files embedded into a Document Store index."""
+    return f"{EMBEDDED}:{index}"
+
+
+def fingerprint(path: str) -> str:
+    """Returns the fingerprint of a file, which changes when the file is modified."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Journal:
+    """A durable record of the ingest stages completed for each item, stored in a SQLite file.
+
+    Each completed stage of an item (e.g. a lesson video extracted to audio) is committed as soon as it
+    completes, together with the fingerprint of the item source. Re-running an interrupted command
+    skips items whose stage was already completed, unless their source has changed since. Stages can
+    also be marked as started, to detect outputs left behind by an interrupted run.
+
+    The journal can be shared by threads of the same process.
+
+    Attributes:
+        path (str): The SQLite file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Creates a `Journal` instance, creating the SQLite file if it doesn't exist.
+
+        Args:
+            path (str): The SQLite file.
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "item TEXT NOT NULL, stage TEXT NOT NULL, status TEXT NOT NULL, fingerprint TEXT, "
+                "updated_at REAL NOT NULL, "
+                "PRIMARY KEY (item, stage))"
+            )
+
+    @classmethod
+    def for_folder(cls, folder: str) -> "Journal":
+        """Opens the journal stored in `folder`, next to the outputs of a command."""
+        return cls(os.path.join(folder, JOURNAL_FILE))
+
+    def is_done(self, item: str, stage: str, fingerprint: Optional[str] = None) -> bool:
+        """Checks if a stage was completed for an item.
+
+        Args:
+            item (str): The item, e.g. a file path.
+            stage (str): The stage.
+            fingerprint (str, optional): The current fingerprint of the item source. If set, the stage is
+                                         considered completed only if it was recorded with the same fingerprint.
+
+        Returns:
+            bool: True if the stage was completed.
+        """
+        status, recorded_fingerprint = self._get(item, stage)
+        return status == _DONE and (fingerprint is None or recorded_fingerprint == fingerprint)
+
+    def is_interrupted(self, item: str, stage: str) -> bool:
+        """Checks if a stage was started for an item, but never completed."""
+        status, _ = self._get(item, stage)
+        return status == _STARTED
+
+    def _get(self, item: str, stage: str) -> Tuple[Optional[str], Optional[str]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, fingerprint FROM items WHERE item = ? AND stage = ?", (item, stage)
+            ).fetchone()
+        return row if row is not None else (None, None)
+
+    def _set(self, item: str, stage: str, status: str, fingerprint: Optional[str]) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO items (item, stage, status, fingerprint, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (item, stage, status, fingerprint, time.time()),
+            )
+
+    def start(self, item: str, stage: str) -> None:
+        """Records that a stage was started for an item. The record is committed immediately.
+
+        Args:
+            item (str): The item, e.g. a file path.
+            stage (str): The stage.
+        """
+        self._set(item, stage, _STARTED, None)
+
+    def mark_done(self, item: str, stage: str, fingerprint: Optional[str] = None) -> None:
+        """Records that a stage was completed for an item. The record is committed immediately.
+
+        Args:
+            item (str): The item, e.g. a file path.
+            stage (str): The stage.
+            fingerprint (str, optional): The fingerprint of the item source.
+        """
+        self._set(item, stage, _DONE, fingerprint)
+
+    def reset(self, stage: Optional[str] = None) -> int:
+        """Forgets completed stages, so that the next run processes all items again.
+
+        Args:
+            stage (str, optional): The stage to forget. If None, all stages are forgotten.
+
+        Returns:
+            int: The number of records removed.
+        """
+        with self._lock, self._db:
+            if stage is None:
+                return self._db.execute("DELETE FROM items").rowcount
+            return self._db.execute("DELETE FROM items WHERE stage = ?", (stage,)).rowcount
+
+    def count(self, stage: str) -> int:
+        """Returns the number of items that completed a stage."""
+        with self._lock:
+            query = "SELECT COUNT(*) FROM items WHERE stage = ? AND status = ?"
+            return self._db.execute(query, (stage, _DONE)).fetchone()[0]
+
+    def close(self) -> None:
+        """Closes the SQLite connection."""
+        self._db.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
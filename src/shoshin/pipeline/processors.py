@@ -1,27 +1,55 @@
-from typing import List
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+import re
+import tempfile
+import threading
+import wave
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import ffmpeg
-import openai
+import numpy as np
 from ffmpeg import Error
-from haystack.nodes import PreProcessor
-from haystack.schema import Document
-from openai.error import OpenAIError
 
+from ..cache.transcriptions import TranscriptionCache
 from ..conf import constants as c
+from ..conf import settings as s
 from ..exceptions import AIError, AudioExtractionError
+from ..metrics import metrics
+
+if TYPE_CHECKING:
+    import aiohttp
+    from haystack.nodes import PreProcessor
+    from haystack.schema import Document
+
+# NOTE: Haystack and OpenAI are imported by the functions using them, as they take seconds to load
+# and extracting audio (e.g. `shoshin convert`) doesn't need them
 
 
 def extract_audio_from_video(video_file: str, output_file: str) -> None:
     """Extracts the audio from a video file and saves it as an MP3 file. Audio is
     downsampled to 16kHz as it is only used for speech recognition.
 
-    TODO: use `pydub` to split on silence if lenght is > 25MB (Whisper API limit)
-
-    NOTE: While this function currently takes file input and output paths, its future
-    iteration will handle input and output streams. This modification will facilitate
-    its integration into a processing pipeline where messages are read, processed, and
-    passed along. For now, due to the absence of a pipeline system, we're using file
-    paths for simplicity.
+    NOTE: This function writes the whole audio track to disk. Use `stream_audio_from_video`
+    to read audio chunks from an `ffmpeg` pipe while the extraction is still running.
 
     Args:
         video_file (str): The path to the input video file.
@@ -36,45 +64,518 @@ def extract_audio_from_video(video_file: str, output_file: str) -> None:
     try:
         stream = ffmpeg.input(video_file)
         stream = ffmpeg.output(stream.audio, output_file, format="mp3", ar=c.AUDIO_SAMPLE_RATE)
-        ffmpeg.run(stream, overwrite_output=True)
+        with metrics.span("extract_audio"):
+            ffmpeg.run(stream, overwrite_output=True)
+    except Error as e:
+        raise AudioExtractionError(e)
+
+
+@dataclass
+class AudioChunk:
+    """A piece of an audio file that fits the speech recognition API limits.
+
+    Attributes:
+        path (str): The path of the audio file containing the chunk.
+        offset (float): The start time of the chunk in the original audio, in seconds.
+    """
+
+    path: str
+    offset: float = 0.0
+
+
+@dataclass
+class TranscriptSegment:
+    """The transcription of an audio chunk.
+
+    Attributes:
+        offset (float): The start time of the transcribed audio in the original file, in seconds.
+        text (str): The transcribed text.
+    """
+
+    offset: float
+    text: str
+
+
+_SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+
+# Keep chunks below the API limit even if the bitrate is not constant along the file
+_CHUNK_SIZE_MARGIN = 0.9
+
+# Streamed audio is 16-bit PCM, analyzed in 100ms windows to find silences
+_SAMPLE_WIDTH = 2
+_SILENCE_WINDOW = 0.1
+
+
+def detect_silences(audio_file: str) -> List[Tuple[float, float]]:
+    """Finds silent intervals in an audio file using the `ffmpeg` `silencedetect` filter.
+
+    Args:
+        audio_file (str): The path to the input audio file.
+
+    Raises:
+        AudioExtractionError: If an error occurs while analyzing the audio.
+
+    Returns:
+        List[Tuple[float, float]]: The (start, end) time of each silence, in seconds.
+    """
+    try:
+        stream = ffmpeg.input(audio_file)
+        stream = stream.filter("silencedetect", noise=f"{c.SILENCE_THRESHOLD_DB}dB", d=c.SILENCE_MIN_DURATION)
+        stream = ffmpeg.output(stream, "-", format="null")
+        _, stderr = ffmpeg.run(stream, capture_stderr=True)
+    except Error as e:
+        raise AudioExtractionError(e)
+
+    log = stderr.decode("utf-8", errors="ignore")
+    starts = [float(x) for x in _SILENCE_START.findall(log)]
+    ends = [float(x) for x in _SILENCE_END.findall(log)]
+    return list(zip(starts, ends))
+
+
+def plan_chunks(
+    duration: float, silences: Sequence[Tuple[float, float]], max_duration: float
+) -> List[Tuple[float, float]]:
+    """Splits an audio track in intervals not longer than `max_duration`, cutting in the middle of silences.
+
+    When no silence is found in the second half of an interval, the audio is cut at `max_duration`
+    so that a chunk never goes over the limit.
+
+    Args:
+        duration (float): The duration of the audio track, in seconds.
+        silences (Sequence[Tuple[float, float]]): The (start, end) time of each silence, in seconds.
+        max_duration (float): The maximum duration of a chunk, in seconds.
+
+    Returns:
+        List[Tuple[float, float]]: The (start, end) time of each chunk, in seconds.
+    """
+    cut_points = sorted((start + end) / 2 for start, end in silences)
+    chunks = []
+    start = 0.0
+    while duration - start > max_duration:
+        limit = start + max_duration
+        candidates = [cut for cut in cut_points if start + max_duration / 2 < cut <= limit]
+        end = candidates[-1] if candidates else limit
+        chunks.append((start, end))
+        start = end
+    chunks.append((start, duration))
+    return chunks
+
+
+def split_audio_on_silence(
+    audio_file: str, output_dir: str, max_size: int = c.SPEECH_TO_TEXT_MAX_FILE_SIZE
+) -> List[AudioChunk]:
+    """Splits an audio file on silence in chunks smaller than `max_size`.
+
+    Files that are already smaller than `max_size` are not split, and the original file is returned
+    as the only chunk. Chunks are copied without re-encoding into `output_dir`.
+
+    Args:
+        audio_file (str): The path to the input audio file.
+        output_dir (str): The folder where chunks are stored.
+        max_size (int): The maximum size of a chunk, in bytes.
+
+    Raises:
+        AudioExtractionError: If an error occurs while splitting the audio.
+
+    Returns:
+        List[AudioChunk]: The chunks, in playback order.
+    """
+    size = os.path.getsize(audio_file)
+    if size <= max_size:
+        return [AudioChunk(audio_file)]
+
+    try:
+        duration = float(ffmpeg.probe(audio_file)["format"]["duration"])
     except Error as e:
         raise AudioExtractionError(e)
 
+    max_duration = duration * max_size * _CHUNK_SIZE_MARGIN / size
+    spans = plan_chunks(duration, detect_silences(audio_file), max_duration)
 
-def transcribe_speech_to_text(audio_file: str, output_file: str) -> None:
+    chunks = []
+    stem, ext = os.path.splitext(Path(audio_file).name)
+    for i, (start, end) in enumerate(spans):
+        chunk_file = os.path.join(output_dir, f"{stem}.{i:04d}{ext}")
+        try:
+            stream = ffmpeg.input(audio_file, ss=start, t=end - start)
+            stream = ffmpeg.output(stream, chunk_file, acodec="copy")
+            ffmpeg.run(stream, overwrite_output=True, quiet=True)
+        except Error as e:
+            raise AudioExtractionError(e)
+        chunks.append(AudioChunk(chunk_file, start))
+    return chunks
+
+
+def _get_transcription_cache() -> Optional[TranscriptionCache]:
+    return TranscriptionCache() if s.TRANSCRIPTION_CACHE else None
+
+
+def _request_transcription(stream: BinaryIO) -> dict:
+    import openai
+
+    metrics.increment("openai.transcriptions.requests")
+    with metrics.span("transcription_request"):
+        return openai.Audio.transcribe(
+            c.SPEECH_TO_TEXT_MODEL, stream, api_key=s.OPENAI_API_KEY, api_base=s.OPENAI_API_BASE
+        )
+
+
+async def _arequest_transcription(stream: BinaryIO, session: aiohttp.ClientSession) -> dict:
+    import openai
+
+    from ..aio import openai_session
+
+    metrics.increment("openai.transcriptions.requests")
+    with metrics.span("transcription_request"), openai_session(session):
+        return await openai.Audio.atranscribe(
+            c.SPEECH_TO_TEXT_MODEL, stream, api_key=s.OPENAI_API_KEY, api_base=s.OPENAI_API_BASE
+        )
+
+
+def _cached_transcription(stream: BinaryIO, cache: TranscriptionCache) -> Tuple[str, Optional[str]]:
+    """Returns the cache key of the audio, and its cached transcription if any."""
+    # Unchanged audio is never sent twice to the API
+    key = cache.key(stream, c.SPEECH_TO_TEXT_MODEL)
+    item = cache.get(key)
+    metrics.increment("transcription_cache.hits" if item is not None else "transcription_cache.misses")
+    return key, item["text"] if item is not None else None
+
+
+def _transcribe(stream: BinaryIO, offset: float, cache: Optional[TranscriptionCache] = None) -> TranscriptSegment:
+    if cache is None:
+        response = _request_transcription(stream)
+        return TranscriptSegment(offset, response["text"])
+
+    key, text = _cached_transcription(stream, cache)
+    if text is not None:
+        return TranscriptSegment(offset, text)
+
+    response = _request_transcription(stream)
+    cache.set(key, response["text"], model=c.SPEECH_TO_TEXT_MODEL, source=getattr(stream, "name", None))
+    return TranscriptSegment(offset, response["text"])
+
+
+async def _atranscribe_chunk(
+    chunk: AudioChunk, cache: Optional[TranscriptionCache], session: aiohttp.ClientSession
+) -> TranscriptSegment:
+    from ..aio import run_blocking
+
+    stream = io.BytesIO(await run_blocking(Path(chunk.path).read_bytes))
+    stream.name = chunk.path
+    key, text = await run_blocking(_cached_transcription, stream, cache) if cache is not None else (None, None)
+    if text is not None:
+        return TranscriptSegment(chunk.offset, text)
+
+    response = await _arequest_transcription(stream, session)
+    if cache is not None:
+        await run_blocking(cache.set, key, response["text"], model=c.SPEECH_TO_TEXT_MODEL, source=chunk.path)
+    return TranscriptSegment(chunk.offset, response["text"])
+
+
+def _transcribe_chunk(chunk: AudioChunk, cache: Optional[TranscriptionCache] = None) -> TranscriptSegment:
+    with open(chunk.path, "rb") as stream:
+        return _transcribe(stream, chunk.offset, cache)
+
+
+def transcribe_chunks(chunks: Sequence[AudioChunk], workers: Optional[int] = None) -> List[TranscriptSegment]:
+    """Transcribes audio chunks concurrently, with at most `workers` requests in flight.
+
+    Args:
+        chunks (Sequence[AudioChunk]): The audio chunks to transcribe.
+        workers (int, optional): The maximum number of concurrent requests. Defaults to settings
+                                 TRANSCRIPTION_WORKERS.
+
+    Raises:
+        AIError: If the OpenAI API request fails for any reason.
+
+    Returns:
+        List[TranscriptSegment]: The transcription of each chunk, in the same order as `chunks`.
+    """
+    from openai.error import OpenAIError
+
+    workers = workers or s.TRANSCRIPTION_WORKERS
+    cache = _get_transcription_cache()
+    try:
+        if len(chunks) == 1:
+            return [_transcribe_chunk(chunks[0], cache)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(partial(_transcribe_chunk, cache=cache), chunks))
+    except OpenAIError as e:
+        # Catch-all for OpenAI errors. This is a temporary solution until we
+        # implement different error handlers for different types of errors.
+        # Tests are covering all possible OpenAI errors.
+        raise AIError(e)
+
+
+async def atranscribe_chunks(
+    chunks: Sequence[AudioChunk], workers: Optional[int] = None, session: Optional[aiohttp.ClientSession] = None
+) -> List[TranscriptSegment]:
+    """Transcribes audio chunks like `transcribe_chunks`, sending requests from the event loop.
+
+    Args:
+        chunks (Sequence[AudioChunk]): The audio chunks to transcribe.
+        workers (int, optional): The maximum number of concurrent requests. Defaults to settings
+                                 TRANSCRIPTION_WORKERS.
+        session (aiohttp.ClientSession, optional): The session used to send requests. Defaults to a
+                                                   session for this call.
+
+    Raises:
+        AIError: If the OpenAI API request fails for any reason.
+
+    Returns:
+        List[TranscriptSegment]: The transcription of each chunk, in the same order as `chunks`.
+    """
+    from openai.error import OpenAIError
+
+    from ..aio import client_session
+
+    if session is None:
+        async with client_session() as session:
+            return await atranscribe_chunks(chunks, workers, session)
+
+    slots = asyncio.Semaphore(workers or s.TRANSCRIPTION_WORKERS)
+    cache = _get_transcription_cache()
+
+    async def transcribe(chunk: AudioChunk) -> TranscriptSegment:
+        async with slots:
+            return await _atranscribe_chunk(chunk, cache, session)
+
+    try:
+        return list(await asyncio.gather(*(transcribe(chunk) for chunk in chunks)))
+    except OpenAIError as e:
+        raise AIError(e)
+
+
+def transcribe_speech_to_text(
+    audio_file: str, output_file: str, workers: Optional[int] = None
+) -> List[TranscriptSegment]:
     """Transcribes speech from an audio file using the OpenAI Whisper model.
 
-    NOTE: While this function currently takes file input and output paths, its future
-    iteration will handle input and output streams. This modification will facilitate
-    its integration into a processing pipeline where messages are read, processed, and
-    passed along. For now, due to the absence of a pipeline system, we're using file
-    paths for simplicity.
+    Audio files bigger than the Whisper API limit are split on silence, and chunks are
+    transcribed concurrently. The transcription is saved as plain text, joining chunks
+    in playback order. Unless settings TRANSCRIPTION_CACHE is disabled, chunks already
+    transcribed in previous runs are read from the `TranscriptionCache`.
+
+    NOTE: This function reads the audio from a file. Use `transcribe_video_stream` to transcribe
+    a video without writing the intermediate MP3 file, while the audio is being extracted.
 
     Args:
         audio_file (str): The path to the input audio file.
         output_file (str): The path to save the output text file.
+        workers (int, optional): The maximum number of concurrent requests. Defaults to settings
+                                 TRANSCRIPTION_WORKERS.
 
     Raises:
         AIError: If the OpenAI API request fails for any reason.
+        AudioExtractionError: If an error occurs while splitting the audio.
 
     Returns:
-        None
+        List[TranscriptSegment]: The transcription of each chunk, with its offset in the original audio.
+    """
+    with metrics.span("transcribe"), tempfile.TemporaryDirectory() as tmp_dir:
+        with metrics.span("split_audio"):
+            chunks = split_audio_on_silence(audio_file, tmp_dir)
+        segments = transcribe_chunks(chunks, workers)
+
+    # Save the transcription to a file
+    with open(output_file, "w") as f:
+        f.write(" ".join(segment.text.strip() for segment in segments))
+    return segments
+
+
+async def atranscribe_speech_to_text(
+    audio_file: str,
+    output_file: str,
+    workers: Optional[int] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> List[TranscriptSegment]:
+    """Transcribes speech from an audio file like `transcribe_speech_to_text`, without blocking the event loop.
+
+    Audio is split by `ffmpeg` in the default executor, then chunks are transcribed with at most `workers`
+    requests in flight, sent through the `aiohttp` session (see `aio.client_session`).
+
+    Args:
+        audio_file (str): The path to the input audio file.
+        output_file (str): The path to save the output text file.
+        workers (int, optional): The maximum number of concurrent requests. Defaults to settings
+                                 TRANSCRIPTION_WORKERS.
+        session (aiohttp.ClientSession, optional): The session used to send requests. Defaults to a
+                                                   session for this call.
+
+    Raises:
+        AIError: If the OpenAI API request fails for any reason.
+        AudioExtractionError: If an error occurs while splitting the audio.
+
+    Returns:
+        List[TranscriptSegment]: The transcription of each chunk, with its offset in the original audio.
+    """
+    from ..aio import run_blocking
+
+    with metrics.span("transcribe"), tempfile.TemporaryDirectory() as tmp_dir:
+        with metrics.span("split_audio"):
+            chunks = await run_blocking(split_audio_on_silence, audio_file, tmp_dir)
+        segments = await atranscribe_chunks(chunks, workers, session)
+
+    # Save the transcription to a file
+    with open(output_file, "w") as f:
+        f.write(" ".join(segment.text.strip() for segment in segments))
+    return segments
+
+
+def _find_quiet_point(samples: np.ndarray, window: int) -> int:
+    """Returns the sample index at the center of the quietest `window` in `samples`."""
+    count = len(samples) // window
+    if count == 0:
+        return len(samples)
+    frames = samples[: count * window].astype(np.float32).reshape(count, window)
+    energy = np.sqrt(np.mean(frames**2, axis=1))
+    # Prefer the latest quiet frame to keep chunks as long as possible
+    quietest = count - 1 - int(np.argmin(energy[::-1]))
+    return quietest * window + window // 2
+
+
+def _to_wav(samples: np.ndarray, name: str) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(_SAMPLE_WIDTH)
+        wav.setframerate(c.AUDIO_SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    buffer.seek(0)
+    # The OpenAI client uses the file name to detect the audio format
+    buffer.name = name
+    return buffer
+
+
+def stream_audio_from_video(
+    video_file: str, chunk_duration: float = c.STREAM_CHUNK_DURATION, read_size: int = 64 * 1024
+) -> Iterator[Tuple[float, io.BytesIO]]:
+    """Extracts the audio from a video file through an `ffmpeg` pipe, yielding WAV chunks as soon as they are ready.
+
+    Audio is decoded to 16kHz mono PCM, so no intermediate file is written to disk. Each chunk is at most
+    `chunk_duration` seconds long and is cut at the quietest point of its last `STREAM_SILENCE_SEARCH`
+    seconds, to avoid cutting words in half.
+
+    Args:
+        video_file (str): The path to the input video file.
+        chunk_duration (float): The maximum duration of a chunk, in seconds.
+        read_size (int): The number of bytes read from the pipe at once.
+
+    Raises:
+        AudioExtractionError: If `ffmpeg` fails while extracting the audio.
+
+    Yields:
+        Tuple[float, io.BytesIO]: The offset of the chunk in seconds, and the chunk as an in-memory WAV file.
     """
+    max_samples = int(chunk_duration * c.AUDIO_SAMPLE_RATE)
+    search_samples = min(int(c.STREAM_SILENCE_SEARCH * c.AUDIO_SAMPLE_RATE), max_samples // 2)
+    window = int(_SILENCE_WINDOW * c.AUDIO_SAMPLE_RATE)
+    name = Path(video_file).stem
+
+    stream = ffmpeg.input(video_file)
+    stream = ffmpeg.output(stream.audio, "pipe:", format="s16le", acodec="pcm_s16le", ac=1, ar=c.AUDIO_SAMPLE_RATE)
+    process = ffmpeg.run_async(stream, pipe_stdout=True, pipe_stderr=True)
+
+    # Drain stderr in the background, so that `ffmpeg` never blocks on a full pipe
+    stderr = []
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    reader.start()
+
+    offset = 0
+    buffer = bytearray()
+    index = 0
     try:
-        # Transcribe
-        with open(audio_file, "rb") as stream:
-            response = openai.Audio.transcribe("whisper-1", stream)
+        while True:
+            data = process.stdout.read(read_size)
+            if data:
+                buffer.extend(data)
+            else:
+                # Drop incomplete samples of a truncated stream
+                truncated = len(buffer) % _SAMPLE_WIDTH
+                if truncated:
+                    del buffer[-truncated:]
+            while len(buffer) >= max_samples * _SAMPLE_WIDTH or (not data and buffer):
+                samples = np.frombuffer(bytes(buffer[: max_samples * _SAMPLE_WIDTH]), dtype=np.int16)
+                cut = len(samples)
+                if data and len(samples) == max_samples:
+                    start = len(samples) - search_samples
+                    cut = start + _find_quiet_point(samples[start:], window)
+                yield offset / c.AUDIO_SAMPLE_RATE, _to_wav(samples[:cut], f"{name}.{index:04d}.wav")
+                del buffer[: cut * _SAMPLE_WIDTH]
+                offset += cut
+                index += 1
+            if not data:
+                break
+    finally:
+        process.stdout.close()
+        process.wait()
+        reader.join()
+
+    if process.returncode != 0:
+        raise AudioExtractionError(Error("ffmpeg", None, b"".join(stderr)))
+
 
-        # Save the transcription to a file
-        with open(output_file, "w") as f:
-            f.write(response["text"])
+def transcribe_video_stream(
+    video_file: str, output_file: str, workers: Optional[int] = None
+) -> List[TranscriptSegment]:
+    """Transcribes the speech of a video file while its audio is being extracted.
+
+    Audio chunks are read from an `ffmpeg` pipe and submitted to the OpenAI Whisper model as soon as they
+    are available, with at most `workers` concurrent requests. No intermediate audio file is written to disk.
+
+    Args:
+        video_file (str): The path to the input video file.
+        output_file (str): The path to save the output text file.
+        workers (int, optional): The maximum number of concurrent requests. Defaults to settings
+                                 TRANSCRIPTION_WORKERS.
+
+    Raises:
+        AIError: If the OpenAI API request fails for any reason.
+        AudioExtractionError: If `ffmpeg` fails while extracting the audio.
+
+    Returns:
+        List[TranscriptSegment]: The transcription of each chunk, with its offset in the original audio.
+    """
+    from openai.error import OpenAIError
+
+    workers = workers or s.TRANSCRIPTION_WORKERS
+    cache = _get_transcription_cache()
+    segments = []
+    try:
+        with metrics.span("transcribe"), ThreadPoolExecutor(max_workers=workers) as executor:
+            pending: Deque[Future[TranscriptSegment]] = deque()
+            for offset, chunk in stream_audio_from_video(video_file):
+                # Bound the number of chunks kept in memory while requests are in flight
+                if len(pending) >= workers:
+                    segments.append(pending.popleft().result())
+                pending.append(executor.submit(_transcribe, chunk, offset, cache))
+            segments.extend(future.result() for future in pending)
     except OpenAIError as e:
         # Catch-all for OpenAI errors. This is a temporary solution until we
         # implement different error handlers for different types of errors.
         # Tests are covering all possible OpenAI errors.
         raise AIError(e)
-    except FileNotFoundError as e:
-        raise e
+
+    # Save the transcription to a file
+    with open(output_file, "w") as f:
+        f.write(" ".join(segment.text.strip() for segment in segments))
+    return segments
+
+
+def _build_preprocessor(language: str, progress_bar: bool = False) -> PreProcessor:
+    from haystack.nodes import PreProcessor
+
+    return PreProcessor(
+        language=language,
+        clean_empty_lines=True,
+        clean_whitespace=True,
+        clean_header_footer=False,
+        progress_bar=progress_bar,
+        split_by="word",
+        split_length=c.PREPROCESSOR_SPLIT_LENGTH,
+        split_respect_sentence_boundary=True,
+    )
 
 
 def clean_documents(documents: List[Document], language: str, progress_bar: bool = False) -> List[Document]:
@@ -86,6 +587,9 @@ def clean_documents(documents: List[Document], language: str, progress_bar: bool
 
     Different languages can result in different word splits.
 
+    NOTE: This function processes all documents in memory on a single core. Use `clean_documents_stream`
+    to preprocess large folders in parallel with bounded memory.
+
     Args:
         documents (List[Document]): The documents that need to be preprocessed.
         language (str): The language used for preprocessing.
@@ -93,14 +597,118 @@ def clean_documents(documents: List[Document], language: str, progress_bar: bool
     Returns:
         List[Document]: A list of preprocessed documents.
     """
-    preprocessor = PreProcessor(
-        language=language,
-        clean_empty_lines=True,
-        clean_whitespace=True,
-        clean_header_footer=False,
-        progress_bar=progress_bar,
-        split_by="word",
-        split_length=c.PREPROCESSOR_SPLIT_LENGTH,
-        split_respect_sentence_boundary=True,
-    )
+    with metrics.span("clean_documents"):
+        return _build_preprocessor(language, progress_bar).process(documents)
+
+
+def find_transcriptions(folder: str) -> List[Path]:
+    """Finds the transcriptions (`.txt` files) of a folder and its subfolders.
+
+    Args:
+        folder (str): The transcriptions folder.
+
+    Returns:
+        List[Path]: The sorted list of transcription files.
+    """
+    return sorted(Path(folder).glob("**/*.txt"))
+
+
+def read_transcriptions(files: Iterable[Path], course: Optional[str] = None) -> Iterator[Document]:
+    """Lazily reads transcription files, one document per file.
+
+    Documents have the same `name` metadata set by Haystack `convert_files_to_docs`, but files are only
+    read when the next document is requested. They are also tagged with the `lesson` (the file name without
+    extension), the `path` of the file and, if given, the `course` they belong to. Preprocessing copies this
+    metadata to all chunks, so that searches can be filtered by course or lesson, and written chunks can be
+    traced back to their file.
+
+    Args:
+        files (Iterable[Path]): The transcription files, e.g. from `find_transcriptions`.
+        course (str, optional): The course of the transcriptions.
+
+    Yields:
+        Document: The transcription of a file.
+    """
+    from haystack.schema import Document
+
+    for path in files:
+        meta = {"name": Path(path).name, "lesson": Path(path).stem, "path": str(path)}
+        if course is not None:
+            meta["course"] = course
+        yield Document(content=Path(path).read_text(encoding="utf-8"), meta=meta)
+
+
+# Preprocessors are built once per worker process, and reused for all its tasks
+_PREPROCESSORS: Dict[str, PreProcessor] = {}
+
+
+def _clean_documents_task(documents: List[Document], language: str) -> List[Document]:
+    preprocessor = _PREPROCESSORS.get(language)
+    if preprocessor is None:
+        preprocessor = _PREPROCESSORS[language] = _build_preprocessor(language)
     return preprocessor.process(documents)
+
+
+def clean_documents_stream(
+    documents: Iterable[Document],
+    language: str,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    files_per_task: int = 8,
+) -> Iterator[List[Document]]:
+    """Preprocesses documents in a process pool, yielding their chunks in batches.
+
+    Documents are consumed lazily and sent to the workers in groups of `files_per_task`, with at most two
+    groups per worker in flight, so memory use doesn't depend on the number of documents. Chunks are
+    split like `clean_documents` does and yielded in the input order. Each batch holds the chunks of whole
+    documents: a document is never split across two batches.
+
+    Args:
+        documents (Iterable[Document]): The documents to preprocess, e.g. from `read_transcriptions`.
+        language (str): The language used for preprocessing.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs. With a
+                                 single worker, documents are preprocessed in the current process.
+        batch_size (int, optional): The minimum number of chunks of a batch. Defaults to settings
+                                    DOCUMENTS_BATCH_SIZE.
+        files_per_task (int): The number of documents sent to a worker at once.
+
+    Yields:
+        List[Document]: Batches of preprocessed chunks.
+    """
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or s.DOCUMENTS_BATCH_SIZE
+
+    def tasks() -> Iterator[List[Document]]:
+        task: List[Document] = []
+        for document in documents:
+            task.append(document)
+            if len(task) >= files_per_task:
+                yield task
+                task = []
+        if task:
+            yield task
+
+    def results() -> Iterator[List[Document]]:
+        if workers <= 1:
+            for task in tasks():
+                yield _clean_documents_task(task, language)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending: Deque[Future[List[Document]]] = deque()
+            for task in tasks():
+                # Bound the number of documents kept in memory while workers are busy
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(_clean_documents_task, task, language))
+            while pending:
+                yield pending.popleft().result()
+
+    batch: List[Document] = []
+    for chunks in results():
+        batch.extend(chunks)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
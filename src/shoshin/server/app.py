@@ -0,0 +1,145 @@
+import json
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from haystack.errors import OpenAIError
+
+from .. import ai
+from ..cache.answers import AnswerCache
+from ..conf import settings as s
+from ..datastore.documents import DocumentStore
+from ..exceptions import ShoshinException
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryService:
+    """
+    Answers questions with long-lived Shoshin components.
+
+    The `DocumentStore` (with its database connections and `EmbeddingRetriever`) and the generative QA
+    pipeline are built once and shared by all requests, so each question only pays for retrieval and
+    generation. The number of questions answered at the same time is bounded by `max_concurrency`.
+    Unless settings ANSWER_CACHE is disabled, answers of similar questions are reused through an `AnswerCache`.
+
+    Attributes:
+        document_store (DocumentStore): The document store used to retrieve documents.
+    """
+
+    def __init__(self, document_store: Optional[DocumentStore] = None, max_concurrency: Optional[int] = None) -> None:
+        """
+        Creates a `QueryService` instance, initializing the document store and the pipeline.
+
+        Args:
+            document_store (DocumentStore, optional): The document store. Defaults to a new `DocumentStore`.
+            max_concurrency (int, optional): The maximum number of questions answered at the same time.
+                                             Defaults to settings SERVER_MAX_CONCURRENCY.
+        """
+        self.document_store = document_store or DocumentStore()
+        self._pipeline = ai.build_pipeline(self.document_store.retriever)
+        self._slots = threading.BoundedSemaphore(max_concurrency or s.SERVER_MAX_CONCURRENCY)
+        self._cache = AnswerCache() if s.ANSWER_CACHE else None
+
+    def answer(self, question: str) -> Dict[str, Any]:
+        """Answers a question, waiting for a free slot if too many questions are in progress.
+
+        Args:
+            question (str): The question.
+
+        Returns:
+            Dict[str, Any]: The response payload, with the `answer`.
+        """
+        with self._slots:
+            retriever = self.document_store.retriever
+            return {"answer": ai.query(retriever, question, pipeline=self._pipeline, cache=self._cache)}
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of the query server.
+
+    Endpoints:
+        GET /health: Returns `{"status": "ok"}` when the server is ready.
+        GET /metrics: Returns the stage timings and counters of the process in the Prometheus text format.
+        POST /query: Answers the `question` of a JSON body, returning `{"answer": ...}`.
+    """
+
+    # Keep connections alive across questions of the same client
+    protocol_version = "HTTP/1.1"
+    server: "QueryServer"
+
+    def _send_json(self, status: HTTPStatus, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: HTTPStatus, text: str, content_type: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            self._send_text(HTTPStatus.OK, metrics.to_prometheus(), "text/plain; version=0.0.4")
+            return
+        if self.path != "/health":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint: {self.path}"})
+            return
+        self._send_json(HTTPStatus.OK, {"status": "ok"})
+
+    def do_POST(self) -> None:
+        if self.path != "/query":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            question = payload["question"]
+            if not isinstance(question, str) or not question.strip():
+                raise ValueError("question must be a non-empty string")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            response = self.server.service.answer(question)
+        except (ShoshinException, OpenAIError) as e:
+            logger.exception("Unable to answer the question")
+            self._send_json(HTTPStatus.BAD_GATEWAY, {"error": str(e)})
+            return
+        self._send_json(HTTPStatus.OK, response)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class QueryServer(ThreadingHTTPServer):
+    """A threaded HTTP server that answers questions through a shared `QueryService`.
+
+    Attributes:
+        service (QueryService): The service used to answer questions.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, service: QueryService) -> None:
+        """
+        Creates a `QueryServer` instance bound to `address`.
+
+        Args:
+            address (tuple): The (host, port) pair the server listens on.
+            service (QueryService): The service used to answer questions.
+        """
+        super().__init__(address, QueryRequestHandler)
+        self.service = service
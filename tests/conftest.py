@@ -2,6 +2,7 @@ import pytest
 import responses
 from haystack.schema import Document
 
+from benchmarks.stubs import StubConfig, StubOpenAI
 from shoshin.conf import settings as global_settings
 from shoshin.datastore.documents import DocumentStore
 
@@ -13,12 +14,38 @@ def server():
         yield resp
 
 
+@pytest.fixture
+def openai_stub(settings):
+    """Start a local stub of the OpenAI API, for async clients that `responses` can't mock."""
+    with StubOpenAI(StubConfig(latency=0.0, embedding_dim=2)) as stub:
+        settings.OPENAI_API_BASE = stub.base_url
+        yield stub
+
+
 @pytest.fixture(scope="function", autouse=True)
 def tenacity(mocker):
     """Mock tenacity to skip retries for mocked tests."""
     mocker.patch("tenacity.nap.time.sleep")
 
 
+@pytest.fixture(scope="function", autouse=True)
+def cache_dir(tmp_path):
+    """Store caches in a temporary folder, so that tests never share cached items."""
+    previous_cache_dir = global_settings.CACHE_DIR
+    global_settings.CACHE_DIR = str(tmp_path / "cache")
+    yield global_settings.CACHE_DIR
+    global_settings.CACHE_DIR = previous_cache_dir
+
+
+@pytest.fixture(scope="function", autouse=True)
+def lexical_index_dir(tmp_path):
+    """Store lexical indexes in a temporary folder, so that tests never share indexed documents."""
+    previous_lexical_index_dir = global_settings.LEXICAL_INDEX_DIR
+    global_settings.LEXICAL_INDEX_DIR = str(tmp_path / "lexical")
+    yield global_settings.LEXICAL_INDEX_DIR
+    global_settings.LEXICAL_INDEX_DIR = previous_lexical_index_dir
+
+
 @pytest.fixture(scope="function")
 def settings():
     """
@@ -31,7 +58,8 @@ def settings():
     """
     previous_settings = global_settings.dict()
     yield global_settings
-    global_settings.__dict__.update(previous_settings)
+    for name, value in previous_settings.items():
+        setattr(global_settings, name, value)
 
 
 @pytest.fixture(scope="function")
@@ -105,6 +133,6 @@ def document_store():
 
 @pytest.fixture(scope="function")
 def document_store_mock(mocker):
-    mocker.patch("shoshin.datastore.documents.MilvusDocumentStore")
-    mocker.patch("shoshin.datastore.documents.EmbeddingRetriever")
+    mocker.patch("shoshin.datastore.documents.FilteredMilvusDocumentStore")
+    mocker.patch("shoshin.datastore.documents.CachedEmbeddingRetriever")
     yield DocumentStore()
@@ -1,14 +1,305 @@
+import asyncio
+
+import numpy as np
+import pytest
+from haystack.document_stores import InMemoryDocumentStore
+from haystack.errors import OpenAIError
+from haystack.nodes import BM25Retriever
+from haystack.nodes.prompt import PromptModel
+from haystack.schema import Document
+
 from shoshin import ai
+from shoshin.ai.context import ContextPacker
+from shoshin.ai.generation import MeteredPromptNode
+from shoshin.ai.prompts import lfqa
+from shoshin.cache.answers import AnswerCache
+from shoshin.datastore.retrievers import HybridRetriever
+from shoshin.exceptions import AIError
+from shoshin.metrics import Metrics
+
+
+@pytest.fixture(scope="function", autouse=True)
+def count_tokens(mocker):
+    """Count tokens as words, so that tests don't need the LLM tokenizer."""
+    return mocker.patch.object(ContextPacker, "count_tokens", side_effect=lambda text: len(text.split()))
+
+
+@pytest.fixture(scope="function")
+def prompt_model(mocker):
+    """A PromptModel that answers "Test response", with a tokenizer that splits words."""
+    model = mocker.Mock(spec=PromptModel)
+    model.invoke.return_value = ["Test response"]
+    model._ensure_token_limit.side_effect = lambda prompt: prompt
+    model.model_invocation_layer = mocker.Mock()
+    model.model_invocation_layer._tokenizer.encode.side_effect = str.split
+    return model
 
 
 def test_ai_query(document_store_mock, mocker):
     # Ensure ai.query returns a text response
     ds = document_store_mock
-    pipeline = mocker.patch("shoshin.ai.GenerativeQAPipeline")()
+    pipeline = mocker.patch("shoshin.ai.Pipeline")()
     pipeline.run.return_value = {"results": "Test response"}
     # Test
     response = ai.query(ds.retriever, "Test question")
     # Check
     assert response == "Test response"
     assert pipeline.run.call_count == 1
-    pipeline.run.assert_called_with(params={"Retriever": {"top_k": 10}}, query="Test question")
+    pipeline.run.assert_called_with(params={"Retriever": {"top_k": 10, "filters": None}}, query="Test question")
+
+
+def test_ai_query_filters(document_store_mock, mocker):
+    # Ensure filters are passed to the retriever, so that the search only scores matching documents.
+    ds = document_store_mock
+    pipeline = mocker.patch("shoshin.ai.Pipeline")()
+    pipeline.run.return_value = {"results": "Test response"}
+    # Test
+    ai.query(ds.retriever, "Test question", filters={"lesson": ["lesson01"]})
+    # Check
+    pipeline.run.assert_called_with(
+        params={"Retriever": {"top_k": 10, "filters": {"lesson": ["lesson01"]}}}, query="Test question"
+    )
+
+
+def test_ai_query_with_cache(document_store_mock, mocker):
+    # Ensure similar questions reuse the cached answer without calling the LLM.
+    ds = document_store_mock
+    pipeline = mocker.patch("shoshin.ai.Pipeline")()
+    generator = mocker.Mock()
+    generator.run.return_value = ({"results": ["Test response"]}, "output_1")
+    nodes = {"ContextPacker": ContextPacker(), "Generator": generator}
+    pipeline.get_node.side_effect = nodes.get
+    ds.retriever.embed_queries.return_value = np.array([[1.0, 0.0]])
+    documents = [Document(content="Lesson content")]
+    ds.retriever.document_store.query_by_embedding.return_value = documents
+    cache = AnswerCache()
+    # Test
+    first = ai.query(ds.retriever, "Test question", cache=cache)
+    second = ai.query(ds.retriever, "Test question?", cache=cache)
+    # Check
+    assert first == second == ["Test response"]
+    assert pipeline.run.call_count == 0
+    assert generator.run.call_count == 1
+    generator.run.assert_called_with(query="Test question", documents=documents)
+    pipeline.get_node.assert_any_call("ContextPacker")
+    pipeline.get_node.assert_called_with("Generator")
+
+
+def test_ai_query_with_cache_metrics(document_store_mock, prompt_model, mocker):
+    # Ensure query stages, cache hits and generations are recorded.
+    registry = Metrics()
+    mocker.patch("shoshin.ai.metrics", registry)
+    mocker.patch("shoshin.ai.generation.metrics", registry)
+    ds = document_store_mock
+    pipeline = mocker.patch("shoshin.ai.Pipeline")()
+    generator = MeteredPromptNode(prompt_model, default_prompt_template=lfqa)
+    pipeline.get_node.side_effect = {"ContextPacker": ContextPacker(), "Generator": generator}.get
+    ds.retriever.embed_queries.return_value = np.array([[1.0, 0.0]])
+    ds.retriever.document_store.query_by_embedding.return_value = [Document(content="Lesson content")]
+    cache = AnswerCache()
+    # Test
+    ai.query(ds.retriever, "Test question", cache=cache)
+    ai.query(ds.retriever, "Test question", cache=cache)
+    # Check
+    spans = registry.spans()
+    assert spans["query"].count == 2
+    assert spans["query/retrieve"].count == 2
+    assert spans["query/retrieve/vector_search"].count == 2
+    assert spans["query/generate"].count == 1
+    counters = registry.counters()
+    assert counters["answer_cache.hits"] == counters["answer_cache.misses"] == 1
+    assert counters["openai.chat.requests"] == 1
+    assert counters["openai.chat.prompt_tokens"] > 0
+    assert counters["openai.chat.completion_tokens"] == 2
+
+
+def test_metered_prompt_node(prompt_model, mocker):
+    # Ensure generations are timed, and their requests and tokens counted.
+    registry = mocker.patch("shoshin.ai.generation.metrics", Metrics())
+    node = MeteredPromptNode(prompt_model, default_prompt_template=lfqa)
+    documents = [Document(content="Lesson content")]
+    # Test
+    output, _ = node.run(query="Test question", documents=documents)
+    # Check
+    prompt = output["invocation_context"]["prompts"][0]
+    assert output["results"] == ["Test response"]
+    assert registry.spans()["generate"].count == 1
+    assert registry.counters() == {
+        "openai.chat.requests": 1,
+        # The message content, the role and the 6 tokens of the chat format
+        "openai.chat.prompt_tokens": len(prompt.split()) + 1 + 6,
+        "openai.chat.completion_tokens": 2,
+    }
+
+
+def test_ai_query_generate_span(prompt_model, mocker):
+    # Ensure the generation within the default pipeline is recorded.
+    registry = Metrics()
+    mocker.patch("shoshin.ai.metrics", registry)
+    mocker.patch("shoshin.ai.generation.metrics", registry)
+    node = MeteredPromptNode(prompt_model, default_prompt_template=lfqa)
+    mocker.patch("shoshin.ai.build_prompt_node", return_value=node)
+    store = InMemoryDocumentStore(use_bm25=True)
+    store.write_documents([Document(content="Test lesson content")])
+    # Test
+    answer = ai.query(BM25Retriever(store), "Test question")
+    # Check
+    assert answer == ["Test response"]
+    assert registry.spans()["query/generate"].count == 1
+    assert registry.counters()["openai.chat.requests"] == 1
+
+
+def test_ai_aquery(document_store_mock, openai_stub):
+    # Ensure ai.aquery answers with the chat model, and reuses cached answers.
+    ds = document_store_mock
+    ds.retriever.embed_queries.return_value = np.array([[1.0, 0.0]])
+    ds.retriever.document_store.query_by_embedding.return_value = [Document(content="Lesson content")]
+    cache = AnswerCache()
+    # Test
+    first = asyncio.run(ai.aquery(ds.retriever, "Test question", cache=cache))
+    second = asyncio.run(ai.aquery(ds.retriever, "Test question?", cache=cache))
+    # Check
+    assert first == second == " ".join(["answer"] * 50)
+    assert openai_stub.requests["/chat/completions"] == 1
+    search = ds.retriever.document_store.query_by_embedding.call_args.kwargs
+    np.testing.assert_array_equal(search["query_emb"], [1.0, 0.0])
+    assert search["top_k"] == 10
+
+
+def test_ai_aquery_metrics(document_store_mock, openai_stub, mocker):
+    # Ensure the generation of ai.aquery is timed, and its tokens counted from the API usage.
+    registry = mocker.patch("shoshin.ai.metrics", Metrics())
+    ds = document_store_mock
+    ds.retriever.embed_queries.return_value = np.array([[1.0, 0.0]])
+    ds.retriever.document_store.query_by_embedding.return_value = [Document(content="Lesson content")]
+    # Test
+    asyncio.run(ai.aquery(ds.retriever, "Test question"))
+    # Check
+    assert registry.spans()["query/generate"].count == 1
+    assert registry.counters()["openai.chat.requests"] == 1
+    assert registry.counters()["openai.chat.completion_tokens"] == 50
+
+
+def test_ai_aquery_error(document_store_mock, openai_stub, settings):
+    # Ensure OpenAI errors of ai.aquery are raised as AIError.
+    settings.OPENAI_API_BASE = f"{openai_stub.base_url}/unknown"
+    ds = document_store_mock
+    ds.retriever.embed_queries.return_value = np.array([[1.0, 0.0]])
+    ds.retriever.document_store.query_by_embedding.return_value = []
+    # Test
+    with pytest.raises(AIError):
+        asyncio.run(ai.aquery(ds.retriever, "Test question"))
+
+
+def test_ai_stream_query(document_store_mock, mocker):
+    # Ensure tokens are yielded as they are generated, and retrieved documents are exposed.
+    ds = document_store_mock
+    documents = [Document(content="Lesson content", meta={"name": "lesson01.txt"})]
+    ds.retriever.retrieve.return_value = documents
+    prompt_node = mocker.patch("shoshin.ai.MeteredPromptNode")()
+
+    def run(query, documents, generation_kwargs):
+        for token in ["Test", " ", "response"]:
+            generation_kwargs["stream_handler"](token)
+        return {"results": ["Test response"]}, "output_1"
+
+    prompt_node.run.side_effect = run
+    # Test
+    stream = ai.stream_query(ds.retriever, "Test question")
+    tokens = list(stream)
+    # Check
+    assert tokens == ["Test", " ", "response"]
+    assert stream.answer == "Test response"
+    assert stream.documents == documents
+    ds.retriever.retrieve.assert_called_with(query="Test question", filters=None, top_k=10)
+
+
+def test_ai_stream_query_error(document_store_mock, mocker):
+    # Ensure generation errors are raised while iterating the stream.
+    ds = document_store_mock
+    ds.retriever.retrieve.return_value = []
+    prompt_node = mocker.patch("shoshin.ai.MeteredPromptNode")()
+    prompt_node.run.side_effect = OpenAIError("OpenAI returned an error.", status_code=500)
+    # Test
+    stream = ai.stream_query(ds.retriever, "Test question")
+    with pytest.raises(OpenAIError):
+        list(stream)
+    # Check
+    assert stream.answer is None
+
+
+def test_ai_query_with_cache_confident_lexical_match(mocker):
+    # Ensure answers retrieved without a question embedding are not cached.
+    retriever = mocker.Mock(spec=HybridRetriever)
+    documents = [Document(content="Use git rebase to rewrite history")]
+    retriever.retrieve_with_embedding.return_value = (documents, None)
+    pipeline = mocker.Mock()
+    generator = mocker.Mock()
+    generator.run.return_value = ({"results": ["Test response"]}, "output_1")
+    pipeline.get_node.side_effect = {"ContextPacker": ContextPacker(), "Generator": generator}.get
+    cache = AnswerCache()
+    # Test
+    answer = ai.query(retriever, "How do I rebase?", pipeline=pipeline, cache=cache)
+    # Check
+    assert answer == ["Test response"]
+    assert len(cache) == 0
+    retriever.retrieve_with_embedding.assert_called_once_with("How do I rebase?", filters=None, top_k=10)
+
+
+def test_ai_build_pipeline(document_store_mock, mocker):
+    # Ensure retrieved documents are packed before the generation.
+    mocker.patch("shoshin.ai.MeteredPromptNode")
+    pipeline = mocker.patch("shoshin.ai.Pipeline")()
+    # Test
+    ai.build_pipeline(document_store_mock.retriever)
+    # Check
+    names = [call.kwargs["name"] for call in pipeline.add_node.call_args_list]
+    inputs = [call.kwargs["inputs"] for call in pipeline.add_node.call_args_list]
+    assert names == ["Retriever", "ContextPacker", "Generator"]
+    assert inputs == [["Query"], ["Retriever"], ["ContextPacker"]]
+
+
+def test_ai_query_batch(document_store_mock, mocker):
+    # Ensure questions are embedded and searched in bulk, and answers are yielded in order.
+    ds = document_store_mock
+    pipeline = mocker.Mock()
+    generator = mocker.Mock()
+    generator.run.side_effect = lambda query, documents: ({"results": [f"Answer to {query}"]}, "output_1")
+    pipeline.get_node.side_effect = {"ContextPacker": ContextPacker(), "Generator": generator}.get
+    ds.retriever.embed_queries.side_effect = lambda questions: np.eye(len(questions), 2)
+    ds.retriever.document_store.query_by_embedding_batch.side_effect = lambda query_embs, filters, top_k: [
+        [Document(content=f"Lesson {i}", meta={"name": f"lesson{i:02d}.txt"})] for i in range(len(query_embs))
+    ]
+    questions = ["First?", "Second?", "Third?"]
+    # Test
+    answers = list(ai.query_batch(ds.retriever, questions, pipeline=pipeline, batch_size=2, concurrency=2))
+    # Check
+    assert [answer.question for answer in answers] == questions
+    assert [answer.answer for answer in answers] == ["Answer to First?", "Answer to Second?", "Answer to Third?"]
+    assert [answer.sources for answer in answers] == [["lesson00.txt"], ["lesson01.txt"], ["lesson00.txt"]]
+    assert all(set(answer.timings) == {"retrieve", "generate"} for answer in answers)
+    assert ds.retriever.embed_queries.call_args_list == [mocker.call(["First?", "Second?"]), mocker.call(["Third?"])]
+    assert ds.retriever.document_store.query_by_embedding.call_count == 0
+
+
+def test_ai_query_batch_errors_and_cache(document_store_mock, mocker):
+    # Ensure a failed generation doesn't stop the batch, and cached answers skip the LLM.
+    ds = document_store_mock
+    pipeline = mocker.Mock()
+    generator = mocker.Mock()
+    generator.run.side_effect = [({"results": ["Test response"]}, "output_1"), OpenAIError("Rate limit")]
+    pipeline.get_node.side_effect = {"ContextPacker": ContextPacker(), "Generator": generator}.get
+    ds.retriever.embed_queries.side_effect = lambda questions: np.array([[1.0, 0.0], [0.0, 1.0]])[: len(questions)]
+    ds.retriever.document_store.query_by_embedding_batch.side_effect = lambda query_embs, filters, top_k: [
+        [Document(content=f"Lesson {i}")] for i in range(len(query_embs))
+    ]
+    cache = AnswerCache()
+    # Test
+    first = list(ai.query_batch(ds.retriever, ["Zen?"], pipeline=pipeline, cache=cache))
+    second = list(ai.query_batch(ds.retriever, ["Zen?", "Posture?"], pipeline=pipeline, cache=cache))
+    # Check
+    assert (first[0].answer, first[0].cached) == ("Test response", False)
+    assert (second[0].answer, second[0].cached) == ("Test response", True)
+    assert second[1].answer is None
+    assert "Rate limit" in second[1].error
+    assert generator.run.call_count == 2
@@ -0,0 +1,137 @@
+import os
+
+from ffmpeg import Error as FFMpegError
+
+from shoshin.pipeline.batch import (
+    extract_audio_from_videos,
+    find_video_files,
+    is_up_to_date,
+    output_path,
+)
+from shoshin.pipeline.journal import EXTRACTED, Journal, fingerprint
+
+
+def _touch(path, mtime=None):
+    path.write_bytes(b"0" * 10)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_find_video_files_directory(tmp_path):
+    # Ensure only supported video files are found in a directory.
+    _touch(tmp_path / "lesson02.mp4")
+    _touch(tmp_path / "lesson01.MP4")
+    _touch(tmp_path / "notes.txt")
+    (tmp_path / "nested.mp4").mkdir()
+    # Test
+    files = find_video_files(str(tmp_path))
+    # Check
+    assert files == [str(tmp_path / "lesson01.MP4"), str(tmp_path / "lesson02.mp4")]
+
+
+def test_find_video_files_glob(tmp_path):
+    # Ensure glob patterns are expanded.
+    _touch(tmp_path / "lesson01.mp4")
+    _touch(tmp_path / "intro.mp4")
+    # Test
+    files = find_video_files(str(tmp_path / "lesson*.mp4"))
+    # Check
+    assert files == [str(tmp_path / "lesson01.mp4")]
+
+
+def test_is_up_to_date(tmp_path):
+    # Ensure outputs are up to date only if they are newer than their source.
+    source = _touch(tmp_path / "video.mp4", mtime=1000)
+    assert is_up_to_date(source, str(tmp_path / "missing.mp3")) is False
+    assert is_up_to_date(source, _touch(tmp_path / "old.mp3", mtime=500)) is False
+    assert is_up_to_date(source, _touch(tmp_path / "new.mp3", mtime=2000)) is True
+
+
+def test_output_path():
+    # Ensure the output path replaces the extension and uses the output folder.
+    assert output_path("videos/lesson01.mp4", "audio") == os.path.join("audio", "lesson01.mp3")
+
+
+def test_extract_audio_from_videos(ffmpeg, tmp_path):
+    # Ensure every job is converted and up to date outputs are skipped.
+    video1 = _touch(tmp_path / "lesson01.mp4", mtime=1000)
+    video2 = _touch(tmp_path / "lesson02.mp4", mtime=1000)
+    audio2 = _touch(tmp_path / "lesson02.mp3", mtime=2000)
+    jobs = [(video1, str(tmp_path / "lesson01.mp3")), (video2, audio2)]
+    # Test
+    results = list(extract_audio_from_videos(jobs, workers=1))
+    # Check
+    assert len(results) == 2
+    assert results[0].skipped is True
+    assert results[0].video_file == video2
+    assert results[1].skipped is False
+    assert results[1].error is None
+    assert results[1].size == 10
+    assert ffmpeg.run.call_count == 1
+    ffmpeg.input.assert_called_with(video1)
+
+
+def test_extract_audio_from_videos_force(ffmpeg, tmp_path):
+    # Ensure up to date outputs are converted again if forced.
+    video = _touch(tmp_path / "lesson01.mp4", mtime=1000)
+    audio = _touch(tmp_path / "lesson01.mp3", mtime=2000)
+    # Test
+    results = list(extract_audio_from_videos([(video, audio)], workers=1, force=True))
+    # Check
+    assert results[0].skipped is False
+    assert ffmpeg.run.call_count == 1
+
+
+def test_extract_audio_from_videos_error(ffmpeg, tmp_path):
+    # Ensure a failing job doesn't stop the batch and reports the error.
+    ffmpeg.run.side_effect = [FFMpegError("ffmpeg", "stdout", "stderr"), None]
+    video1 = _touch(tmp_path / "lesson01.mp4")
+    video2 = _touch(tmp_path / "lesson02.mp4")
+    jobs = [(video1, str(tmp_path / "lesson01.mp3")), (video2, str(tmp_path / "lesson02.mp3"))]
+    # Test
+    results = list(extract_audio_from_videos(jobs, workers=1))
+    # Check
+    assert "Error occurred during audio extraction" in results[0].error
+    assert results[0].throughput == 0.0
+    assert results[1].error is None
+
+
+def test_extract_audio_from_videos_journal(ffmpeg, tmp_path):
+    # Ensure completed jobs are recorded, and failed jobs stay interrupted.
+    ffmpeg.run.side_effect = [None, FFMpegError("ffmpeg", "stdout", "stderr")]
+    video1 = _touch(tmp_path / "lesson01.mp4")
+    video2 = _touch(tmp_path / "lesson02.mp4")
+    jobs = [(video1, str(tmp_path / "lesson01.mp3")), (video2, str(tmp_path / "lesson02.mp3"))]
+    journal = Journal(str(tmp_path / "journal.db"))
+    # Test
+    list(extract_audio_from_videos(jobs, workers=1, journal=journal))
+    # Check
+    assert journal.is_done(video1, EXTRACTED, fingerprint(video1))
+    assert journal.is_interrupted(video2, EXTRACTED)
+
+
+def test_extract_audio_from_videos_journal_interrupted(ffmpeg, tmp_path):
+    # Ensure outputs left behind by an interrupted extraction are extracted again.
+    video = _touch(tmp_path / "lesson01.mp4", mtime=1000)
+    audio = _touch(tmp_path / "lesson01.mp3", mtime=2000)
+    journal = Journal(str(tmp_path / "journal.db"))
+    journal.start(video, EXTRACTED)
+    # Test
+    results = list(extract_audio_from_videos([(video, audio)], workers=1, journal=journal))
+    # Check
+    assert results[0].skipped is False
+    assert ffmpeg.run.call_count == 1
+    assert journal.is_done(video, EXTRACTED)
+
+
+def test_extract_audio_from_videos_journal_completed(ffmpeg, tmp_path):
+    # Ensure up to date outputs without journal records are trusted.
+    video = _touch(tmp_path / "lesson01.mp4", mtime=1000)
+    audio = _touch(tmp_path / "lesson01.mp3", mtime=2000)
+    journal = Journal(str(tmp_path / "journal.db"))
+    # Test
+    results = list(extract_audio_from_videos([(video, audio)], workers=1, journal=journal))
+    # Check
+    assert results[0].skipped is True
+    assert ffmpeg.run.call_count == 0
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import requests
+
+from benchmarks.stubs import StubConfig, StubOpenAI, fake_embedding
+from benchmarks.suite import compare
+
+
+@pytest.fixture
+def stub():
+    with StubOpenAI(StubConfig(latency=0.0, embedding_dim=4, answer_words=3, rate_limit=2)) as stub:
+        yield stub
+
+
+def _results(**medians):
+    return {"version": 1, "benchmarks": {name: {"median": median} for name, median in medians.items()}}
+
+
+def test_fake_embedding():
+    # Ensure fake embeddings are deterministic unit vectors.
+    # Test
+    embedding = fake_embedding("Hello", 8)
+    # Check
+    np.testing.assert_array_equal(embedding, fake_embedding("Hello", 8))
+    assert not np.array_equal(embedding, fake_embedding("World", 8))
+    assert np.linalg.norm(embedding) == pytest.approx(1.0)
+
+
+def test_stub_embeddings(stub):
+    # Ensure the stub answers embeddings requests with the fake embedding of each input.
+    # Test
+    response = requests.post(f"{stub.base_url}/embeddings", json={"model": "test", "input": ["Hello", "a b"]})
+    # Check
+    assert response.status_code == 200
+    data = response.json()
+    np.testing.assert_allclose(data["data"][1]["embedding"], fake_embedding("a b", 4), rtol=1e-6)
+    assert data["usage"]["prompt_tokens"] == 3
+    assert stub.requests["/embeddings"] == 1
+
+
+def test_stub_chat(stub):
+    # Ensure the stub answers chat completions with the configured number of words.
+    # Test
+    response = requests.post(f"{stub.base_url}/chat/completions", json={"model": "test", "messages": []})
+    # Check
+    data = response.json()
+    assert data["choices"][0]["message"]["content"] == "answer answer answer"
+    assert data["usage"]["completion_tokens"] == 3
+
+
+def test_stub_rate_limit(stub):
+    # Ensure requests over the rate limit are answered with a 429 error and counted.
+    # Test
+    statuses = [
+        requests.post(f"{stub.base_url}/embeddings", json={"model": "test", "input": "Hello"}).status_code
+        for _ in range(3)
+    ]
+    # Check
+    assert statuses == [200, 200, 429]
+    assert stub.requests["/embeddings"] == 3
+    assert stub.rate_limited["/embeddings"] == 1
+
+
+def test_stub_unknown_endpoint(stub):
+    # Ensure unknown endpoints are answered with a 404 error, and not counted.
+    # Test
+    response = requests.post(f"{stub.base_url}/completions", json={})
+    # Check
+    assert response.status_code == 404
+    assert not stub.requests
+
+
+def test_compare():
+    # Ensure benchmarks slower than the threshold are reported as regressions.
+    base = _results(query=1.0, search=2.0, removed=1.0)
+    new = _results(query=1.05, search=3.0, added=1.0)
+    # Test
+    rows = compare(base, new, threshold=0.1)
+    # Check
+    assert [(row["name"], row["ratio"], row["regression"]) for row in rows] == [
+        ("query", pytest.approx(1.05), False),
+        ("search", pytest.approx(1.5), True),
+    ]
+
+
+def test_compare_versions():
+    # Ensure results of different formats are not compared.
+    base = {**_results(query=1.0), "version": 0}
+    # Test
+    with pytest.raises(ValueError):
+        compare(base, _results(query=1.0), threshold=0.1)
@@ -0,0 +1,224 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from shoshin.cache.answers import AnswerCache
+from shoshin.cache.embeddings import EmbeddingCache
+from shoshin.cache.transcriptions import TranscriptionCache
+
+
+def test_transcription_cache_defaults(settings):
+    # Ensure TranscriptionCache defaults are set correctly.
+    cache = TranscriptionCache()
+    # Check
+    assert cache.path == os.path.join(settings.CACHE_DIR, "transcriptions")
+    assert cache.max_size == 50 * 1024 * 1024
+    assert os.path.isdir(cache.path)
+
+
+def test_transcription_cache_key():
+    # Ensure keys depend on the audio content and the model, and the stream is rewound.
+    stream = io.BytesIO(b"audio")
+    stream.seek(0)
+    # Test
+    key = TranscriptionCache.key(stream, "whisper-1")
+    # Check
+    assert stream.tell() == 0
+    assert key == TranscriptionCache.key(io.BytesIO(b"audio"), "whisper-1")
+    assert key != TranscriptionCache.key(io.BytesIO(b"other"), "whisper-1")
+    assert key != TranscriptionCache.key(io.BytesIO(b"audio"), "whisper-2")
+
+
+def test_transcription_cache_get_set(tmp_path):
+    # Ensure transcriptions are stored with their metadata.
+    cache = TranscriptionCache(str(tmp_path))
+    # Test
+    cache.set("key", "Thanks for watching!", model="whisper-1")
+    # Check
+    item = cache.get("key")
+    assert item["text"] == "Thanks for watching!"
+    assert item["model"] == "whisper-1"
+    assert item["created_at"] > 0
+    assert cache.get("missing") is None
+
+
+def test_transcription_cache_stats(tmp_path):
+    # Ensure stats report the number and size of cached items.
+    cache = TranscriptionCache(str(tmp_path), max_size=1000)
+    cache.set("key1", "text")
+    cache.set("key2", "text")
+    # Test
+    stats = cache.stats()
+    # Check
+    assert stats.entries == 2
+    assert stats.size == sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+    assert stats.max_size == 1000
+
+
+def test_transcription_cache_eviction(tmp_path):
+    # Ensure the least recently used items are evicted when the cache is full.
+    cache = TranscriptionCache(str(tmp_path))
+    for i, key in enumerate(["key1", "key2", "key3"]):
+        cache.set(key, "text")
+        os.utime(tmp_path / f"{key}.json", (i, i))
+    cache.get("key1")
+    max_size = os.path.getsize(tmp_path / "key1.json") + os.path.getsize(tmp_path / "key3.json")
+    # Test
+    evicted = cache.prune(max_size=max_size)
+    # Check
+    assert evicted == 1
+    assert cache.get("key2") is None
+    assert cache.get("key1") is not None
+    assert cache.get("key3") is not None
+
+
+def test_transcription_cache_set_concurrent(tmp_path):
+    # Ensure threads writing the same key never collide on their temporary files.
+    cache = TranscriptionCache(str(tmp_path))
+    # Test
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: cache.set("key", f"text {i}"), range(50)))
+    # Check
+    assert os.listdir(tmp_path) == ["key.json"]
+    assert cache.get("key")["text"].startswith("text")
+
+
+def test_transcription_cache_set_prunes_over_budget(tmp_path, mocker):
+    # Ensure writes only scan the cache folder when it's over budget.
+    cache = TranscriptionCache(str(tmp_path), max_size=1000)
+    cache.set("key1", "text")
+    prune = mocker.spy(cache, "prune")
+    items = mocker.spy(cache, "_items")
+    # Test
+    cache.set("key2", "text")
+    cache.set("key3", "x" * 1000)
+    # Check
+    assert prune.call_count == 1
+    assert items.call_count == 1
+    assert cache.get("key1") is None
+    assert cache.stats().size <= 1000
+
+
+def test_embedding_cache_defaults(settings):
+    # Ensure EmbeddingCache stores embeddings per model.
+    cache = EmbeddingCache("text-embedding-ada-002", 4)
+    # Check
+    assert cache.path == os.path.join(settings.CACHE_DIR, "embeddings", "text-embedding-ada-002")
+    assert len(cache) == 0
+
+
+def test_embedding_cache_get_set(tmp_path):
+    # Ensure embeddings are found by normalized text.
+    cache = EmbeddingCache("model", 4, str(tmp_path))
+    vectors = np.array([[1, 2, 3, 4], [5, 6, 7, 8]], dtype=np.float32)
+    # Test
+    cache.set_many(["first text", "second  text\n"], vectors)
+    # Check
+    result = cache.get_many(["second text", "missing", " first text"])
+    assert len(cache) == 2
+    assert result[1] is None
+    np.testing.assert_array_equal(result[0], vectors[1])
+    np.testing.assert_array_equal(result[2], vectors[0])
+
+
+def test_embedding_cache_persistence(tmp_path):
+    # Ensure embeddings are reused by another cache instance and duplicates are not stored.
+    cache = EmbeddingCache("model", 2, str(tmp_path))
+    cache.set_many(["text"], np.array([[1, 2]]))
+    cache.set_many(["text", "other"], np.array([[1, 2], [3, 4]]))
+    # Test
+    reloaded = EmbeddingCache("model", 2, str(tmp_path))
+    # Check
+    assert len(reloaded) == 2
+    np.testing.assert_array_equal(reloaded.get_many(["other"])[0], [3, 4])
+
+
+def test_embedding_cache_partial_write(tmp_path):
+    # Ensure rows without a key or with a partial vector are discarded.
+    cache = EmbeddingCache("model", 2, str(tmp_path))
+    cache.set_many(["text"], np.array([[1, 2]]))
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(b"\x00" * 6)
+    # Test
+    reloaded = EmbeddingCache("model", 2, str(tmp_path))
+    reloaded.set_many(["other"], np.array([[3, 4]]))
+    # Check
+    assert len(reloaded) == 2
+    np.testing.assert_array_equal(reloaded.get_many(["other"])[0], [3, 4])
+    assert os.path.getsize(tmp_path / "vectors.f32") == 2 * 2 * 4
+
+
+def test_embedding_cache_shared_by_processes(tmp_path):
+    # Ensure caches of different processes append rows after each other's rows.
+    first = EmbeddingCache("model", 2, str(tmp_path))
+    second = EmbeddingCache("model", 2, str(tmp_path))
+    # Test
+    first.set_many(["first"], np.array([[1, 2]]))
+    second.set_many(["second"], np.array([[3, 4]]))
+    first.set_many(["third"], np.array([[5, 6]]))
+    # Check
+    reloaded = EmbeddingCache("model", 2, str(tmp_path))
+    for cache in (first, second, reloaded):
+        result = cache.get_many(["first", "second", "third"])
+        np.testing.assert_array_equal(result, [[1, 2], [3, 4], [5, 6]])
+    assert len(reloaded) == 3
+
+
+def test_answer_cache_defaults():
+    # Ensure AnswerCache defaults are set correctly.
+    cache = AnswerCache()
+    # Check
+    assert cache.threshold == 0.95
+    assert cache.ttl == 3600
+    assert cache.max_size == 1000
+
+
+def test_answer_cache_similar_question():
+    # Ensure answers are reused for similar questions that retrieved the same documents.
+    cache = AnswerCache(threshold=0.9)
+    cache.set(np.array([1.0, 0.0]), ["doc1", "doc2"], "Answer")
+    # Test
+    similar = cache.get(np.array([0.99, 0.05]), ["doc2", "doc1"])
+    different = cache.get(np.array([0.0, 1.0]), ["doc1", "doc2"])
+    # Check
+    assert similar == "Answer"
+    assert different is None
+
+
+def test_answer_cache_different_documents():
+    # Ensure answers are not reused if the retrieved documents changed.
+    cache = AnswerCache(threshold=0.9)
+    cache.set(np.array([1.0, 0.0]), ["doc1", "doc2"], "Answer")
+    # Test
+    answer = cache.get(np.array([1.0, 0.0]), ["doc1", "doc3"])
+    # Check
+    assert answer is None
+
+
+def test_answer_cache_ttl(mocker):
+    # Ensure expired answers are evicted.
+    clock = mocker.patch("shoshin.cache.answers.time.monotonic", return_value=100.0)
+    cache = AnswerCache(ttl=10)
+    cache.set(np.array([1.0, 0.0]), ["doc1"], "Answer")
+    clock.return_value = 111.0
+    # Test
+    answer = cache.get(np.array([1.0, 0.0]), ["doc1"])
+    # Check
+    assert answer is None
+    assert len(cache) == 0
+
+
+def test_answer_cache_lru():
+    # Ensure the least recently used answers are evicted when the cache is full.
+    cache = AnswerCache(max_size=2)
+    cache.set(np.array([1.0, 0.0]), ["doc1"], "First")
+    cache.set(np.array([0.0, 1.0]), ["doc1"], "Second")
+    cache.get(np.array([1.0, 0.0]), ["doc1"])
+    # Test
+    cache.set(np.array([1.0, 1.0]), ["doc1"], "Third")
+    # Check
+    assert len(cache) == 2
+    assert cache.get(np.array([1.0, 0.0]), ["doc1"]) == "First"
+    assert cache.get(np.array([0.0, 1.0]), ["doc1"]) is None
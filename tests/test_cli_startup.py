@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import shoshin
+
+# Time allowed to `shoshin --help`, in seconds. Loading Haystack alone takes several seconds.
+STARTUP_BUDGET = float(os.environ.get("SHOSHIN_STARTUP_BUDGET", "1.5"))
+
+# Modules that must be imported only by the commands using them
+HEAVY_MODULES = ("haystack", "openai", "milvus_documentstore", "torch", "shoshin.ai", "shoshin.datastore")
+
+
+def _run(*args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": str(Path(shoshin.__file__).parent.parent)}
+    # Settings are loaded lazily, so the CLI starts without an OpenAI API key
+    env.pop("OPENAI_API_KEY", None)
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, check=True)
+
+
+def test_cli_imports_no_heavy_modules():
+    # Ensure the CLI module and its settings don't load Haystack, OpenAI or the document stores.
+    code = (
+        "import sys\n"
+        "import shoshin.cli.commands\n"
+        "print('\\n'.join(name for name in sys.modules if name.startswith(%r)))" % (HEAVY_MODULES,)
+    )
+    # Test
+    result = _run("-c", code)
+    # Check
+    assert result.stdout.split() == []
+
+
+def test_cli_help_startup_time():
+    # Ensure `shoshin --help` starts within the budget (best of 3 runs, to ignore a cold disk cache).
+    elapsed = []
+    for _ in range(3):
+        start = time.perf_counter()
+        result = _run("-m", "shoshin.cli.commands", "--help")
+        elapsed.append(time.perf_counter() - start)
+    # Check
+    assert "convert" in result.stdout
+    assert min(elapsed) < STARTUP_BUDGET, f"shoshin --help took {min(elapsed):.2f}s (budget: {STARTUP_BUDGET}s)"
+
+
+def test_cli_command_help_uses_settings_names():
+    # Ensure defaults read from settings are documented without loading them.
+    # Test
+    result = _run("-m", "shoshin.cli.commands", "transcribe", "--help")
+    # Check
+    assert "--workers INTEGER" in result.stdout
+    assert "TRANSCRIPTION_WORKERS" in result.stdout
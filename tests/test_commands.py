@@ -0,0 +1,85 @@
+import pytest
+from click.testing import CliRunner
+
+from shoshin.cli.commands import cli
+from shoshin.datastore.documents import EmbeddingsReport
+
+
+@pytest.fixture
+def store(mocker, settings):
+    """A Document Store that records loaded files, and can be interrupted after some batches."""
+    store = mocker.MagicMock(index="document")
+    store.loaded = []
+    store.interrupt_after = None
+
+    def write_embeddings(batches, incremental=False, on_batch=None):
+        for count, batch in enumerate(batches):
+            if count == store.interrupt_after:
+                raise KeyboardInterrupt
+            store.loaded.extend(doc.meta["path"] for doc in batch)
+            on_batch(batch)
+        return EmbeddingsReport(embedded=len(store.loaded))
+
+    store.write_embeddings.side_effect = write_embeddings
+    mocker.patch("shoshin.datastore.documents.DocumentStore", return_value=store)
+    # One batch per transcription, without loading the NLTK preprocessor
+    mocker.patch(
+        "shoshin.pipeline.processors.clean_documents_stream",
+        side_effect=lambda documents, language, workers: ([doc] for doc in documents),
+    )
+    return store
+
+
+def _transcriptions(tmp_path):
+    paths = [tmp_path / "a" / "lesson01.txt", tmp_path / "a" / "lesson02.txt", tmp_path / "b" / "lesson01.txt"]
+    for path in paths:
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"Transcription of {path.parent.name}/{path.name}")
+    return [str(path) for path in paths]
+
+
+def test_embeddings_load_resume(store, tmp_path):
+    # Ensure an interrupted load resumes from the transcriptions not written yet.
+    paths = _transcriptions(tmp_path)
+    runner = CliRunner()
+    store.interrupt_after = 1
+    interrupted = runner.invoke(cli, ["embeddings-load", "--no-progress", "--workers", "1", str(tmp_path)])
+    store.interrupt_after = None
+    store.loaded.clear()
+    # Test
+    result = runner.invoke(cli, ["embeddings-load", "--no-progress", "--workers", "1", str(tmp_path)])
+    # Check
+    assert interrupted.exit_code != 0
+    assert result.exit_code == 0, result.output
+    assert "Resuming: 1 transcriptions already loaded" in result.output
+    assert store.loaded == paths[1:]
+
+
+def test_embeddings_load_resume_same_names(store, tmp_path):
+    # Ensure transcriptions with the same name in different subfolders are recorded separately.
+    paths = _transcriptions(tmp_path)
+    runner = CliRunner()
+    store.interrupt_after = 2
+    runner.invoke(cli, ["embeddings-load", "--no-progress", "--workers", "1", str(tmp_path)])
+    store.interrupt_after = None
+    store.loaded.clear()
+    # Test
+    result = runner.invoke(cli, ["embeddings-load", "--no-progress", "--workers", "1", str(tmp_path)])
+    # Check
+    assert result.exit_code == 0, result.output
+    assert store.loaded == [paths[2]]
+
+
+def test_embeddings_load_restart(store, tmp_path):
+    # Ensure `--restart` loads all transcriptions again.
+    paths = _transcriptions(tmp_path)
+    runner = CliRunner()
+    store.interrupt_after = 1
+    runner.invoke(cli, ["embeddings-load", "--no-progress", "--workers", "1", str(tmp_path)])
+    store.interrupt_after = None
+    store.loaded.clear()
+    # Test
+    result = runner.invoke(cli, ["embeddings-load", "--no-progress", "--workers", "1", "--restart", str(tmp_path)])
+    # Check
+    assert result.exit_code == 0, result.output
+    assert store.loaded == paths
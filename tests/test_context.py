@@ -0,0 +1,68 @@
+import pytest
+from haystack.schema import Document
+
+from shoshin.ai.context import ContextPacker
+
+
+@pytest.fixture(scope="function")
+def packer():
+    # Count tokens as words, so that tests don't need the LLM tokenizer
+    yield ContextPacker(max_tokens=10, count_tokens=lambda text: len(text.split()))
+
+
+def _chunk(content, name, split_id, score):
+    return Document(content=content, meta={"name": name, "_split_id": split_id}, score=score)
+
+
+def test_context_packer_budget(packer):
+    # Ensure documents are packed by score while they fit the token budget.
+    best = _chunk("one two three four five six", "a.txt", 0, 0.9)
+    too_long = _chunk("one two three four five six seven", "b.txt", 0, 0.8)
+    short = _chunk("alpha beta gamma", "c.txt", 0, 0.7)
+    # Test
+    packed = packer.pack([short, too_long, best])
+    # Check
+    assert packed == [best, short]
+
+
+def test_context_packer_near_duplicates(packer):
+    # Ensure near-duplicate documents are dropped, keeping the best scored one.
+    best = _chunk("Zen meditation starts with posture", "a.txt", 0, 0.9)
+    duplicate = _chunk("zen meditation starts with posture!", "b.txt", 3, 0.8)
+    # Test
+    packed = packer.pack([duplicate, best])
+    # Check
+    assert packed == [best]
+
+
+def test_context_packer_merges_adjacent_chunks(packer):
+    # Ensure adjacent chunks of the same source are merged into a single document.
+    first = _chunk("Sit down.", "a.txt", 1, 0.6)
+    second = _chunk("Breathe slowly.", "a.txt", 2, 0.9)
+    other = _chunk("Keep practicing.", "b.txt", 3, 0.7)
+    # Test
+    packed = packer.pack([first, second, other])
+    # Check
+    assert [doc.content for doc in packed] == ["Sit down. Breathe slowly.", "Keep practicing."]
+    assert packed[0].score == 0.9
+    assert packed[0].id == first.id
+
+
+def test_context_packer_keeps_documents_without_position(packer):
+    # Ensure documents without source metadata are never merged.
+    a = Document(content="First document", score=0.5)
+    b = Document(content="Second document", score=0.6)
+    # Test
+    packed = packer.pack([a, b])
+    # Check
+    assert packed == [b, a]
+
+
+def test_context_packer_run(packer):
+    # Ensure the node outputs the packed documents.
+    document = _chunk("Sit down.", "a.txt", 1, 0.6)
+    # Test
+    output, edge = packer.run(query="How do I sit?", documents=[document])
+    # Check
+    assert output == {"documents": [document]}
+    assert edge == "output_1"
@@ -1,11 +1,30 @@
+import asyncio
+import time
+
+import numpy as np
 import pytest
 import responses
 from haystack.errors import OpenAIError
 from haystack.nodes import EmbeddingRetriever
+from haystack.schema import Document
 from milvus_documentstore import MilvusDocumentStore
 
-from shoshin.datastore.documents import DocumentStore
-from shoshin.exceptions import AIError
+from shoshin.conf import constants as c
+from shoshin.datastore.documents import (
+    DocumentStore,
+    EmbeddingsReport,
+    _Checkpoint,
+    course_index,
+    embedding_model,
+)
+from shoshin.datastore.embedded import EmbeddedDocumentStore
+from shoshin.datastore.lexical import LexicalIndex
+from shoshin.datastore.milvus import (
+    FilteredMilvusDocumentStore,
+    QuantizedMilvusDocumentStore,
+)
+from shoshin.datastore.retrievers import HybridRetriever
+from shoshin.exceptions import AIError, ShoshinException
 
 
 def test_datastore_defaults(settings):
@@ -27,6 +46,24 @@ def test_datastore_different_index():
     assert ds._store.index == "test"
 
 
+def test_datastore_course_index(settings):
+    # Ensure each course is stored in its own index.
+    settings.DOCUMENTS_INDEX = "document"
+    # Test
+    ds = DocumentStore(course="Zen 101")
+    # Check
+    assert ds.course == "Zen 101"
+    assert ds.index == "document_zen_101"
+    assert ds._store.index == "document_zen_101"
+    assert ds.lexical_index.path.endswith("document_zen_101.json")
+
+
+def test_course_index_invalid_name():
+    # Ensure course names without letters or digits are rejected.
+    with pytest.raises(ShoshinException):
+        course_index("--")
+
+
 def test_datastore_property_retriever():
     # Ensure DocumentStore exposes the underlying `EmbeddingRetriever`.
     # Test
@@ -47,6 +84,47 @@ def test_datastore_create_embeddings(document_store_mock, document):
     ds._store.update_embeddings.assert_called_with(ds._retriever)
 
 
+def test_datastore_create_embeddings_report(document_store_mock, document):
+    # Ensure a full load reports all documents as embedded.
+    ds = document_store_mock
+    # Test
+    report = ds.create_embeddings([document])
+    # Check
+    assert report == EmbeddingsReport(skipped=0, embedded=1, deleted=0)
+
+
+def test_datastore_create_embeddings_incremental(document_store_mock, document):
+    # Ensure only documents without an embedding are written and embedded.
+    ds = document_store_mock
+    document.meta["name"] = "lesson01.txt"
+    embedded = Document(content="Already embedded", meta={"name": "lesson01.txt", "vector_id": "1"})
+    stale = Document(content="Removed from the lesson", meta={"name": "lesson01.txt", "vector_id": "2"})
+    ds._store.get_documents_by_id.return_value = [embedded]
+    ds._store.get_all_documents_generator.return_value = iter([embedded, stale])
+    # Test
+    report = ds.create_embeddings([document, embedded], incremental=True)
+    # Check
+    assert report == EmbeddingsReport(skipped=1, embedded=1, deleted=1)
+    ds._store.get_all_documents_generator.assert_called_with(filters={"name": ["lesson01.txt"]}, return_embedding=False)
+    ds._store.delete_documents.assert_called_with(ids=[stale.id])
+    ds._store.write_documents.assert_called_with([document], duplicate_documents="overwrite")
+    ds._store.update_embeddings.assert_called_with(ds._retriever, update_existing_embeddings=False)
+
+
+def test_datastore_create_embeddings_incremental_unchanged(document_store_mock, document):
+    # Ensure nothing is embedded if all documents are already stored with an embedding.
+    ds = document_store_mock
+    document.meta["vector_id"] = "1"
+    ds._store.get_documents_by_id.return_value = [document]
+    # Test
+    report = ds.create_embeddings([document.to_dict()], incremental=True)
+    # Check
+    assert report == EmbeddingsReport(skipped=1, embedded=0, deleted=0)
+    assert ds._store.write_documents.call_count == 0
+    assert ds._store.update_embeddings.call_count == 0
+    assert ds._store.delete_documents.call_count == 0
+
+
 def test_embeddings_create(document_store, document, server, vector):
     # Integration test for create_embeddings.
     ds = document_store
@@ -79,3 +157,378 @@ def test_embeddings_create_exception(document_store_mock, document):
     assert isinstance(e.value.original_exception, OpenAIError)
     documents = ds._store.get_all_documents()
     assert len(documents) == 0
+
+
+def test_datastore_embedded_backend(settings, tmp_path):
+    # Ensure the embedded backend is selected from settings.
+    settings.DOCUMENT_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = str(tmp_path)
+    # Test
+    ds = DocumentStore(index="test")
+    # Check
+    assert isinstance(ds._store, EmbeddedDocumentStore)
+    assert ds._store.index == "test"
+    assert ds._store.path == str(tmp_path)
+
+
+def test_datastore_embedded_backend_quantization(settings, tmp_path):
+    # Ensure the quantization settings are passed to the embedded backend.
+    settings.DOCUMENT_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = str(tmp_path)
+    settings.VECTOR_QUANTIZATION = "pq"
+    settings.VECTOR_REDUCED_DIM = 256
+    # Test
+    ds = DocumentStore(index="test")
+    # Check
+    assert ds._store.quantization == "pq"
+    assert ds._store.reduced_dim == 256
+    assert ds._store.rescore_factor == 4
+
+
+def test_datastore_milvus_quantization(settings, mocker):
+    # Ensure the quantized Milvus store is used when quantization is enabled.
+    store = mocker.patch("shoshin.datastore.documents.QuantizedMilvusDocumentStore")
+    mocker.patch("shoshin.datastore.documents.CachedEmbeddingRetriever")
+    settings.VECTOR_QUANTIZATION = "int8"
+    # Test
+    DocumentStore(index="test")
+    # Check
+    store.assert_called_once_with(
+        "int8",
+        pq_subvectors=96,
+        rescore_factor=4,
+        nlist=1024,
+        nprobe=16,
+        index="test",
+        embedding_dim=c.EMBEDDING_DIM,
+        sql_url=settings.DATABASE_URL,
+        progress_bar=settings.PROGRESS_BAR,
+    )
+
+
+def test_milvus_filters(mocker):
+    # Ensure filters restrict the Milvus search to the vector IDs of the matching documents.
+    mocker.patch.object(FilteredMilvusDocumentStore, "__init__", return_value=None)
+    store = FilteredMilvusDocumentStore()
+    store.index, store.return_embedding, store.cosine, store.similarity = "document", False, False, "dot_product"
+    store.id_field, store.embedding_field, store.metric_type = "id", "embedding", "IP"
+    store.search_param = {"nprobe": 16}
+    store.collection = mocker.Mock()
+    store.collection.search.return_value = [mocker.Mock(ids=[12, 11], distances=[0.9, 0.5])]
+    lessons = [Document(content=f"Lesson {i}", meta={"vector_id": str(i)}) for i in (11, 12)]
+    store.get_all_documents_generator = mocker.Mock(return_value=iter(lessons))
+    store.get_documents_by_vector_ids = mocker.Mock(return_value=lessons)
+    # Test
+    documents = store.query_by_embedding(np.ones(2), filters={"lesson": ["lesson01"]}, top_k=2, scale_score=False)
+    # Check
+    assert [doc.content for doc in documents] == ["Lesson 12", "Lesson 11"]
+    assert [doc.score for doc in documents] == [0.9, 0.5]
+    store.get_all_documents_generator.assert_called_once_with(
+        index="document", filters={"lesson": ["lesson01"]}, return_embedding=False
+    )
+    search = store.collection.search.call_args.kwargs
+    assert search["expr"] == "id in [11, 12]"
+    assert search["param"] == {"metric_type": "IP", "nprobe": 16}
+    assert search["limit"] == 2
+
+
+def test_milvus_filters_no_match(mocker):
+    # Ensure Milvus is not searched when no document matches the filters.
+    mocker.patch.object(FilteredMilvusDocumentStore, "__init__", return_value=None)
+    store = FilteredMilvusDocumentStore()
+    store.index, store.return_embedding = "document", False
+    store.collection = mocker.Mock()
+    store.get_all_documents_generator = mocker.Mock(return_value=iter([]))
+    # Test
+    documents = store.query_by_embedding(np.ones(2), filters={"lesson": ["unknown"]})
+    # Check
+    assert documents == []
+    assert store.collection.search.call_count == 0
+
+
+def test_milvus_quantized_index_params(mocker):
+    # Ensure the IVF clusters of the Milvus index and the clusters searched are configurable.
+    init = mocker.patch.object(FilteredMilvusDocumentStore, "__init__", return_value=None)
+    # Test
+    QuantizedMilvusDocumentStore("pq", pq_subvectors=48, nlist=256, nprobe=32, index="test")
+    # Check
+    init.assert_called_once_with(
+        index_type="IVF_PQ",
+        index_param={"nlist": 256, "m": 48, "nbits": 8},
+        search_param={"nprobe": 32},
+        index="test",
+    )
+
+
+def test_datastore_milvus_reduced_dim(settings):
+    # Ensure dimensionality reduction is rejected by the Milvus backend.
+    settings.VECTOR_QUANTIZATION = "int8"
+    settings.VECTOR_REDUCED_DIM = 256
+    # Test
+    with pytest.raises(ShoshinException):
+        DocumentStore()
+
+
+def test_datastore_unknown_backend(settings):
+    # Ensure an unknown backend is reported.
+    settings.DOCUMENT_STORE_BACKEND = "unknown"
+    # Test
+    with pytest.raises(ShoshinException):
+        DocumentStore()
+
+
+def test_datastore_local_embedding_backend(settings, tmp_path, mocker):
+    # Ensure the local backend embeds on CPU with the configured model, batch size and threads.
+    settings.DOCUMENT_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = str(tmp_path)
+    settings.EMBEDDING_BACKEND = "local"
+    settings.LOCAL_EMBEDDING_THREADS = 2
+    retriever = mocker.patch("shoshin.datastore.documents.CachedEmbeddingRetriever")
+    set_num_threads = mocker.patch("torch.set_num_threads")
+    # Test
+    ds = DocumentStore()
+    # Check
+    assert ds._store.embedding_dim == 384
+    set_num_threads.assert_called_once_with(2)
+    options = retriever.call_args.kwargs
+    assert options["embedding_model"] == "sentence-transformers/all-MiniLM-L6-v2"
+    assert options["model_format"] == "sentence_transformers"
+    assert options["use_gpu"] is False
+    assert options["batch_size"] == 32
+    assert options["cache"].dim == 384
+    assert "engine" not in options
+
+
+def test_embedding_model(settings):
+    # Ensure the embedding dimension matches the model of the selected backend.
+    assert embedding_model() == (c.EMBEDDING_MODEL, c.EMBEDDING_DIM)
+    settings.EMBEDDING_BACKEND = "local"
+    settings.LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+    assert embedding_model() == ("sentence-transformers/all-mpnet-base-v2", 768)
+    settings.LOCAL_EMBEDDING_MODEL = "my-org/my-model"
+    settings.LOCAL_EMBEDDING_DIM = 512
+    assert embedding_model() == ("my-org/my-model", 512)
+
+
+def test_embedding_model_unknown(settings):
+    # Ensure unknown backends and local models without a known dimension are reported.
+    settings.EMBEDDING_BACKEND = "local"
+    settings.LOCAL_EMBEDDING_MODEL = "my-org/my-model"
+    with pytest.raises(ShoshinException):
+        embedding_model()
+    settings.EMBEDDING_BACKEND = "unknown"
+    with pytest.raises(ShoshinException):
+        embedding_model()
+
+
+def test_datastore_milvus_requires_database_url(settings):
+    # Ensure the Milvus backend requires a database URL.
+    settings.DATABASE_URL = None
+    # Test
+    with pytest.raises(ShoshinException):
+        DocumentStore()
+
+
+def test_datastore_hybrid_retrieval(settings, document_store_mock):
+    # Ensure the hybrid retriever is used when enabled in settings.
+    settings.RETRIEVAL_MODE = "hybrid"
+    # Test
+    ds = DocumentStore()
+    # Check
+    assert isinstance(ds.retriever, HybridRetriever)
+    assert ds.retriever.embedding_retriever is ds._retriever
+    assert ds.retriever.lexical_index is ds.lexical_index
+
+
+def test_datastore_unknown_retrieval_mode(settings, document_store_mock):
+    # Ensure an unknown retrieval mode is reported.
+    settings.RETRIEVAL_MODE = "unknown"
+    # Test
+    with pytest.raises(ShoshinException):
+        DocumentStore()
+
+
+def test_datastore_create_embeddings_lexical_index(document_store_mock, document):
+    # Ensure loaded documents are indexed and saved in the lexical index.
+    ds = document_store_mock
+    # Test
+    ds.create_embeddings([document])
+    # Check
+    assert len(LexicalIndex.for_index(ds._index)) == 1
+    assert ds.lexical_index.search("test content", top_k=1)[0][0] == document.id
+
+
+def test_datastore_create_embeddings_incremental_lexical_index(document_store_mock, document):
+    # Ensure stale documents are removed from the lexical index.
+    ds = document_store_mock
+    document.meta["name"] = "lesson01.txt"
+    stale = Document(content="Removed from the lesson", meta={"name": "lesson01.txt", "vector_id": "2"})
+    ds.lexical_index.add([stale])
+    ds._store.get_documents_by_id.return_value = []
+    ds._store.get_all_documents_generator.return_value = iter([stale])
+    # Test
+    ds.create_embeddings([document], incremental=True)
+    # Check
+    assert ds.lexical_index.search("removed", top_k=1) == []
+    assert ds.lexical_index.search("test", top_k=1)[0][0] == document.id
+
+
+def _embed(documents):
+    return np.array([[float(len(doc.content)), 1.0] for doc in documents])
+
+
+def test_datastore_write_embeddings(document_store_mock):
+    # Ensure batches are embedded and written with their vectors, without reading them back.
+    ds = document_store_mock
+    ds._retriever.embed_documents.side_effect = _embed
+    batches = [[Document(content="First"), Document(content="Second")], [Document(content="Third")]]
+    # Test
+    report = ds.write_embeddings(iter(batches))
+    # Check
+    assert report == EmbeddingsReport(skipped=0, embedded=3, deleted=0)
+    assert ds._store.write_documents.call_count == 2
+    assert ds._store.update_embeddings.call_count == 0
+    written = ds._store.write_documents.call_args_list[0].args[0]
+    assert [doc.content for doc in written] == ["First", "Second"]
+    np.testing.assert_array_equal(written[0].embedding, [5.0, 1.0])
+    ds._store.write_documents.assert_called_with(batches[1], batch_size=500, duplicate_documents="overwrite")
+    assert len(ds.lexical_index) == 3
+
+
+def test_datastore_write_embeddings_incremental(document_store_mock, document):
+    # Ensure only new documents of each batch are embedded, and stale documents are deleted.
+    ds = document_store_mock
+    ds._retriever.embed_documents.side_effect = _embed
+    document.meta["name"] = "lesson01.txt"
+    embedded = Document(content="Already embedded", meta={"name": "lesson01.txt", "vector_id": "1"})
+    stale = Document(content="Removed from the lesson", meta={"name": "lesson01.txt", "vector_id": "2"})
+    ds._store.get_documents_by_id.return_value = [embedded]
+    ds._store.get_all_documents_generator.return_value = iter([embedded, stale])
+    # Test
+    report = ds.write_embeddings([[document, embedded]], incremental=True)
+    # Check
+    assert report == EmbeddingsReport(skipped=1, embedded=1, deleted=1)
+    ds._retriever.embed_documents.assert_called_once_with([document])
+    ds._store.delete_documents.assert_called_with(ids=[stale.id])
+    ds._store.write_documents.assert_called_with([document], batch_size=500, duplicate_documents="overwrite")
+
+
+def test_datastore_write_embeddings_error(document_store_mock, document):
+    # Ensure OpenAI errors are wrapped, and nothing is written.
+    ds = document_store_mock
+    ds._retriever.embed_documents.side_effect = OpenAIError("OpenAI returned an error.", status_code=500)
+    # Test
+    with pytest.raises(AIError):
+        ds.write_embeddings([[document]])
+    # Check
+    assert ds._store.write_documents.call_count == 0
+
+
+def test_datastore_write_embeddings_embedded_store(settings, tmp_path, mocker):
+    # Ensure written embeddings can be searched right away.
+    settings.DOCUMENT_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = str(tmp_path)
+    retriever = mocker.patch("shoshin.datastore.documents.CachedEmbeddingRetriever").return_value
+    retriever.embed_documents.side_effect = lambda docs: np.eye(c.EMBEDDING_DIM)[: len(docs)]
+    ds = DocumentStore()
+    documents = [Document(content="First"), Document(content="Second")]
+    # Test
+    ds.write_embeddings([documents])
+    # Check
+    results = ds._store.query_by_embedding(np.eye(c.EMBEDDING_DIM)[1], top_k=1)
+    assert results[0].content == "Second"
+
+
+def test_datastore_acreate_embeddings_embedded_store(settings, tmp_path, mocker):
+    # Ensure embeddings created from the event loop are written, and skipped when unchanged.
+    settings.DOCUMENT_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = str(tmp_path)
+    retriever = mocker.patch("shoshin.datastore.documents.CachedEmbeddingRetriever").return_value
+    retriever.aembed_documents = mocker.AsyncMock(
+        side_effect=lambda docs, session: np.eye(c.EMBEDDING_DIM)[: len(docs)]
+    )
+    ds = DocumentStore()
+    documents = [Document(content="First"), Document(content="Second")]
+    # Test
+    report = asyncio.run(ds.acreate_embeddings(documents, incremental=True))
+    unchanged = asyncio.run(ds.acreate_embeddings(documents, incremental=True))
+    # Check
+    assert report == EmbeddingsReport(embedded=2)
+    assert unchanged == EmbeddingsReport(skipped=2)
+    assert retriever.aembed_documents.call_count == 1
+    results = ds._store.query_by_embedding(np.eye(c.EMBEDDING_DIM)[1], top_k=1)
+    assert results[0].content == "Second"
+
+
+def test_datastore_write_embeddings_incremental_same_names(settings, tmp_path, mocker):
+    # Ensure files with the same name in different folders don't remove the chunks of each other.
+    settings.DOCUMENT_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = str(tmp_path)
+    retriever = mocker.patch("shoshin.datastore.documents.CachedEmbeddingRetriever").return_value
+    retriever.embed_documents.side_effect = lambda docs: np.eye(c.EMBEDDING_DIM)[: len(docs)]
+    ds = DocumentStore()
+    batches = [
+        [Document(content=f"Lesson of {folder}", meta={"name": "lesson01.txt", "path": f"{folder}/lesson01.txt"})]
+        for folder in ("a", "b")
+    ]
+    # Test
+    report = ds.write_embeddings(batches, incremental=True)
+    reloaded = ds.write_embeddings(batches, incremental=True)
+    # Check
+    assert report == EmbeddingsReport(embedded=2)
+    assert reloaded == EmbeddingsReport(skipped=2)
+    contents = sorted(doc.content for doc in ds._store.get_all_documents())
+    assert contents == ["Lesson of a", "Lesson of b"]
+
+
+def test_datastore_write_embeddings_incremental_legacy_chunks(settings, tmp_path, mocker):
+    # Ensure chunks stored without the path of their transcription are still replaced, by name.
+    settings.DOCUMENT_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = str(tmp_path)
+    retriever = mocker.patch("shoshin.datastore.documents.CachedEmbeddingRetriever").return_value
+    retriever.embed_documents.side_effect = lambda docs: np.eye(c.EMBEDDING_DIM)[: len(docs)]
+    ds = DocumentStore()
+    legacy = Document(content="Old lesson", meta={"name": "lesson01.txt"})
+    other = Document(content="Other lesson", meta={"name": "lesson01.txt", "path": "b/lesson01.txt"})
+    ds.write_embeddings([[legacy], [other]])
+    edited = Document(content="New lesson", meta={"name": "lesson01.txt", "path": "a/lesson01.txt"})
+    # Test
+    report = ds.write_embeddings([[edited]], incremental=True)
+    # Check
+    assert report == EmbeddingsReport(embedded=1, deleted=1)
+    contents = sorted(doc.content for doc in ds._store.get_all_documents())
+    assert contents == ["New lesson", "Other lesson"]
+
+
+def test_datastore_write_embeddings_on_batch(document_store_mock):
+    # Ensure the callback receives each batch once it's written.
+    ds = document_store_mock
+    ds._retriever.embed_documents.side_effect = _embed
+    batches = [[Document(content="First")], [Document(content="Second")]]
+    written = []
+
+    def on_batch(documents):
+        written.append(([doc.content for doc in documents], ds._store.write_documents.call_count))
+
+    # Test
+    ds.write_embeddings(batches, on_batch=on_batch)
+    # Check
+    assert [contents for contents, _ in written] == [["First"], ["Second"]]
+    assert all(writes >= position for position, (_, writes) in enumerate(written, start=1))
+
+
+def test_checkpoint_defers_saves(mocker):
+    # Ensure the lexical index is saved again only after a multiple of the last save duration.
+    save = mocker.Mock(side_effect=lambda: time.sleep(0.01))
+    reported = []
+    checkpoint = _Checkpoint(save, reported.append, ratio=1000.0)
+    # Test
+    checkpoint.add(["first"])
+    checkpoint.add(["second"])
+    checkpoint.add(["third"])
+    deferred = list(reported)
+    checkpoint.flush()
+    # Check
+    assert deferred == [["first"]]
+    assert reported == [["first"], ["second"], ["third"]]
+    assert save.call_count == 2
@@ -0,0 +1,285 @@
+import numpy as np
+import pytest
+from haystack.schema import Document
+
+from shoshin.datastore.embedded import EmbeddedDocumentStore, IVFIndex
+
+
+def _documents():
+    return [
+        Document(content="Zen meditation", meta={"name": "lesson01.txt"}, embedding=np.array([1.0, 0.0, 0.0])),
+        Document(content="Breathing", meta={"name": "lesson01.txt"}, embedding=np.array([0.8, 0.6, 0.0])),
+        Document(content="Posture", meta={"name": "lesson02.txt"}, embedding=np.array([0.0, 1.0, 0.0])),
+        Document(content="Not embedded yet", meta={"name": "lesson02.txt"}),
+    ]
+
+
+@pytest.fixture(scope="function")
+def store(tmp_path):
+    store = EmbeddedDocumentStore(str(tmp_path / "documents"), embedding_dim=3)
+    store.write_documents(_documents())
+    yield store
+
+
+def test_embedded_store_query_by_embedding(store):
+    # Ensure the most similar documents are returned, sorted by score.
+    # Test
+    results = store.query_by_embedding(np.array([1.0, 0.0, 0.0]), top_k=2, scale_score=False)
+    # Check
+    assert [doc.content for doc in results] == ["Zen meditation", "Breathing"]
+    assert [doc.score for doc in results] == pytest.approx([1.0, 0.8])
+    assert all(doc.embedding is None for doc in results)
+
+
+def test_embedded_store_query_by_embedding_filters(store):
+    # Ensure filters are applied before scoring.
+    # Test
+    results = store.query_by_embedding(np.array([1.0, 0.0, 0.0]), filters={"name": ["lesson02.txt"]}, top_k=5)
+    # Check
+    assert [doc.content for doc in results] == ["Posture"]
+
+
+def test_embedded_store_query_by_embedding_batch(store):
+    # Ensure a batch of queries returns the same documents as one query at a time.
+    queries = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.6, 0.8, 0.0]])
+    # Test
+    results = store.query_by_embedding_batch(queries, top_k=2)
+    # Check
+    expected = [store.query_by_embedding(query, top_k=2) for query in queries]
+    assert [[doc.content for doc in docs] for docs in results] == [[doc.content for doc in docs] for docs in expected]
+    assert [[doc.score for doc in docs] for docs in results] == [[doc.score for doc in docs] for docs in expected]
+
+
+def test_embedded_store_query_by_embedding_batch_filters(store):
+    # Ensure filters still apply to each query of a batch.
+    # Test
+    results = store.query_by_embedding_batch([np.array([1.0, 0.0, 0.0])] * 2, filters={"name": ["lesson02.txt"]})
+    # Check
+    assert [[doc.content for doc in docs] for docs in results] == [["Posture"], ["Posture"]]
+
+
+def test_embedded_store_query_by_embedding_partitions(tmp_path, mocker):
+    # Ensure filters on course and lesson select their rows without reading the documents.
+    store = EmbeddedDocumentStore(str(tmp_path), embedding_dim=2)
+    store.write_documents(
+        [
+            Document(content=f"{lesson} {i}", meta={"course": "zen", "lesson": lesson}, embedding=np.array([1.0, i]))
+            for lesson in ("lesson02", "lesson01")
+            for i in range(3)
+        ]
+        + [Document(content="Other course", meta={"course": "tea", "lesson": "lesson01"}, embedding=np.ones(2))]
+    )
+    get_all_documents = mocker.spy(store, "get_all_documents")
+    # Test
+    results = store.query_by_embedding(np.array([1.0, 1.0]), filters={"course": "zen", "lesson": ["lesson01"]})
+    # Check
+    assert [doc.content for doc in results] == ["lesson01 2", "lesson01 1", "lesson01 0"]
+    assert get_all_documents.call_count == 0
+    # Rows of a partition are contiguous
+    assert list(store._partitions[store.index]["course"]["zen"]) == list(range(1, 7))
+    assert list(store._partitions[store.index]["lesson"]["lesson01"]) == [0, 1, 2, 3]
+
+
+def test_embedded_store_query_by_embedding_empty(tmp_path):
+    # Ensure an empty index returns no documents.
+    store = EmbeddedDocumentStore(str(tmp_path), embedding_dim=3)
+    # Test
+    results = store.query_by_embedding(np.array([1.0, 0.0, 0.0]))
+    # Check
+    assert results == []
+
+
+def test_embedded_store_persistence(store):
+    # Ensure documents and embeddings are loaded back from the store folder.
+    # Test
+    reloaded = EmbeddedDocumentStore(store.path, embedding_dim=3)
+    # Check
+    assert reloaded.get_document_count() == 4
+    assert isinstance(reloaded._matrices["document"], np.memmap)
+    results = reloaded.query_by_embedding(np.array([0.0, 1.0, 0.0]), top_k=1)
+    assert results[0].content == "Posture"
+
+
+def test_embedded_store_write_appends(store, mocker):
+    # Ensure written batches are appended to the index files, instead of rewriting them.
+    documents_file = f"{store.path}/document/documents.jsonl"
+    with open(documents_file) as f:
+        previous = f.read()
+    save = mocker.spy(store, "_save")
+    # Test
+    store.write_documents([Document(content="Walking", embedding=np.array([0.0, 0.0, 1.0]))])
+    # Check
+    assert save.call_count == 0
+    with open(documents_file) as f:
+        assert f.read().startswith(previous)
+    results = store.query_by_embedding(np.array([0.0, 0.0, 1.0]), top_k=1)
+    assert results[0].content == "Walking"
+    reloaded = EmbeddedDocumentStore(store.path, embedding_dim=3)
+    assert reloaded.get_document_count() == 5
+    assert reloaded.query_by_embedding(np.array([0.0, 0.0, 1.0]), top_k=1)[0].content == "Walking"
+
+
+def test_embedded_store_overwrite_stale_rows(store):
+    # Ensure overwritten documents are only found with their latest embedding, before and after reload.
+    posture = store.get_all_documents(filters={"name": ["lesson02.txt"]})[0]
+    posture = Document(content=posture.content, meta=posture.meta, embedding=np.array([0.0, 0.0, 1.0]))
+    # Test
+    store.write_documents([posture], duplicate_documents="overwrite")
+    # Check
+    for search in (store, EmbeddedDocumentStore(store.path, embedding_dim=3)):
+        results = search.query_by_embedding(np.array([0.0, 1.0, 0.0]), top_k=5, scale_score=False)
+        assert [doc.content for doc in results].count("Posture") == 1
+        filtered = search.query_by_embedding(
+            np.array([0.0, 1.0, 0.0]), filters={"name": ["lesson02.txt"]}, return_embedding=True
+        )
+        assert [doc.content for doc in filtered] == ["Posture"]
+        np.testing.assert_array_equal(filtered[0].embedding, [0.0, 0.0, 1.0])
+        batch = search.query_by_embedding_batch([np.array([0.0, 1.0, 0.0])], top_k=5)
+        assert [doc.content for doc in batch[0]] == [doc.content for doc in results]
+
+
+def test_embedded_store_compaction(tmp_path):
+    # Ensure the files are compacted when stale rows outnumber the stored documents.
+    store = EmbeddedDocumentStore(str(tmp_path), embedding_dim=2)
+    document = Document(content="Zen", embedding=np.array([1.0, 0.0]))
+    store.write_documents([document])
+    # Test
+    for i in range(3):
+        store.write_documents([Document(content="Zen", embedding=np.array([1.0, float(i)]))])
+    # Check
+    assert len(store._matrices["document"]) <= 2
+    assert store.get_document_count() == 1
+    np.testing.assert_array_equal(store.get_all_documents(return_embedding=True)[0].embedding, [1.0, 2.0])
+
+
+def test_embedded_store_get_documents_by_id_unknown(store):
+    # Ensure unknown IDs are skipped, so that new documents can be planned for incremental embeddings.
+    posture = store.query_by_embedding(np.array([0.0, 1.0, 0.0]), top_k=1)[0]
+    # Test
+    results = store.get_documents_by_id([posture.id, "unknown"])
+    # Check
+    assert [doc.content for doc in results] == ["Posture"]
+
+
+def test_embedded_store_delete_documents(store):
+    # Ensure deleted documents are removed from the search and from disk.
+    posture = store.query_by_embedding(np.array([0.0, 1.0, 0.0]), top_k=1)[0]
+    # Test
+    store.delete_documents(ids=[posture.id])
+    # Check
+    reloaded = EmbeddedDocumentStore(store.path, embedding_dim=3)
+    results = reloaded.query_by_embedding(np.array([0.0, 1.0, 0.0]), top_k=3)
+    assert "Posture" not in [doc.content for doc in results]
+    assert reloaded.get_document_count() == 3
+
+
+def test_embedded_store_delete_documents_appends(store, mocker):
+    # Ensure deletes are appended to the documents file instead of rewriting the index.
+    posture = store.query_by_embedding(np.array([0.0, 1.0, 0.0]), top_k=1)[0]
+    not_embedded = [doc for doc in store.get_all_documents() if doc.content == "Not embedded yet"][0]
+    save = mocker.spy(store, "_save")
+    # Test
+    store.delete_documents(ids=[posture.id, not_embedded.id])
+    # Check
+    assert save.call_count == 0
+    assert len(store._matrices["document"]) == 3
+    assert [doc.content for doc in store.query_by_embedding(np.array([0.0, 1.0, 0.0]), top_k=3)] == [
+        "Breathing",
+        "Zen meditation",
+    ]
+    reloaded = EmbeddedDocumentStore(store.path, embedding_dim=3)
+    assert sorted(doc.content for doc in reloaded.get_all_documents()) == ["Breathing", "Zen meditation"]
+    assert reloaded._rows["document"][2] is None
+
+
+def test_embedded_store_delete_documents_compaction(store):
+    # Ensure the files are compacted when deleted rows outnumber the stored documents.
+    zen = store.query_by_embedding(np.array([1.0, 0.0, 0.0]), top_k=1)[0]
+    # Test
+    store.delete_documents(filters={"name": ["lesson02.txt"]})
+    store.delete_documents(ids=[zen.id])
+    # Check
+    assert len(store._matrices["document"]) == 1
+    reloaded = EmbeddedDocumentStore(store.path, embedding_dim=3)
+    assert [doc.content for doc in reloaded.get_all_documents()] == ["Breathing"]
+
+
+def test_embedded_store_cosine_similarity(tmp_path):
+    # Ensure cosine similarity ignores the magnitude of embeddings.
+    store = EmbeddedDocumentStore(str(tmp_path), embedding_dim=2, similarity="cosine")
+    store.write_documents(
+        [
+            Document(content="long", embedding=np.array([10.0, 1.0])),
+            Document(content="aligned", embedding=np.array([0.5, 0.5])),
+        ]
+    )
+    # Test
+    results = store.query_by_embedding(np.array([1.0, 1.0]), top_k=1, scale_score=False)
+    # Check
+    assert results[0].content == "aligned"
+    assert results[0].score == pytest.approx(1.0)
+
+
+def test_embedded_store_ivf_search(tmp_path):
+    # Ensure the IVF search finds the nearest neighbor of well separated clusters.
+    rng = np.random.default_rng(0)
+    centers = np.eye(4, dtype=np.float32)
+    documents = [
+        Document(content=f"doc {i}", embedding=centers[i % 4] + rng.normal(scale=0.01, size=4)) for i in range(200)
+    ]
+    store = EmbeddedDocumentStore(str(tmp_path), embedding_dim=4, ann="ivf", nprobe=1, ivf_min_size=100)
+    store.write_documents(documents)
+    # Test
+    results = store.query_by_embedding(centers[2], top_k=5, scale_score=False)
+    # Check
+    assert "document" in store._ivf
+    assert len(results) == 5
+    assert all(int(doc.content.split()[1]) % 4 == 2 for doc in results)
+
+
+@pytest.mark.parametrize("quantization, reduced_dim", [("int8", None), ("pq", None), ("int8", 8)])
+def test_embedded_store_quantized_search(tmp_path, quantization, reduced_dim):
+    # Ensure quantized searches re-score candidates with full precision, returning the exact results.
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(8, 16)).astype(np.float32)
+    embeddings = centers[np.arange(400) % 8] + rng.normal(scale=0.1, size=(400, 16)).astype(np.float32)
+    documents = [Document(content=f"doc {i}", embedding=embedding) for i, embedding in enumerate(embeddings)]
+    exact = EmbeddedDocumentStore(str(tmp_path / "exact"), embedding_dim=16)
+    exact.write_documents(documents)
+    store = EmbeddedDocumentStore(
+        str(tmp_path / "quantized"),
+        embedding_dim=16,
+        quantization=quantization,
+        reduced_dim=reduced_dim,
+        pq_subvectors=4,
+    )
+    store.write_documents(documents)
+    # Test
+    results = store.query_by_embedding(centers[3], top_k=5, scale_score=False)
+    # Check
+    expected = exact.query_by_embedding(centers[3], top_k=5, scale_score=False)
+    assert "document" in store._quantized
+    assert [doc.id for doc in results] == [doc.id for doc in expected]
+    assert [doc.score for doc in results] == pytest.approx([doc.score for doc in expected])
+
+
+def test_embedded_store_invalid_quantization(tmp_path):
+    # Ensure unsupported quantizations are rejected.
+    with pytest.raises(ValueError):
+        EmbeddedDocumentStore(str(tmp_path), quantization="binary")
+
+
+def test_embedded_store_invalid_ann(tmp_path):
+    # Ensure unsupported search strategies are rejected.
+    with pytest.raises(ValueError):
+        EmbeddedDocumentStore(str(tmp_path), ann="hnsw")
+
+
+def test_ivf_index_candidates():
+    # Ensure only the rows of the closest clusters are candidates.
+    matrix = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.1, 0.9]], dtype=np.float32)
+    index = IVFIndex.build(matrix, n_lists=2)
+    # Test
+    candidates = index.candidates(np.array([1.0, 0.0], dtype=np.float32), nprobe=1)
+    # Check
+    assert list(candidates) == [0, 1]
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+import responses
+from haystack.errors import OpenAIError, OpenAIRateLimitError
+
+from benchmarks.stubs import fake_embedding
+from shoshin.ai.embeddings import (
+    OPENAI_EMBEDDINGS_URL,
+    EmbeddingEngine,
+    RateLimiter,
+    parse_duration,
+)
+from shoshin.aio import client_session
+
+
+def _count_words(text):
+    return len(text.split())
+
+
+def _embeddings_response(request, headers=None):
+    texts = json.loads(request.body)["input"]
+    data = [{"object": "embedding", "index": i, "embedding": [float(len(text)), 1.0]} for i, text in enumerate(texts)]
+    return (200, {"Content-Type": "application/json", **(headers or {})}, json.dumps({"data": data}))
+
+
+def test_parse_duration():
+    # Ensure rate limit reset durations are parsed.
+    assert parse_duration("1s") == 1.0
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration(None) == 0.0
+
+
+def test_rate_limiter_backoff():
+    # Ensure concurrency is halved on rate limits and grows back on success.
+    limiter = RateLimiter(8)
+    limiter.acquire(10)
+    start = time.monotonic()
+    limiter.release({"retry-after": "0.1"}, rate_limited=True)
+    assert limiter.concurrency == 4
+    # Test
+    limiter.acquire(10)
+    # Check
+    assert time.monotonic() - start >= 0.1
+    limiter.release({})
+    assert limiter.concurrency == 5
+
+
+def test_rate_limiter_exhausted_budget():
+    # Ensure requests wait for the limits reset when the budget is exhausted.
+    limiter = RateLimiter(8)
+    limiter.acquire(10)
+    start = time.monotonic()
+    limiter.release({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "100ms"})
+    # Test
+    limiter.acquire(10)
+    # Check
+    assert time.monotonic() - start >= 0.1
+
+
+def test_engine_batches():
+    # Ensure texts are packed in batches within the token budget.
+    engine = EmbeddingEngine("sk-test", batch_tokens=4, max_batch_size=2, count_tokens=_count_words)
+    # Test
+    batches = engine.batches(["a b", "c", "d e f", "g", "h", "i", "j k l m n"])
+    # Check
+    assert batches == [[0, 1], [2, 3], [4, 5], [6]]
+
+
+def test_engine_embed(server):
+    # Ensure embeddings are returned in the same order as the texts.
+    server.add_callback(responses.POST, OPENAI_EMBEDDINGS_URL, callback=_embeddings_response)
+    engine = EmbeddingEngine("sk-test", batch_tokens=1, max_concurrency=4, count_tokens=_count_words)
+    # Test
+    embeddings = engine.embed(["a", "bb", "ccc"])
+    # Check
+    assert len(server.calls) == 3
+    np.testing.assert_array_equal(embeddings[:, 0], [1.0, 2.0, 3.0])
+    assert server.calls[0].request.headers["Authorization"] == "Bearer sk-test"
+
+
+def test_engine_api_base(server, settings):
+    # Ensure requests are sent to settings OPENAI_API_BASE, e.g. a proxy or a local stub.
+    settings.OPENAI_API_BASE = "http://localhost:8080/v1"
+    server.add_callback(responses.POST, "http://localhost:8080/v1/embeddings", callback=_embeddings_response)
+    engine = EmbeddingEngine("sk-test", count_tokens=_count_words)
+    # Test
+    embeddings = engine.embed(["a"])
+    # Check
+    assert len(server.calls) == 1
+    assert embeddings.shape[0] == 1
+
+
+def test_engine_embed_rate_limited(server):
+    # Ensure rate limited requests are retried after the limits reset.
+    calls = {"count": 0}
+
+    def callback(request):
+        calls["count"] += 1
+        if calls["count"] == 1:
+            return (429, {"x-ratelimit-reset-tokens": "100ms"}, json.dumps({"error": {"message": "Rate limit"}}))
+        return _embeddings_response(request, {"x-ratelimit-remaining-requests": "10"})
+
+    server.add_callback(responses.POST, OPENAI_EMBEDDINGS_URL, callback=callback)
+    engine = EmbeddingEngine("sk-test", max_concurrency=2, count_tokens=_count_words)
+    start = time.monotonic()
+    # Test
+    embeddings = engine.embed(["a", "bb"])
+    # Check
+    assert calls["count"] == 2
+    assert embeddings.shape == (2, 2)
+    assert time.monotonic() - start >= 0.1
+    assert engine.limiter.concurrency == 2
+
+
+def test_engine_embed_rate_limit_exhausted(server):
+    # Ensure an error is raised if requests are still rate limited after all retries.
+    server.add(
+        responses.POST,
+        OPENAI_EMBEDDINGS_URL,
+        json={"error": {"message": "Rate limit"}},
+        headers={"retry-after": "0.01"},
+        status=429,
+    )
+    engine = EmbeddingEngine("sk-test", max_retries=2, count_tokens=_count_words)
+    # Test
+    with pytest.raises(OpenAIRateLimitError):
+        engine.embed(["a"])
+    # Check
+    assert len(server.calls) == 3
+
+
+def test_engine_embed_error(server):
+    # Ensure API errors are raised as Haystack OpenAIError.
+    server.add(responses.POST, OPENAI_EMBEDDINGS_URL, json={"error": {"message": "Bad request"}}, status=400)
+    engine = EmbeddingEngine("sk-test", count_tokens=_count_words)
+    # Test
+    with pytest.raises(OpenAIError) as e:
+        engine.embed(["a"])
+    # Check
+    assert e.value.status_code == 400
+
+
+def test_engine_aembed(openai_stub):
+    # Ensure async embeddings are returned in the same order as the texts.
+    engine = EmbeddingEngine("sk-test", batch_tokens=1, max_concurrency=4, count_tokens=_count_words)
+    # Test
+    embeddings = asyncio.run(engine.aembed(["a", "bb", "ccc"]))
+    # Check
+    assert openai_stub.requests["/embeddings"] == 3
+    np.testing.assert_array_equal(embeddings, [fake_embedding(text, 2) for text in ["a", "bb", "ccc"]])
+
+
+def test_engine_aembed_coalesce(openai_stub):
+    # Ensure the texts of concurrent calls sharing a session are embedded with one request.
+    engine = EmbeddingEngine("sk-test", count_tokens=_count_words)
+    texts = ["a", "bb", "ccc"]
+
+    async def embed_all():
+        async with client_session() as session:
+            return await asyncio.gather(*(engine.aembed([text], session, coalesce=True) for text in texts))
+
+    # Test
+    results = asyncio.run(embed_all())
+    # Check
+    assert openai_stub.requests["/embeddings"] == 1
+    for text, embeddings in zip(texts, results):
+        np.testing.assert_array_equal(embeddings, [fake_embedding(text, 2)])
+
+
+def test_engine_aembed_coalesce_cancelled(openai_stub):
+    # Ensure the texts of a group are still embedded when the coroutine sending it is cancelled.
+    engine = EmbeddingEngine("sk-test", count_tokens=_count_words)
+
+    async def embed_all():
+        async with client_session() as session:
+            leader = asyncio.ensure_future(engine.aembed(["a"], session, coalesce=True))
+            followers = [asyncio.ensure_future(engine.aembed([text], session, coalesce=True)) for text in ("bb", "ccc")]
+            # Cancel the leader while it waits for the other coroutines to join its group
+            await asyncio.sleep(0)
+            leader.cancel()
+            return leader, await asyncio.wait_for(asyncio.gather(*followers), timeout=5)
+
+    # Test
+    leader, results = asyncio.run(embed_all())
+    # Check
+    assert leader.cancelled()
+    for text, embeddings in zip(["bb", "ccc"], results):
+        np.testing.assert_array_equal(embeddings, [fake_embedding(text, 2)])
+
+
+def test_engine_aembed_error(openai_stub):
+    # Ensure async API errors are raised as Haystack OpenAIError.
+    engine = EmbeddingEngine("sk-test", url=f"{openai_stub.base_url}/unknown", count_tokens=_count_words)
+    # Test
+    with pytest.raises(OpenAIError) as e:
+        asyncio.run(engine.aembed(["a"]))
+    # Check
+    assert e.value.status_code == 404
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from shoshin.datastore.documents import EmbeddingsReport
+from shoshin.exceptions import AIError, AudioExtractionError
+from shoshin.pipeline import processors
+from shoshin.pipeline.ingest import EMBED, EXTRACT, TRANSCRIBE, ingest
+from shoshin.pipeline.journal import EXTRACTED, TRANSCRIBED, Journal, embedded_stage
+
+
+def _touch(path, mtime=None):
+    path.write_bytes(b"0" * 10)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def stages(mocker):
+    """Mock the ingest stages: extraction and transcription write their outputs, preprocessing keeps documents."""
+
+    def extract(video_file, output_file):
+        if "broken" in video_file:
+            raise AudioExtractionError("invalid data")
+        open(output_file, "w").close()
+
+    def transcribe(audio_file, output_file, workers=None):
+        with open(output_file, "w") as f:
+            f.write(f"Transcription of {os.path.basename(audio_file)}")
+
+    def clean(documents, language, workers=None):
+        for document in documents:
+            yield [document]
+
+    mocker.patch("shoshin.pipeline.ingest.processors.extract_audio_from_video", side_effect=extract)
+    mocker.patch("shoshin.pipeline.ingest.processors.transcribe_speech_to_text", side_effect=transcribe)
+    mocker.patch("shoshin.pipeline.ingest.processors.clean_documents_stream", side_effect=clean)
+
+
+@pytest.fixture
+def store(mocker):
+    """A Document Store that records written documents and reports each batch."""
+    store = mocker.MagicMock(index="document", course=None)
+    store.written = []
+
+    def write_embeddings(batches, incremental=False, on_batch=None):
+        report = EmbeddingsReport()
+        for batch in batches:
+            store.written.extend(batch)
+            report.embedded += len(batch)
+            on_batch(batch)
+        return report
+
+    store.write_embeddings.side_effect = write_embeddings
+    return store
+
+
+def test_ingest(stages, store, tmp_path):
+    # Ensure videos go through all stages, and each stage reports its progress.
+    videos = [_touch(tmp_path / "lesson01.mp4"), _touch(tmp_path / "lesson02.mp4")]
+    events = []
+    # Test
+    report = ingest(
+        videos,
+        str(tmp_path / "out"),
+        store,
+        "en",
+        extract_workers=2,
+        on_progress=lambda progress, video, error: events.append((progress.name, video, error)),
+    )
+    # Check
+    assert sorted(doc.meta["name"] for doc in store.written) == ["lesson01.txt", "lesson02.txt"]
+    assert store.written[0].content.startswith("Transcription of lesson0")
+    assert os.path.exists(tmp_path / "out" / "audio" / "lesson01.mp3")
+    assert os.path.exists(tmp_path / "out" / "transcriptions" / "lesson02.txt")
+    assert report.embeddings.embedded == 2
+    for name in (EXTRACT, TRANSCRIBE, EMBED):
+        assert report.stages[name].completed == 2
+        assert sorted(video for stage, video, _ in events if stage == name) == videos
+
+
+def test_ingest_failed_video(stages, store, tmp_path):
+    # Ensure a video that fails to extract is reported, without stopping the other videos.
+    videos = [_touch(tmp_path / "broken.mp4"), _touch(tmp_path / "lesson01.mp4")]
+    errors = []
+    # Test
+    report = ingest(
+        videos,
+        str(tmp_path / "out"),
+        store,
+        "en",
+        on_progress=lambda progress, video, error: error and errors.append((progress.name, video)),
+    )
+    # Check
+    assert [doc.meta["name"] for doc in store.written] == ["lesson01.txt"]
+    assert report.stages[EXTRACT].failed == 1
+    assert report.stages[TRANSCRIBE].completed == 1
+    assert errors == [(EXTRACT, videos[0])]
+
+
+def test_ingest_journal(stages, store, tmp_path):
+    # Ensure completed stages are recorded in the journal.
+    video = _touch(tmp_path / "lesson01.mp4")
+    journal = Journal(str(tmp_path / "journal.db"))
+    # Test
+    ingest([video], str(tmp_path / "out"), store, "en", journal=journal)
+    # Check
+    assert journal.is_done(video, EXTRACTED)
+    assert journal.is_done(str(tmp_path / "out" / "audio" / "lesson01.mp3"), TRANSCRIBED)
+    assert journal.is_done(str(tmp_path / "out" / "transcriptions" / "lesson01.txt"), embedded_stage("document"))
+
+
+def test_ingest_resume(stages, store, tmp_path):
+    # Ensure a second run skips lessons already completed by all stages.
+    video = _touch(tmp_path / "lesson01.mp4", mtime=1000)
+    journal = Journal(str(tmp_path / "journal.db"))
+    ingest([video], str(tmp_path / "out"), store, "en", journal=journal)
+    store.written.clear()
+    # Test
+    report = ingest([video], str(tmp_path / "out"), store, "en", journal=journal)
+    # Check
+    assert store.written == []
+    assert report.stages[EXTRACT].skipped == 1
+    assert report.stages[TRANSCRIBE].skipped == 1
+    assert report.stages[EMBED].skipped == 1
+    assert processors.extract_audio_from_video.call_count == 1
+    assert processors.transcribe_speech_to_text.call_count == 1
+
+
+def test_ingest_embedding_error(stages, store, tmp_path):
+    # Ensure embedding errors stop the pipeline.
+    video = _touch(tmp_path / "lesson01.mp4")
+    store.write_embeddings.side_effect = AIError("rate limited")
+    # Test
+    with pytest.raises(AIError):
+        ingest([video], str(tmp_path / "out"), store, "en")
@@ -0,0 +1,78 @@
+import pytest
+
+from shoshin.pipeline.journal import (
+    EMBEDDED,
+    EXTRACTED,
+    JOURNAL_FILE,
+    Journal,
+    fingerprint,
+)
+
+
+@pytest.fixture(scope="function")
+def journal(tmp_path):
+    with Journal.for_folder(str(tmp_path)) as journal:
+        yield journal
+
+
+def test_journal_for_folder(journal, tmp_path):
+    # Ensure the journal is stored in the given folder.
+    assert journal.path == str(tmp_path / JOURNAL_FILE)
+    assert (tmp_path / JOURNAL_FILE).exists()
+
+
+def test_journal_mark_done(journal):
+    # Ensure completed stages are recorded per item and stage.
+    # Test
+    journal.mark_done("lesson01.mp4", EXTRACTED, "10:1000")
+    # Check
+    assert journal.is_done("lesson01.mp4", EXTRACTED)
+    assert journal.is_done("lesson01.mp4", EXTRACTED, "10:1000")
+    assert not journal.is_done("lesson01.mp4", EXTRACTED, "20:2000")
+    assert not journal.is_done("lesson01.mp4", EMBEDDED)
+    assert not journal.is_done("lesson02.mp4", EXTRACTED)
+    assert journal.count(EXTRACTED) == 1
+
+
+def test_journal_start(journal):
+    # Ensure started stages are interrupted until they complete.
+    # Test
+    journal.start("lesson01.mp4", EXTRACTED)
+    # Check
+    assert journal.is_interrupted("lesson01.mp4", EXTRACTED)
+    assert not journal.is_done("lesson01.mp4", EXTRACTED)
+    journal.mark_done("lesson01.mp4", EXTRACTED)
+    assert not journal.is_interrupted("lesson01.mp4", EXTRACTED)
+
+
+def test_journal_durable(journal):
+    # Ensure records are committed immediately and survive a new connection.
+    journal.mark_done("lesson01.mp4", EXTRACTED)
+    # Test
+    with Journal(journal.path) as reopened:
+        # Check
+        assert reopened.is_done("lesson01.mp4", EXTRACTED)
+
+
+def test_journal_reset(journal):
+    # Ensure stages can be forgotten one at a time or all together.
+    journal.mark_done("lesson01.mp4", EXTRACTED)
+    journal.mark_done("lesson01.txt", EMBEDDED)
+    # Test
+    assert journal.reset(EMBEDDED) == 1
+    # Check
+    assert journal.is_done("lesson01.mp4", EXTRACTED)
+    assert not journal.is_done("lesson01.txt", EMBEDDED)
+    assert journal.reset() == 1
+    assert journal.count(EXTRACTED) == 0
+
+
+def test_fingerprint(tmp_path):
+    # Ensure the fingerprint changes when the file is modified.
+    path = tmp_path / "lesson01.txt"
+    path.write_text("First version")
+    before = fingerprint(str(path))
+    # Test
+    path.write_text("Second, longer version")
+    # Check
+    assert fingerprint(str(path)) != before
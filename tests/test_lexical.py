@@ -0,0 +1,118 @@
+import pytest
+from haystack.schema import Document
+
+from shoshin.datastore.lexical import (
+    LexicalIndex,
+    is_confident,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+
+@pytest.fixture(scope="function")
+def documents():
+    return [
+        Document(content="Use git rebase to rewrite the history of a branch"),
+        Document(content="A branch is a movable pointer to a commit"),
+        Document(content="Merge a branch into the current branch"),
+    ]
+
+
+@pytest.fixture(scope="function")
+def index(tmp_path, documents):
+    index = LexicalIndex(str(tmp_path / "document.json"))
+    index.add(documents)
+    yield index
+
+
+def test_tokenize():
+    # Ensure identifiers, names and numbers are kept whole.
+    assert tokenize("Run `git_diff --stat` on Python 3.11!") == ["run", "git_diff", "stat", "on", "python", "3", "11"]
+
+
+def test_lexical_index_search(index, documents):
+    # Ensure documents with rare query terms rank first.
+    # Test
+    results = index.search("How does rebase work?", top_k=3)
+    # Check
+    assert [doc_id for doc_id, _ in results] == [documents[0].id]
+
+
+def test_lexical_index_search_ranking(index, documents):
+    # Ensure documents with more occurrences of a term rank higher.
+    # Test
+    results = index.search("branch", top_k=2)
+    # Check
+    assert results[0][0] == documents[2].id
+    assert len(results) == 2
+
+
+def test_lexical_index_search_ids(index, documents):
+    # Ensure only the given documents are ranked, with the scores they have in the whole index.
+    scores = dict(index.search("rebase branch", top_k=3))
+    # Test
+    results = index.search("rebase branch", top_k=1, ids={documents[1].id, documents[2].id})
+    # Check
+    assert results == [(documents[2].id, scores[documents[2].id])]
+    assert index.search("rebase branch", top_k=1, ids=set()) == []
+
+
+def test_lexical_index_search_empty(tmp_path):
+    # Ensure an empty index has no results.
+    index = LexicalIndex(str(tmp_path / "document.json"))
+    # Test
+    assert index.search("branch", top_k=10) == []
+
+
+def test_lexical_index_persistence(index, documents):
+    # Ensure the index is loaded back from its file.
+    index.save()
+    # Test
+    reloaded = LexicalIndex(index.path)
+    # Check
+    assert len(reloaded) == 3
+    assert reloaded.search("rebase", top_k=1) == index.search("rebase", top_k=1)
+
+
+def test_lexical_index_remove(index, documents):
+    # Ensure removed documents are not returned anymore.
+    # Test
+    index.remove([documents[0].id, "unknown"])
+    # Check
+    assert len(index) == 2
+    assert index.search("rebase", top_k=3) == []
+
+
+def test_lexical_index_add_replaces(index, documents):
+    # Ensure documents with the same ID are not indexed twice.
+    # Test
+    index.add(documents[:1])
+    # Check
+    assert len(index) == 3
+    assert index._total_length == sum(len(tokenize(doc.content)) for doc in documents)
+
+
+def test_is_confident():
+    # Ensure a match is confident when it clearly outranks the others.
+    assert is_confident([("a", 9.0), ("b", 2.0)], margin=3.0, min_score=1.0)
+    assert is_confident([("a", 3.0)], margin=3.0, min_score=1.0)
+    assert not is_confident([("a", 5.0), ("b", 2.0)], margin=3.0, min_score=1.0)
+    assert not is_confident([("a", 9.0), ("b", 2.0)], margin=None, min_score=1.0)
+    assert not is_confident([], margin=3.0, min_score=1.0)
+
+
+def test_is_confident_min_score():
+    # Ensure a single weak match, or a match among weak ones, is not confident.
+    assert not is_confident([("a", 2.0)], margin=3.0, min_score=1.0)
+    assert not is_confident([("a", 9.0), ("b", 0.1)], margin=3.0, min_score=5.0)
+    assert is_confident([("a", 16.0), ("b", 0.1)], margin=3.0, min_score=5.0)
+
+
+def test_reciprocal_rank_fusion():
+    # Ensure documents ranked high by both lists come first.
+    a, b, c = Document(content="a"), Document(content="b"), Document(content="c")
+    # Test
+    fused = reciprocal_rank_fusion([[a, b, c], [b, c]], top_k=2, k=60)
+    # Check
+    assert [doc.content for doc in fused] == ["b", "c"]
+    assert fused[0].score == pytest.approx(1 / 62 + 1 / 61)
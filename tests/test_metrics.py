@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from shoshin.metrics import Metrics
+
+
+@pytest.fixture
+def registry():
+    return Metrics()
+
+
+def test_span_nested(registry):
+    # Ensure spans are named after the spans they run in.
+    with registry.span("query"):
+        with registry.span("retrieve"):
+            with registry.span("embed_queries"):
+                pass
+        with registry.span("generate"):
+            pass
+    # Test
+    spans = registry.spans()
+    # Check
+    assert sorted(spans) == ["query", "query/generate", "query/retrieve", "query/retrieve/embed_queries"]
+    assert spans["query"].count == 1
+    assert spans["query"].total >= spans["query/retrieve"].total
+
+
+def test_span_aggregates(registry):
+    # Ensure durations of the same span are aggregated.
+    for _ in range(3):
+        with registry.span("pack"):
+            pass
+    # Test
+    stats = registry.spans()["pack"]
+    # Check
+    assert stats.count == 3
+    assert stats.min <= stats.mean <= stats.max
+    assert stats.total == pytest.approx(stats.mean * 3)
+
+
+def test_span_error(registry):
+    # Ensure spans are recorded even if the block raises.
+    with pytest.raises(ValueError):
+        with registry.span("query"):
+            raise ValueError("boom")
+    # Check
+    assert registry.spans()["query"].count == 1
+    with registry.span("retrieve"):
+        pass
+    assert "retrieve" in registry.spans()
+
+
+def test_span_threads(registry):
+    # Ensure spans of worker threads are recorded at the top level.
+    with registry.span("write_embeddings"):
+
+        def write_batch():
+            with registry.span("write_batch"):
+                pass
+
+        worker = threading.Thread(target=write_batch)
+        worker.start()
+        worker.join()
+    # Check
+    assert sorted(registry.spans()) == ["write_batch", "write_embeddings"]
+
+
+def test_span_tasks(registry):
+    # Ensure spans of concurrent asyncio tasks are named after the spans of their own task.
+    async def query(stage):
+        with registry.span("query"):
+            await asyncio.sleep(0)
+            with registry.span(stage):
+                await asyncio.sleep(0)
+
+    async def run():
+        await asyncio.gather(query("retrieve"), query("generate"))
+
+    # Test
+    asyncio.run(run())
+    # Check
+    assert sorted(registry.spans()) == ["query", "query/generate", "query/retrieve"]
+    assert registry.spans()["query"].count == 2
+
+
+def test_counters(registry):
+    # Ensure counters are incremented and reset.
+    registry.increment("openai.embeddings.requests")
+    registry.increment("openai.embeddings.tokens", 120)
+    registry.increment("openai.embeddings.tokens", 30)
+    # Check
+    assert registry.counters() == {"openai.embeddings.requests": 1, "openai.embeddings.tokens": 150}
+    registry.reset()
+    assert registry.counters() == {}
+    assert registry.spans() == {}
+
+
+def test_to_json(registry):
+    # Ensure metrics are exported as JSON.
+    with registry.span("query"):
+        registry.increment("answer_cache.hits")
+    # Test
+    data = json.loads(registry.to_json())
+    # Check
+    assert data["spans"]["query"]["count"] == 1
+    assert data["counters"] == {"answer_cache.hits": 1}
+
+
+def test_to_prometheus(registry):
+    # Ensure metrics are exported in the Prometheus text format.
+    with registry.span("query"):
+        with registry.span("retrieve"):
+            pass
+    registry.increment("openai.embeddings.tokens", 42)
+    # Test
+    text = registry.to_prometheus()
+    # Check
+    assert "# TYPE shoshin_span_seconds summary" in text
+    assert 'shoshin_span_seconds_count{span="query/retrieve"} 1' in text
+    assert 'shoshin_span_seconds_sum{span="query"}' in text
+    assert "# TYPE shoshin_openai_embeddings_tokens_total counter" in text
+    assert "shoshin_openai_embeddings_tokens_total 42" in text
+
+
+def test_breakdown(registry):
+    # Ensure the breakdown lists nested spans under their parent, followed by counters.
+    with registry.span("query"):
+        with registry.span("retrieve"):
+            pass
+    registry.increment("openai.chat.requests")
+    # Test
+    lines = registry.breakdown().splitlines()
+    # Check
+    assert lines[0].split()[:4] == ["span", "count", "total", "ms"]
+    assert lines[1].startswith("query ")
+    assert lines[2].startswith("  retrieve ")
+    assert lines[-1].split() == ["openai.chat.requests", "1"]
@@ -1,14 +1,32 @@
+import asyncio
+import io
+import json
+import wave
+
+import numpy as np
 import pytest
 import requests
 import responses
 from ffmpeg import Error as FFMpegError
+from haystack.schema import Document
 from openai import error
 
 from shoshin.exceptions import AIError, AudioExtractionError
 from shoshin.pipeline.processors import (
+    AudioChunk,
+    atranscribe_speech_to_text,
     clean_documents,
+    clean_documents_stream,
+    detect_silences,
     extract_audio_from_video,
+    find_transcriptions,
+    plan_chunks,
+    read_transcriptions,
+    split_audio_on_silence,
+    stream_audio_from_video,
+    transcribe_chunks,
     transcribe_speech_to_text,
+    transcribe_video_stream,
 )
 
 
@@ -62,6 +80,28 @@ def test_transcribe_speech_to_text(server, audio_file, output_file):
     assert output_file.read_text() == "Thanks for watching!"
 
 
+def test_transcribe_speech_to_text_cached(server, audio_file, output_file):
+    # Ensure unchanged audio is transcribed only once.
+    server.add(responses.POST, "https://api.openai.com/v1/audio/transcriptions", json={"text": "Thanks for watching!"})
+    transcribe_speech_to_text(audio_file, output_file)
+    # Test
+    transcribe_speech_to_text(audio_file, output_file)
+    # Check
+    assert len(server.calls) == 1
+    assert output_file.read_text() == "Thanks for watching!"
+
+
+def test_transcribe_speech_to_text_cache_disabled(server, settings, audio_file, output_file):
+    # Ensure the cache is not used if disabled.
+    settings.TRANSCRIPTION_CACHE = False
+    server.add(responses.POST, "https://api.openai.com/v1/audio/transcriptions", json={"text": "Thanks for watching!"})
+    transcribe_speech_to_text(audio_file, output_file)
+    # Test
+    transcribe_speech_to_text(audio_file, output_file)
+    # Check
+    assert len(server.calls) == 2
+
+
 def test_transcribe_speech_to_text_not_found(output_file):
     # Ensure transcribe_speech_to_text raises FileNotFound error if no audio file is found.
     with pytest.raises(FileNotFoundError):
@@ -206,6 +246,161 @@ def test_transcribe_speech_to_text_error_rate_limit(server, audio_file, output_f
     assert isinstance(e.value.original_exception, error.RateLimitError)
 
 
+def test_detect_silences(ffmpeg):
+    # Ensure silences are parsed from the `silencedetect` filter output.
+    ffmpeg.run.return_value = (
+        b"",
+        b"[silencedetect @ 0x1] silence_start: 10.5\n[silencedetect @ 0x1] silence_end: 11.5 | silence_duration: 1\n"
+        b"[silencedetect @ 0x1] silence_start: 20\n[silencedetect @ 0x1] silence_end: 22 | silence_duration: 2\n",
+    )
+    # Test
+    silences = detect_silences("audio.mp3")
+    # Check
+    assert silences == [(10.5, 11.5), (20.0, 22.0)]
+    ffmpeg.input().filter.assert_called_with("silencedetect", noise="-35dB", d=0.5)
+
+
+def test_plan_chunks_short_audio():
+    # Ensure audio shorter than the limit is not split.
+    assert plan_chunks(50.0, [(10.0, 11.0)], 60.0) == [(0.0, 50.0)]
+
+
+def test_plan_chunks_on_silence():
+    # Ensure audio is cut in the middle of the last silence before the limit.
+    silences = [(10.0, 11.0), (40.0, 42.0), (55.0, 57.0), (100.0, 102.0)]
+    # Test
+    chunks = plan_chunks(150.0, silences, 60.0)
+    # Check
+    assert chunks == [(0.0, 56.0), (56.0, 101.0), (101.0, 150.0)]
+
+
+def test_plan_chunks_without_silence():
+    # Ensure audio is cut at the limit if no silence is available.
+    assert plan_chunks(130.0, [], 60.0) == [(0.0, 60.0), (60.0, 120.0), (120.0, 130.0)]
+
+
+def test_split_audio_on_silence_small_file(ffmpeg, audio_file, tmp_path):
+    # Ensure files below the limit are not split.
+    chunks = split_audio_on_silence(str(audio_file), str(tmp_path))
+    # Check
+    assert chunks == [AudioChunk(str(audio_file), 0.0)]
+    assert ffmpeg.run.call_count == 0
+
+
+def test_split_audio_on_silence(ffmpeg, tmp_path):
+    # Ensure big files are split in chunks that fit the limit.
+    audio = tmp_path / "lesson.mp3"
+    audio.write_bytes(b"0" * 300)
+    ffmpeg.probe.return_value = {"format": {"duration": "300.0"}}
+    ffmpeg.run.return_value = (b"", b"silence_start: 80\nsilence_end: 82\n")
+    # Test
+    chunks = split_audio_on_silence(str(audio), str(tmp_path), max_size=100)
+    # Check
+    assert [chunk.offset for chunk in chunks] == [0.0, 81.0, 171.0, 261.0]
+    assert chunks[1].path == str(tmp_path / "lesson.0001.mp3")
+    ffmpeg.input.assert_called_with(str(audio), ss=261.0, t=39.0)
+
+
+def test_transcribe_chunks_in_order(server, tmp_path):
+    # Ensure chunks are transcribed concurrently and returned in playback order.
+    def callback(request):
+        text = "first" if b"chunk-0" in request.body else "second"
+        return (200, {"Content-Type": "application/json"}, json.dumps({"text": text}))
+
+    server.add_callback(responses.POST, "https://api.openai.com/v1/audio/transcriptions", callback=callback)
+    chunks = []
+    for i, offset in enumerate([0.0, 81.0]):
+        path = tmp_path / f"chunk-{i}.mp3"
+        path.write_bytes(f"chunk-{i}".encode())
+        chunks.append(AudioChunk(str(path), offset))
+    # Test
+    segments = transcribe_chunks(chunks, workers=2)
+    # Check
+    assert [(segment.offset, segment.text) for segment in segments] == [(0.0, "first"), (81.0, "second")]
+
+
+def test_transcribe_speech_to_text_chunked(server, mocker, tmp_path, output_file):
+    # Ensure chunked transcriptions are joined in the output file.
+    chunks = []
+    for i in range(2):
+        path = tmp_path / f"chunk-{i}.mp3"
+        path.write_bytes(f"chunk-{i}".encode())
+        chunks.append(AudioChunk(str(path), i * 60.0))
+    mocker.patch("shoshin.pipeline.processors.split_audio_on_silence", return_value=chunks)
+    server.add(responses.POST, "https://api.openai.com/v1/audio/transcriptions", json={"text": " Hello. "})
+    server.add(responses.POST, "https://api.openai.com/v1/audio/transcriptions", json={"text": "Hello."})
+    # Test
+    segments = transcribe_speech_to_text("lesson.mp3", output_file)
+    # Check
+    assert len(segments) == 2
+    assert output_file.read_text() == "Hello. Hello."
+
+
+def test_atranscribe_speech_to_text(openai_stub, mocker, tmp_path, output_file):
+    # Ensure chunks are transcribed from the event loop and joined in playback order.
+    chunks = []
+    for i in range(2):
+        path = tmp_path / f"chunk-{i}.mp3"
+        path.write_bytes(b"x" * (i + 1) * 1000)
+        chunks.append(AudioChunk(str(path), i * 60.0))
+    mocker.patch("shoshin.pipeline.processors.split_audio_on_silence", return_value=chunks)
+    # Test
+    segments = asyncio.run(atranscribe_speech_to_text("lesson.mp3", output_file, workers=2))
+    # Check
+    assert openai_stub.requests["/audio/transcriptions"] == 2
+    assert [segment.offset for segment in segments] == [0.0, 60.0]
+    assert segments[0].text != segments[1].text
+    assert output_file.read_text() == f"{segments[0].text} {segments[1].text}"
+
+
+def _ffmpeg_process(ffmpeg, samples, returncode=0):
+    process = ffmpeg.run_async.return_value
+    process.stdout = io.BytesIO(samples.astype(np.int16).tobytes())
+    process.stderr = io.BytesIO(b"ffmpeg log")
+    process.returncode = returncode
+    return process
+
+
+def _wav_duration(chunk):
+    with wave.open(chunk, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def test_stream_audio_from_video(ffmpeg):
+    # Ensure audio is streamed in chunks that are cut on the quietest point.
+    samples = np.full(16000 * 2 + 8000, 1000)
+    samples[11200:12800] = 0
+    _ffmpeg_process(ffmpeg, samples)
+    # Test
+    chunks = list(stream_audio_from_video("video.mp4", chunk_duration=1, read_size=4096))
+    # Check
+    assert [offset for offset, _ in chunks] == [0.0, 0.75, 1.7]
+    assert [_wav_duration(chunk) for _, chunk in chunks] == [0.75, 0.95, 0.8]
+    assert chunks[0][1].name == "video.0000.wav"
+    ffmpeg.output.assert_called_with(ffmpeg.input().audio, "pipe:", format="s16le", acodec="pcm_s16le", ac=1, ar=16000)
+
+
+def test_stream_audio_from_video_exception(ffmpeg):
+    # Ensure ffmpeg failures are raised when the stream ends.
+    _ffmpeg_process(ffmpeg, np.zeros(100), returncode=1)
+    # Test
+    with pytest.raises(AudioExtractionError) as e:
+        list(stream_audio_from_video("video.mp4"))
+    # Check
+    assert e.value.original_exception.stderr == b"ffmpeg log"
+
+
+def test_transcribe_video_stream(ffmpeg, server, output_file):
+    # Ensure streamed chunks are transcribed and joined in order.
+    _ffmpeg_process(ffmpeg, np.zeros(16000 * 3))
+    server.add(responses.POST, "https://api.openai.com/v1/audio/transcriptions", json={"text": "Hello."})
+    # Test
+    segments = transcribe_video_stream("video.mp4", output_file, workers=1)
+    # Check
+    assert [segment.offset for segment in segments] == [0.0]
+    assert output_file.read_text() == "Hello."
+
+
 def test_clean_documents_success(document):
     # Ensure clean_documents returns a list of cleaned Documents
     document.content = "   This is an uncleaned statement. \n\n"
@@ -234,3 +429,58 @@ def test_clean_documents_split(document):
     assert len(documents) == 2
     assert documents[0].meta["_split_id"] == 0
     assert documents[1].meta["_split_id"] == 1
+
+
+def test_read_transcriptions(tmp_path):
+    # Ensure transcriptions are read from the folder and its subfolders, with their file name.
+    (tmp_path / "course").mkdir()
+    (tmp_path / "lesson01.txt").write_text("First lesson")
+    (tmp_path / "course" / "lesson02.txt").write_text("Second lesson")
+    (tmp_path / "notes.md").write_text("Not a transcription")
+    # Test
+    documents = list(read_transcriptions(find_transcriptions(str(tmp_path))))
+    # Check
+    assert [(doc.content, doc.meta["name"]) for doc in documents] == [
+        ("Second lesson", "lesson02.txt"),
+        ("First lesson", "lesson01.txt"),
+    ]
+
+
+def test_read_transcriptions_course(tmp_path):
+    # Ensure transcriptions are tagged with their course and lesson.
+    (tmp_path / "lesson01.txt").write_text("First lesson")
+    # Test
+    documents = list(read_transcriptions(find_transcriptions(str(tmp_path)), course="Zen 101"))
+    # Check
+    assert documents[0].meta == {
+        "name": "lesson01.txt",
+        "lesson": "lesson01",
+        "path": str(tmp_path / "lesson01.txt"),
+        "course": "Zen 101",
+    }
+
+
+def test_clean_documents_stream_batches(mocker):
+    # Ensure chunks are yielded in order, in batches that never split a document.
+    preprocessor = mocker.patch("haystack.nodes.PreProcessor").return_value
+    preprocessor.process.side_effect = lambda docs: [
+        Document(content=f"{doc.content} {i}") for doc in docs for i in range(3)
+    ]
+    mocker.patch.dict("shoshin.pipeline.processors._PREPROCESSORS", clear=True)
+    documents = (Document(content=f"doc{i}") for i in range(3))
+    # Test
+    batches = list(clean_documents_stream(documents, "en", workers=1, batch_size=4, files_per_task=1))
+    # Check
+    assert [len(batch) for batch in batches] == [6, 3]
+    assert [doc.content for doc in batches[1]] == ["doc2 0", "doc2 1", "doc2 2"]
+    assert preprocessor.process.call_count == 3
+
+
+def test_clean_documents_stream_workers(document):
+    # Ensure documents are preprocessed in worker processes like clean_documents does.
+    document.content = "   This is an uncleaned statement. \n\n"
+    # Test
+    batches = list(clean_documents_stream([document], "en", workers=2))
+    # Check
+    assert len(batches) == 1
+    assert [doc.content for doc in batches[0]] == ["This is an uncleaned statement."]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from haystack.schema import Document
+
+from shoshin.datastore.quantization import (
+    ProductQuantizer,
+    Projection,
+    QuantizedIndex,
+    ScalarQuantizer,
+    rescore,
+)
+
+
+@pytest.fixture(scope="function")
+def matrix():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(16, 32)).astype(np.float32)
+    return centers[np.arange(1000) % 16] + rng.normal(scale=0.1, size=(1000, 32)).astype(np.float32)
+
+
+def test_scalar_quantizer(matrix):
+    # Ensure int8 codes approximate dot products closely.
+    quantizer = ScalarQuantizer.fit(matrix)
+    query = matrix[0]
+    # Test
+    codes = quantizer.encode(matrix)
+    scores = quantizer.scores(codes, query)
+    # Check
+    assert codes.dtype == np.int8
+    np.testing.assert_allclose(scores, matrix @ query, rtol=0.05, atol=0.5)
+
+
+def test_product_quantizer(matrix):
+    # Ensure each embedding is encoded with one byte per subvector.
+    quantizer = ProductQuantizer.fit(matrix, subvectors=8)
+    # Test
+    codes = quantizer.encode(matrix)
+    scores = quantizer.scores(codes, matrix[0])
+    # Check
+    assert codes.shape == (1000, 8)
+    assert codes.dtype == np.uint8
+    assert np.corrcoef(scores, matrix @ matrix[0])[0, 1] > 0.95
+
+
+def test_product_quantizer_invalid_subvectors(matrix):
+    # Ensure the dimension must be a multiple of the number of subvectors.
+    with pytest.raises(ValueError):
+        ProductQuantizer.fit(matrix, subvectors=5)
+
+
+def test_projection(matrix):
+    # Ensure projected dot products approximate the original ones.
+    projection = Projection.fit(matrix, dim=16)
+    query = matrix[1]
+    # Test
+    scores = projection.transform(matrix) @ projection.project_query(query) + projection.mean @ query
+    # Check
+    assert projection.components.shape == (16, 32)
+    np.testing.assert_allclose(scores, matrix @ query, rtol=0.05, atol=1.0)
+
+
+def test_projection_invalid_dim(matrix):
+    # Ensure the reduced dimension must be lower than the embeddings dimension.
+    with pytest.raises(ValueError):
+        Projection.fit(matrix, dim=32)
+
+
+@pytest.mark.parametrize("method", ["int8", "pq"])
+def test_quantized_index_candidates(matrix, method):
+    # Ensure the exact nearest neighbors are among the candidates.
+    index = QuantizedIndex.build(matrix, method, subvectors=8)
+    query = matrix[5]
+    # Test
+    candidates = index.candidates(query, count=40)
+    # Check
+    exact = np.argsort(-(matrix @ query))[:10]
+    assert len(candidates) == 40
+    assert set(exact) <= set(candidates)
+    assert index.nbytes < matrix.nbytes
+
+
+def test_quantized_index_candidates_rows(matrix):
+    # Ensure candidates are chosen among the given rows only.
+    index = QuantizedIndex.build(matrix, "int8")
+    rows = np.arange(0, 1000, 2)
+    # Test
+    candidates = index.candidates(matrix[3], count=10, rows=rows)
+    # Check
+    assert all(row % 2 == 0 for row in candidates)
+
+
+def test_rescore():
+    # Ensure candidates are sorted by their exact score, keeping the top k.
+    documents = [
+        Document(content="far", embedding=np.array([0.0, 1.0])),
+        Document(content="close", embedding=np.array([1.0, 0.1])),
+        Document(content="closest", embedding=np.array([2.0, 0.0])),
+    ]
+    # Test
+    results = rescore(documents, np.array([1.0, 0.0]), top_k=2, similarity="dot_product")
+    # Check
+    assert [doc.content for doc in results] == ["closest", "close"]
+    assert [doc.score for doc in results] == pytest.approx([2.0, 1.0])
@@ -0,0 +1,194 @@
+import asyncio
+from unittest import mock
+
+import numpy as np
+import pytest
+from haystack.nodes import EmbeddingRetriever
+from haystack.schema import Document
+
+from shoshin.cache.embeddings import EmbeddingCache
+from shoshin.datastore.lexical import LexicalIndex
+from shoshin.datastore.retrievers import CachedEmbeddingRetriever, HybridRetriever
+
+
+@pytest.fixture(scope="function")
+def retriever(tmp_path):
+    cache = EmbeddingCache("text-embedding-ada-002", 2, str(tmp_path))
+    yield CachedEmbeddingRetriever(api_key="sk-test", embedding_model="text-embedding-ada-002", cache=cache)
+
+
+def test_cached_retriever_embed_queries(retriever, mocker):
+    # Ensure only queries that are not cached are sent to the embedding model.
+    embed = mocker.patch.object(EmbeddingRetriever, "embed_queries", return_value=np.array([[1.0, 2.0]]))
+    retriever.cache.set_many(["cached question"], np.array([[3.0, 4.0]]))
+    # Test
+    embeddings = retriever.embed_queries(["new question", "cached question"])
+    # Check
+    embed.assert_called_once_with(["new question"])
+    np.testing.assert_array_equal(embeddings, [[1.0, 2.0], [3.0, 4.0]])
+    assert len(retriever.cache) == 2
+
+
+def test_cached_retriever_embed_documents(retriever, mocker):
+    # Ensure document embeddings are cached and reused.
+    embed = mocker.patch.object(EmbeddingRetriever, "embed_documents", return_value=np.array([[1.0, 2.0]]))
+    documents = [Document(content="Lesson content")]
+    retriever.embed_documents(documents)
+    # Test
+    embeddings = retriever.embed_documents(documents)
+    # Check
+    assert embed.call_count == 1
+    np.testing.assert_array_equal(embeddings, [[1.0, 2.0]])
+
+
+def test_cached_retriever_without_cache(mocker):
+    # Ensure the retriever calls the embedding model if the cache is disabled.
+    embed = mocker.patch.object(EmbeddingRetriever, "embed_queries", return_value=np.array([[1.0, 2.0]]))
+    retriever = CachedEmbeddingRetriever(api_key="sk-test", embedding_model="text-embedding-ada-002")
+    # Test
+    retriever.embed_queries(["question"])
+    retriever.embed_queries(["question"])
+    # Check
+    assert embed.call_count == 2
+
+
+def test_cached_retriever_with_engine(tmp_path, mocker):
+    # Ensure missing embeddings are computed by the engine.
+    engine = mocker.Mock()
+    engine.embed.return_value = np.array([[1.0, 2.0]])
+    cache = EmbeddingCache("text-embedding-ada-002", 2, str(tmp_path))
+    retriever = CachedEmbeddingRetriever(
+        api_key="sk-test", embedding_model="text-embedding-ada-002", cache=cache, engine=engine
+    )
+    # Test
+    retriever.embed_documents([Document(content="Lesson content")])
+    retriever.embed_queries(["Lesson content"])
+    # Check
+    engine.embed.assert_called_once_with(["Lesson content"])
+
+
+def test_cached_retriever_aembed_queries(tmp_path, mocker):
+    # Ensure only queries that are not cached are embedded by the async engine, coalescing concurrent calls.
+    engine = mocker.Mock()
+    engine.aembed = mocker.AsyncMock(return_value=np.array([[1.0, 2.0]]))
+    cache = EmbeddingCache("text-embedding-ada-002", 2, str(tmp_path))
+    cache.set_many(["cached question"], np.array([[3.0, 4.0]]))
+    retriever = CachedEmbeddingRetriever(
+        api_key="sk-test", embedding_model="text-embedding-ada-002", cache=cache, engine=engine
+    )
+    # Test
+    embeddings = asyncio.run(retriever.aembed_queries(["new question", "cached question"]))
+    # Check
+    engine.aembed.assert_called_once_with(["new question"], None, coalesce=True)
+    np.testing.assert_array_equal(embeddings, [[1.0, 2.0], [3.0, 4.0]])
+    assert len(retriever.cache) == 2
+
+
+@pytest.fixture(scope="function")
+def hybrid(tmp_path, mocker):
+    documents = [
+        Document(content="Use git rebase to rewrite history", meta={"name": "lesson01.txt"}),
+        Document(content="A branch points to a commit", meta={"name": "lesson02.txt"}),
+        Document(content="Merge a branch into another branch", meta={"name": "lesson02.txt"}),
+    ]
+    lexical_index = LexicalIndex(str(tmp_path / "document.json"))
+    lexical_index.add(documents)
+    embedding_retriever = mocker.Mock()
+    embedding_retriever.scale_score = True
+    embedding_retriever.embed_queries.return_value = np.array([[1.0, 0.0]])
+    store = embedding_retriever.document_store
+    store.get_documents_by_id.side_effect = lambda ids, index=None: [doc for doc in documents if doc.id in ids]
+    store.get_all_documents_generator.side_effect = lambda index=None, filters=None, return_embedding=None: (
+        doc for doc in documents if doc.meta["name"] in filters["name"]
+    )
+    store.query_by_embedding.return_value = [documents[1], documents[0]]
+    retriever = HybridRetriever(embedding_retriever, lexical_index, top_k=3, lexical_margin=3.0, lexical_min_score=0.1)
+    yield retriever, documents
+
+
+def test_hybrid_retriever_fusion(hybrid):
+    # Ensure lexical and embedding results are merged with reciprocal rank fusion.
+    retriever, documents = hybrid
+    # Test
+    results, embedding = retriever.retrieve_with_embedding("branch")
+    # Check
+    assert [doc.id for doc in results] == [documents[1].id, documents[2].id, documents[0].id]
+    np.testing.assert_array_equal(embedding, [1.0, 0.0])
+    retriever.document_store.query_by_embedding.assert_called_once_with(
+        query_emb=embedding, filters=None, top_k=3, index=None, headers=None, scale_score=True
+    )
+
+
+def test_hybrid_retriever_aretrieve(hybrid):
+    # Ensure the async retrieval returns the same documents as the blocking one.
+    retriever, documents = hybrid
+    retriever.embedding_retriever.aembed_queries = mock.AsyncMock(return_value=np.array([[1.0, 0.0]]))
+    # Test
+    results, embedding = asyncio.run(retriever.aretrieve_with_embedding("branch"))
+    # Check
+    assert [doc.id for doc in results] == [documents[1].id, documents[2].id, documents[0].id]
+    np.testing.assert_array_equal(embedding, [1.0, 0.0])
+    retriever.embedding_retriever.embed_queries.assert_not_called()
+
+
+def test_hybrid_retriever_confident_lexical_match(hybrid):
+    # Ensure a confident lexical match skips the query embedding.
+    retriever, documents = hybrid
+    # Test
+    results = retriever.retrieve("How do I rebase?")
+    # Check
+    assert [doc.id for doc in results] == [documents[0].id]
+    assert retriever.embedding_retriever.embed_queries.call_count == 0
+    assert retriever.document_store.query_by_embedding.call_count == 0
+
+
+def test_hybrid_retriever_weak_lexical_match(hybrid):
+    # Ensure a single lexical match below the score floor still runs the embedding search.
+    retriever, documents = hybrid
+    retriever.lexical_min_score = 5.0
+    # Test
+    results = retriever.retrieve("How do I rebase?")
+    # Check
+    assert documents[0].id in [doc.id for doc in results]
+    assert retriever.embedding_retriever.embed_queries.call_count == 1
+
+
+def test_hybrid_retriever_filters(hybrid):
+    # Ensure filters are applied to lexical results, so a filtered out match is never confident.
+    retriever, documents = hybrid
+    retriever.document_store.query_by_embedding.return_value = [documents[1]]
+    # Test
+    results = retriever.retrieve("rebase", filters={"name": ["lesson02.txt"]})
+    # Check
+    assert [doc.id for doc in results] == [documents[1].id]
+    assert retriever.embedding_retriever.embed_queries.call_count == 1
+
+
+def test_hybrid_retriever_filters_lexical_top_k(hybrid):
+    # Ensure only documents matching the filters are ranked, so better matches of other lessons don't fill the top_k.
+    retriever, documents = hybrid
+    retriever.document_store.query_by_embedding.return_value = []
+    # Test
+    results = retriever.retrieve("rebase branch", filters={"name": ["lesson02.txt"]}, top_k=1)
+    # Check
+    assert [doc.id for doc in results] == [documents[2].id]
+    assert retriever.lexical_index.search("rebase branch", top_k=1)[0][0] == documents[0].id
+
+
+def test_hybrid_retriever_batch(hybrid):
+    # Ensure queries without a confident lexical match are embedded and searched in one call.
+    retriever, documents = hybrid
+    retriever.embedding_retriever.embed_queries.return_value = np.array([[1.0, 0.0], [0.0, 1.0]])
+    retriever.document_store.query_by_embedding_batch.return_value = [[documents[1]], [documents[2]]]
+    # Test
+    results = retriever.retrieve_batch_with_embeddings(["branch", "How do I rebase?", "merge history"])
+    # Check
+    assert [[doc.id for doc in docs] for docs, _ in results] == [
+        [documents[1].id, documents[2].id],
+        [documents[0].id],
+        [documents[2].id, documents[0].id],
+    ]
+    assert results[1][1] is None
+    np.testing.assert_array_equal(results[2][1], [0.0, 1.0])
+    retriever.embedding_retriever.embed_queries.assert_called_once_with(["branch", "merge history"])
+    assert retriever.document_store.query_by_embedding_batch.call_count == 1
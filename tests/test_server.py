@@ -0,0 +1,102 @@
+import http.client
+import json
+import threading
+
+import pytest
+from haystack.errors import OpenAIError
+
+from shoshin.server.app import QueryServer, QueryService
+
+
+@pytest.fixture(scope="function")
+def query_service(document_store_mock, settings, mocker):
+    settings.ANSWER_CACHE = False
+    mocker.patch("shoshin.ai.Pipeline")
+    yield QueryService(document_store_mock, max_concurrency=2)
+
+
+@pytest.fixture(scope="function")
+def query_server(query_service):
+    server = QueryServer(("127.0.0.1", 0), query_service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_query_service_reuses_pipeline(query_service):
+    # Ensure the pipeline is built once and reused across questions.
+    pipeline = query_service._pipeline
+    pipeline.run.return_value = {"results": ["Test response"]}
+    # Test
+    query_service.answer("First question")
+    response = query_service.answer("Second question")
+    # Check
+    assert response == {"answer": ["Test response"]}
+    assert pipeline.run.call_count == 2
+    pipeline.run.assert_called_with(query="Second question", params={"Retriever": {"top_k": 10, "filters": None}})
+
+
+def test_server_health(query_server):
+    # Ensure the health endpoint reports the server is ready.
+    status, body = _request(query_server, "GET", "/health")
+    # Check
+    assert status == 200
+    assert body == {"status": "ok"}
+
+
+def test_server_query(query_server):
+    # Ensure questions are answered through the shared service.
+    query_server.service._pipeline.run.return_value = {"results": ["Test response"]}
+    # Test
+    status, body = _request(query_server, "POST", "/query", {"question": "Test question"})
+    # Check
+    assert status == 200
+    assert body == {"answer": ["Test response"]}
+
+
+def test_server_query_invalid_request(query_server):
+    # Ensure requests without a question are rejected.
+    status, body = _request(query_server, "POST", "/query", {"text": "Test question"})
+    # Check
+    assert status == 400
+    assert "Invalid request" in body["error"]
+
+
+def test_server_query_openai_error(query_server):
+    # Ensure OpenAI errors are returned as bad gateway errors.
+    query_server.service._pipeline.run.side_effect = OpenAIError("OpenAI returned an error.", status_code=500)
+    # Test
+    status, body = _request(query_server, "POST", "/query", {"question": "Test question"})
+    # Check
+    assert status == 502
+    assert "OpenAI returned an error." in body["error"]
+
+
+def test_server_unknown_endpoint(query_server):
+    # Ensure unknown endpoints return not found.
+    status, _ = _request(query_server, "GET", "/unknown")
+    # Check
+    assert status == 404
+
+
+def test_server_metrics(query_server):
+    # Ensure stage timings are exported in the Prometheus text format.
+    query_server.service._pipeline.run.return_value = {"results": ["Test response"]}
+    _request(query_server, "POST", "/query", {"question": "Test question"})
+    conn = http.client.HTTPConnection("127.0.0.1", query_server.server_port)
+    # Test
+    conn.request("GET", "/metrics")
+    response = conn.getresponse()
+    # Check
+    assert response.status == 200
+    assert response.getheader("Content-Type").startswith("text/plain")
+    assert 'shoshin_span_seconds_count{span="query"}' in response.read().decode("utf-8")